@@ -47,7 +47,7 @@ async def lifespan(app: FastAPI):
         None: Used to manage startup and shutdown events.
     """
     try:
-        # set all agents as inactive on startup
+        # restore is_active of agents from the router, or reset it if it is unreachable
         await run_startup_jobs()
 
         app.state.genai_session = session
@@ -57,7 +57,7 @@ async def lifespan(app: FastAPI):
         async def message_handler(
             agent_context: GenAIContext,
             message_type: str,
-            agent_uuid: str,
+            agent_uuid: str = "",
             session_id: Optional[str] = None,
             request_id: Optional[str] = None,
             log_level: Optional[str] = None,
@@ -66,6 +66,7 @@ async def lifespan(app: FastAPI):
             agent_description: Optional[str] = "",
             agent_input_schema: Optional[dict] = None,
             agent_jwt: Optional[str] = None,
+            logs: Optional[list[dict]] = None,
         ):
             await message_handler_validator(
                 session=session,
@@ -80,6 +81,7 @@ async def lifespan(app: FastAPI):
                 message_type=message_type,
                 state=app.state,
                 jwt_token=agent_jwt,
+                logs=logs,
             )
 
         logger.info("GenAI Session started")
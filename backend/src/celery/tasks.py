@@ -3,6 +3,7 @@ import logging
 
 from celery_singleton import Singleton
 from src.celery.celery_app import celery_app
+from src.utils.agent_catalog import wait_for_catalog_invalidations
 from src.utils.lookup_a2a_agent import lookup_a2a_agents
 from src.utils.lookup_mcp_server import lookup_mcp_servers
 
@@ -15,6 +16,7 @@ async def refresh_mcp_a2a_data():
         asyncio.create_task(lookup_a2a_agents()),
     ]
     await asyncio.gather(*tasks)
+    await wait_for_catalog_invalidations()
 
 
 @celery_app.task(base=Singleton, bind=True)
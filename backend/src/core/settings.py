@@ -29,6 +29,8 @@ class Settings(BaseSettings):
     SQLALCHEMY_ASYNC_DATABASE_URI: Optional[str] = None
 
     ROUTER_WS_URL: str = Field(default="ws://genai-router:8080/ws")
+    # presence API of the router, used to restore Agent.is_active on startup
+    ROUTER_HTTP_URL: str = Field(default="http://genai-router:8080")
     MASTER_BE_API_KEY: str = Field(
         default="7a3fd399-3e48-46a0-ab7c-0eaf38020283::master_server_be"
     )
@@ -44,6 +46,10 @@ class Settings(BaseSettings):
 
     CELERY_BEAT_INTERVAL_MINUTES: int = Field(default=1)
 
+    # the master agent caches agent catalogs, changes are published to this pub/sub channel
+    AGENT_CATALOG_REDIS_URI: str = Field(default="redis://genai-redis:6379/0")
+    AGENT_CATALOG_CHANNEL: str = Field(default="agent_catalog_invalidations")
+
     GENAI_PROVIDER_URL: str = Field(default="https://proxy-openai.chi-6ec.workers.dev")
 
     @model_validator(mode="after")
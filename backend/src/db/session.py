@@ -2,8 +2,10 @@ from typing import Annotated, AsyncGenerator
 
 from fastapi import Depends, Request
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
 from sqlalchemy.pool import NullPool
 from src.core.settings import get_settings
+from src.utils.agent_catalog import register_catalog_invalidation
 
 settings = get_settings()
 
@@ -15,6 +17,7 @@ engine = create_async_engine(
     pool_pre_ping=True,
 )
 async_session = async_sessionmaker(autocommit=False, autoflush=False, bind=engine)
+register_catalog_invalidation(Session)
 
 
 async def get_db() -> AsyncGenerator:
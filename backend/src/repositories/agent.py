@@ -229,6 +229,27 @@ class AgentRepository(CRUDBase[Agent, AgentCreate, AgentUpdate]):
         await db.commit()
         return
 
+    async def sync_agents_activity(
+        self, db: AsyncSession, online_agent_ids: set[str]
+    ) -> None:
+        """
+        Set is_active for all agents in one bulk update, from the agents the router
+        reports as connected
+
+        Args:
+            db: The database session.
+            online_agent_ids: IDs of the agents connected to the router.
+
+        Returns: None
+        """
+        await db.execute(
+            update(self.model).values(
+                {"is_active": self.model.id.in_([UUID(id_) for id_ in online_agent_ids])}
+            )
+        )
+        await db.commit()
+        return
+
     async def set_agent_as_inactive(
         self, db: AsyncSession, id_: str, user_id: str
     ) -> Agent:
@@ -545,6 +566,7 @@ LIMIT :limit OFFSET :offset;
                     name=flow.alias, description=flow.description
                 ).model_dump(mode="json")
 
+            input_mappings = [agent.get("input_mapping") for agent in flow.flow]
             flow_schema = AgentDTOPayload(
                 id=flow.id,
                 name=flow.alias,
@@ -553,6 +575,7 @@ LIMIT :limit OFFSET :offset;
                 created_at=flow.created_at,
                 updated_at=flow.updated_at,
                 flow=[agent.get("id") for agent in flow.flow],
+                input_mappings=input_mappings if any(input_mappings) else None,
                 is_active=flow.is_active,
             )
             return flow_schema
@@ -1,9 +1,13 @@
-from typing import Optional
-from src.schemas.ws.log import LogCreate, LogUpdate, LogEntryDTO
+import logging
+from typing import Any, Optional
+from src.schemas.ws.log import LogCreate, LogUpdate, LogEntry, LogEntryDTO
 from src.repositories.base import CRUDBase
 from src.models import Log
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import insert, select
+from sqlalchemy.exc import DBAPIError
+
+logger = logging.getLogger(__name__)
 
 
 class LogRepository(CRUDBase[Log, LogCreate, LogUpdate]):
@@ -19,5 +23,44 @@ class LogRepository(CRUDBase[Log, LogCreate, LogUpdate]):
         q = await db.execute(select(self.model).where(self.model.request_id == id_))
         return [LogEntryDTO(**log.__dict__) for log in q.scalars().all()]
 
+    async def create_many(
+        self, db: AsyncSession, objs_in: list[LogCreate]
+    ) -> list[LogEntry]:
+        """
+        Insert a batch of logs with a single statement and commit.
+        If the database rejects the batch, e.g. because of a row with a malformed ID,
+        the rows are inserted one by one and only the rejected ones are skipped.
+        """
+        if not objs_in:
+            return []
+
+        rows = [obj_in.model_dump() for obj_in in objs_in]
+        try:
+            # every row has the same columns, so the batch goes out as one executemany
+            q = await db.scalars(insert(self.model).returning(self.model), rows)
+            logs = [LogEntry(**log.__dict__) for log in q.all()]
+        except DBAPIError:
+            await db.rollback()
+            logs = await self._create_each(db, rows)
+        await db.commit()
+        return logs
+
+    async def _create_each(
+        self, db: AsyncSession, rows: list[dict[str, Any]]
+    ) -> list[LogEntry]:
+        logs = []
+        for row in rows:
+            try:
+                async with db.begin_nested():
+                    log = await db.scalar(
+                        insert(self.model).values(**row).returning(self.model)
+                    )
+                logs.append(LogEntry(**log.__dict__))
+            except DBAPIError as e:
+                logger.error(
+                    f"Skipped log of agent {row.get('agent_id')} from batch: {e.orig}"
+                )
+        return logs
+
 
 log_repo = LogRepository(Log)
@@ -1,10 +1,13 @@
+import hashlib
+import json
 import logging
 import traceback
 from typing import Annotated, Optional
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, Header, HTTPException, Query
-from fastapi.responses import Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
 from sqlalchemy.exc import IntegrityError
 
 from src.auth.dependencies import (
@@ -34,6 +37,7 @@ async def get_active_connections(
     db: AsyncDBSession,
     authorization: Annotated[Optional[str], Header()] = None,
     x_api_key: Annotated[Optional[str], Header(convert_underscores=True)] = None,
+    if_none_match: Annotated[Optional[str], Header()] = None,
     agent_type: ActiveAgentTypeFilter = Query(),
     user_id: Optional[UUID] = Query(None),
     offset: int = 0,
@@ -68,9 +72,20 @@ async def get_active_connections(
     if authorization:
         user_id = get_user_id_from_jwt(token=authorization.split(" ")[-1])
 
-    return await agent_repo.get_active_agents_by_filter(
-        db=db, agent_type=agent_type, user_id=user_id, limit=limit, offset=offset
+    active_agents = jsonable_encoder(
+        await agent_repo.get_active_agents_by_filter(
+            db=db, agent_type=agent_type, user_id=user_id, limit=limit, offset=offset
+        )
+    )
+    # the master agent revalidates its cached catalog with the ETag
+    etag = '"{}"'.format(
+        hashlib.sha256(
+            json.dumps(active_agents, sort_keys=True, default=str).encode()
+        ).hexdigest()
     )
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse(content=active_agents, headers={"ETag": etag})
 
 
 @agent_router.get("/")
@@ -18,11 +18,13 @@ from src.schemas.api.agent.dto import AgentResponseWithFilesDTO, AgentTypeRespon
 from src.schemas.api.chat.schemas import CreateChatMessage
 from src.schemas.ws.frontend import (
     AgentResponseDTO,
+    AgentStreamDTO,
     IncomingFrontendMessage,
     LLMPropertiesDecryptCreds,
 )
 from src.schemas.ws.ml import OutgoingMLRequestSchema
 from src.utils.enums import SenderType
+from src.utils.streaming import send_with_stream
 from src.utils.validate_uuid import is_valid_uuid
 from src.utils.validation_error_handler import validation_exception_handler
 from src.utils.websocket import get_current_ws_user
@@ -225,7 +227,7 @@ async def handle_frontend_ws(
                 )
                 return
 
-            await chat_repo.add_message_to_conversation(
+            chat_details = await chat_repo.add_message_to_conversation(
                 db=db,
                 user_model=user_model,
                 session_id=session_id,
@@ -241,15 +243,32 @@ async def handle_frontend_ws(
                 timestamp=int(datetime.now().timestamp()),
                 configs=enriched_llm_props.to_json(),
                 files=files,
+                message=message_obj.message,
+                message_count=len(chat_details.messages),
             )
             req_body = ml_request.model_dump(exclude_none=True)
 
             try:
                 session.request_id = request_id
                 session.session_id = session_id
-                response: AgentResponse = await session.send(
+
+                async def push_stream_frame(frame: dict) -> None:
+                    stream_structure = AgentStreamDTO(
+                        type=frame["message_type"],
+                        agent_id=frame.get("agent_id"),
+                        chunk=frame.get("chunk"),
+                        request_id=request_id,
+                        session_id=session_id,
+                    )
+                    await websocket.send_text(stream_structure.model_dump_json())
+
+                response: AgentResponse = await send_with_stream(
+                    session=session,
                     client_id=MasterServerName.MASTER_SERVER_ML.value,
                     message=req_body,
+                    on_stream=push_stream_frame,
+                    request_id=request_id,
+                    session_id=session_id,
                 )
                 agent_response = AgentResponseDTO(
                     execution_time=response.execution_time,
@@ -10,6 +10,9 @@ from src.utils.enums import AgentType
 class FlowAgentId(BaseModel):
     id: str = None
     type: str = None
+    # argument name -> JMESPath expression into the output of the previous step, or into the
+    # arguments of the flow for the first step; mapped steps are called without asking the LLM
+    input_mapping: Optional[dict[str, str]] = None
 
     @field_validator("id")
     def validate_id_is_uuid(cls, v) -> str:
@@ -32,11 +35,22 @@ class FlowAgentId(BaseModel):
 
         return v
 
+    @field_validator("input_mapping")
+    def validate_input_mapping(cls, v) -> Optional[dict[str, str]]:
+        if v is not None and not all(
+            name and expression for name, expression in v.items()
+        ):
+            raise HTTPException(
+                status_code=400,
+                detail="Input mapping must map argument names to non-empty expressions",
+            )
+        return v or None
+
     def to_json(self) -> dict:
-        return {
-            "id": self.id,
-            "type": self.type
-        }
+        data = {"id": self.id, "type": self.type}
+        if self.input_mapping:
+            data["input_mapping"] = self.input_mapping
+        return data
 
 
 class AgentFlowBase(BaseModel):
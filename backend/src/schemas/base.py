@@ -37,6 +37,8 @@ class AgentDTOPayload(BaseUUIDToStrModel):
     url: Optional[AnyHttpUrl] = None
     agent_schema: dict
     flow: Optional[list] = None
+    # input mapping of every flow step, see FlowAgentId.input_mapping
+    input_mappings: Optional[list[Optional[dict[str, str]]]] = None
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
     is_active: Optional[bool] = None
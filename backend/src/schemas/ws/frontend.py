@@ -1,4 +1,4 @@
-from typing import List, Optional, Self, Union
+from typing import Any, List, Optional, Self, Union
 from uuid import UUID
 
 from pydantic import BaseModel, Field, field_validator, model_validator
@@ -109,3 +109,17 @@ class AgentResponseDTO(BaseModel):
         self.request_id = str(self.request_id)
         self.session_id = str(self.session_id)
         return self
+
+
+class AgentStreamDTO(BaseModel):
+    type: str  # agent_stream_start, agent_stream_chunk or agent_stream_end
+    agent_id: Optional[str] = None
+    chunk: Optional[Any] = None
+    request_id: Union[UUID, str]
+    session_id: Union[UUID, str]
+
+    @model_validator(mode="after")
+    def cast_uuid_to_str(self) -> Self:
+        self.request_id = str(self.request_id)
+        self.session_id = str(self.session_id)
+        return self
@@ -12,6 +12,10 @@ class OutgoingMLRequestSchema(BaseModel):
     configs: dict
     files: Optional[List[FileDTO]] = []
     timestamp: datetime | float | int  # posix ts
+    # the new user message and the number of messages in the chat including it,
+    # lets the master agent extend its cached chat history instead of fetching it
+    message: Optional[str] = None
+    message_count: Optional[int] = None
 
     @model_validator(mode="after")
     def validate_uuids(self) -> Self:
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import logging
+from typing import Optional
+
+import redis.asyncio as redis
+from sqlalchemy import event
+from sqlalchemy.orm import ORMExecuteState, Session
+
+from src.core.settings import get_settings
+from src.models import A2ACard, Agent, AgentWorkflow, MCPServer, MCPTool
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# models listed by GET /agents/active, a change to any of them changes the agent catalog
+CATALOG_MODELS = (Agent, AgentWorkflow, MCPServer, MCPTool, A2ACard)
+
+# session.info key of the users whose catalog changed in the current transaction,
+# None in the set stands for a change that may affect every user
+PENDING_KEY = "agent_catalog_changes"
+
+_clients: dict[asyncio.AbstractEventLoop, redis.Redis] = {}
+_publishing: set[asyncio.Task] = set()
+
+
+def _client() -> redis.Redis:
+    """
+    Redis connections are bound to their event loop, and celery tasks run each on a new one.
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in _clients:
+        for stale_loop in [stale for stale in _clients if stale.is_closed()]:
+            del _clients[stale_loop]
+        _clients[loop] = redis.from_url(settings.AGENT_CATALOG_REDIS_URI)
+    return _clients[loop]
+
+
+async def publish_catalog_invalidation(user_ids: Optional[list[str]]) -> None:
+    """
+    Tells the master agent to drop the cached agent catalog of some users.
+
+    Args:
+        user_ids: IDs of the users whose catalog changed, None for every user.
+    """
+    try:
+        await _client().publish(
+            settings.AGENT_CATALOG_CHANNEL, json.dumps({"user_ids": user_ids})
+        )
+    except redis.RedisError as e:
+        # the master agent still picks the change up once its cache entries expire
+        logger.warning(f"Could not publish agent catalog invalidation: {e}")
+
+
+async def wait_for_catalog_invalidations() -> None:
+    """
+    Waits for the invalidations being published, e.g. before a celery task closes its event loop.
+    """
+    if _publishing:
+        await asyncio.gather(*_publishing, return_exceptions=True)
+
+
+def _on_flush(session: Session, flush_context) -> None:
+    changes = session.info.setdefault(PENDING_KEY, set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if not isinstance(obj, CATALOG_MODELS):
+            continue
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        creator_id = getattr(obj, "creator_id", None)
+        # MCP tools only know their server, not its creator
+        changes.add(str(creator_id) if creator_id else None)
+
+
+def _on_orm_execute(orm_execute_state: ORMExecuteState) -> None:
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and issubclass(mapper.class_, CATALOG_MODELS):
+        # bulk statements may touch rows of any user
+        orm_execute_state.session.info.setdefault(PENDING_KEY, set()).add(None)
+
+
+def _on_commit(session: Session) -> None:
+    changes = session.info.pop(PENDING_KEY, None)
+    if not changes:
+        return
+
+    user_ids = None if None in changes else sorted(changes)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        logger.warning("Agent catalog changed outside of an event loop, not published")
+        return
+
+    task = loop.create_task(publish_catalog_invalidation(user_ids))
+    _publishing.add(task)
+    task.add_done_callback(_publishing.discard)
+
+
+def _on_rollback(session: Session) -> None:
+    session.info.pop(PENDING_KEY, None)
+
+
+def register_catalog_invalidation(session_class: type[Session]) -> None:
+    """
+    Publishes an agent catalog invalidation after every commit changing agents, flows,
+    MCP servers or A2A cards, wherever the change is made.
+
+    Args:
+        session_class: The session class to listen on.
+    """
+    event.listen(session_class, "after_flush", _on_flush)
+    event.listen(session_class, "do_orm_execute", _on_orm_execute)
+    event.listen(session_class, "after_commit", _on_commit)
+    event.listen(session_class, "after_rollback", _on_rollback)
@@ -34,3 +34,10 @@ class AgentIdType(Enum):
     agent_id = "agent_id"
     mcp_tool_id = "mcp_tool_id"
     a2a_card_id = "a2a_card_id"
+
+
+class RouterMessageType(Enum):
+    agent_log_batch = "agent_log_batch"
+    agent_stream_start = "agent_stream_start"
+    agent_stream_chunk = "agent_stream_chunk"
+    agent_stream_end = "agent_stream_end"
@@ -3,6 +3,7 @@ from src.repositories.agent import agent_repo
 from src.db.session import async_session
 from logging import getLogger
 from src.utils.db_initial_healthcheck import preflight_db_availability_check
+from src.utils.router_presence import get_online_agent_ids
 
 
 logger = getLogger(__name__)
@@ -10,8 +11,14 @@ logger = getLogger(__name__)
 
 async def run_startup_jobs():
     await preflight_db_availability_check()
+    online_agent_ids = await get_online_agent_ids()
     async with async_session() as db:
-        await agent_repo.set_all_agents_inactive(db=db)
+        if online_agent_ids is None:
+            await agent_repo.set_all_agents_inactive(db=db)
+        else:
+            await agent_repo.sync_agents_activity(
+                db=db, online_agent_ids=online_agent_ids
+            )
 
     logger.debug("Initial startup jobs complete")
     return
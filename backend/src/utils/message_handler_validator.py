@@ -14,7 +14,7 @@ from src.repositories.log import log_repo
 from src.repositories.user import user_repo
 from src.schemas.api.agent.schemas import AgentUpdate
 from src.schemas.ws.log import FrontendLogEntryDTO, LogCreate, LogEntry
-from src.utils.enums import AgentType
+from src.utils.enums import AgentType, RouterMessageType
 from src.utils.helpers import FlowValidator, generate_alias
 from src.utils.validate_uuid import validate_agent_or_send_err
 from src.utils.validation_error_handler import validation_exception_handler
@@ -36,6 +36,7 @@ async def message_handler_validator(
     session_id: str = "",
     request_id: str = "",
     jwt_token: Optional[str] = None,
+    logs: Optional[list[dict]] = None,
 ):
     # NOTE: websocket connection must be initialized by the frontend before it will be accessible here
     # if websocket is not initialized it won't dump logs to the frontend
@@ -165,6 +166,48 @@ async def message_handler_validator(
 
                 return
 
+        if message_type == RouterMessageType.agent_log_batch.value:
+            # router batches agent_log events, one insert per batch instead of per line
+            logs_in = []
+            for log in logs or []:
+                if not (
+                    log.get("session_id")
+                    and log.get("request_id")
+                    and log.get("log_level")
+                ):
+                    continue
+                try:
+                    logs_in.append(
+                        LogCreate(
+                            session_id=log["session_id"],
+                            request_id=log["request_id"],
+                            message=log.get("log_message"),
+                            log_level=log["log_level"],
+                            agent_id=log.get("agent_uuid"),
+                        )
+                    )
+                except ValidationError as e:
+                    logger.error(
+                        f"Invalid agent_log entry in batch. Details: {validation_exception_handler(e)}"  # noqa: E501
+                    )
+
+            try:
+                async with async_session() as db:
+                    log_entries = await log_repo.create_many(db, objs_in=logs_in)
+                    logger.debug(f"Inserted {len(log_entries)} logs from batch")
+
+                if websocket:
+                    for log_out in log_entries:
+                        response = FrontendLogEntryDTO(
+                            type=WSMessageType.AGENT_LOG.value, log=log_out
+                        )
+                        await websocket.send_text(response.model_dump_json())
+
+            except Exception:
+                logger.error(f"Unexpected error occured: {traceback.format_exc()}")
+
+            return
+
     except KeyError:
         msg = "KeyError: Invalid payload structure - missing 'message_type' field"  # TODO: session_id?
         logger.error(msg)
@@ -0,0 +1,38 @@
+import logging
+from typing import Optional
+
+import httpx
+
+from src.core.settings import get_settings
+from src.utils.validate_uuid import is_valid_uuid
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+async def get_online_agent_ids(timeout: float = 5) -> Optional[set[str]]:
+    """
+    Asks the router which agents are connected, from its live connection table.
+
+    Args:
+        timeout: Seconds to wait for the router.
+
+    Returns:
+        IDs of the connected agents, None if the router could not be reached.
+    """
+    try:
+        async with httpx.AsyncClient(
+            base_url=settings.ROUTER_HTTP_URL, timeout=timeout
+        ) as client:
+            response = await client.get("/presence")
+            response.raise_for_status()
+    except httpx.HTTPError as e:
+        logger.warning(f"Could not fetch agent presence from the router: {e}")
+        return None
+
+    # entries without a role are connected to another router shard only
+    return {
+        client["client_id"]
+        for client in response.json().get("clients", [])
+        if client.get("role") in ("agent", None) and is_valid_uuid(client["client_id"])
+    }
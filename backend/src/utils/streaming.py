@@ -0,0 +1,104 @@
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Optional
+
+import msgspec
+import websockets
+from genai_session.session import AgentResponse, GenAISession
+from genai_session.utils.naming_enums import WSMessageType
+
+from src.utils.enums import RouterMessageType
+
+STREAM_MESSAGE_TYPES = (
+    RouterMessageType.agent_stream_start.value,
+    RouterMessageType.agent_stream_chunk.value,
+    RouterMessageType.agent_stream_end.value,
+)
+
+# the router sends MessagePack binary frames on connections opened with this subprotocol
+MSGPACK_SUBPROTOCOL = "genai.msgpack"
+
+
+async def send_with_stream(
+    session: GenAISession,
+    client_id: str,
+    message: dict,
+    on_stream: Callable[[dict[str, Any]], Awaitable[None]],
+    request_id: str,
+    session_id: str,
+    close_timeout: Optional[int] = None,
+) -> AgentResponse:
+    """
+    Invokes an agent like GenAISession.send, but hands the stream frames received before
+    the final response to `on_stream` instead of dropping them. Frames are exchanged as
+    MessagePack if the router supports it, so large payloads skip JSON on this hop.
+
+    The master agent keeps a copy in master-agent/utils/streaming.py. The two services
+    are separate Docker build contexts and share no package besides the SDK, so neither
+    can import the other's. The copies differ only in the enum the stream message types
+    come from, change both together.
+
+    Args:
+        session (GenAISession): Session of the backend.
+        client_id (str): UUID of the agent to invoke.
+        message (dict): Arguments of the agent.
+        on_stream (Callable[[dict[str, Any]], Awaitable[None]]): Called with every
+            start/chunk/end frame, tagged with `agent_id`.
+        request_id (str): Request ID of the invocation. The session is shared by all
+            chats and only holds the ID of the latest request.
+        session_id (str): Session ID of the invocation.
+        close_timeout (Optional[int]): Seconds to wait for each frame.
+
+    Returns:
+        AgentResponse: The final response of the agent.
+    """
+    headers = {"x-custom-invoke-key": f"{session.agent_id}:{client_id}"}
+
+    async with websockets.connect(
+        session.ws_url,
+        additional_headers=headers,
+        subprotocols=[MSGPACK_SUBPROTOCOL],
+    ) as ws:
+        invoke_message = {
+            "message_type": WSMessageType.AGENT_INVOKE.value,
+            "agent_uuid": client_id,
+            "request_payload": {**message},
+            "request_metadata": {
+                "request_id": request_id,
+                "session_id": session_id,
+            },
+        }
+        if ws.subprotocol == MSGPACK_SUBPROTOCOL:
+            await ws.send(msgspec.msgpack.encode(invoke_message))
+        else:
+            await ws.send(json.dumps(invoke_message))
+
+        while True:
+            try:
+                frame = await asyncio.wait_for(ws.recv(), timeout=close_timeout)
+            except asyncio.TimeoutError:
+                return AgentResponse(
+                    is_success=False, execution_time=0, response="Request timed out"
+                )
+
+            body = (
+                msgspec.msgpack.decode(frame)
+                if isinstance(frame, bytes)
+                else json.loads(frame)
+            )
+            message_type = body.get("message_type")
+
+            if message_type in STREAM_MESSAGE_TYPES:
+                await on_stream({**body, "agent_id": body.get("agent_id") or client_id})
+            elif message_type == WSMessageType.AGENT_RESPONSE.value:
+                return AgentResponse(
+                    is_success=True,
+                    execution_time=body.get("execution_time", 0),
+                    response=body.get("response", ""),
+                )
+            elif message_type == WSMessageType.AGENT_ERROR.value:
+                return AgentResponse(
+                    is_success=False,
+                    execution_time=body.get("execution_time", 0),
+                    response=body.get("error", {}).get("error_message", ""),
+                )
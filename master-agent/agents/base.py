@@ -1,9 +1,11 @@
+import asyncio
 import json
 from abc import ABC, abstractmethod
-from typing import Any
+from functools import cache
+from typing import Any, Optional
 
 from langchain.chat_models.base import BaseChatModel
-from langchain_core.messages import ToolMessage
+from langchain_core.messages import BaseMessage, ToolMessage
 from langchain_core.runnables import RunnableConfig
 from langgraph.constants import END, START
 from langgraph.graph.state import CompiledStateGraph, StateGraph
@@ -16,16 +18,32 @@ from utils.common import filter_and_order_by_ids, remove_last_underscore_segment
 
 
 class BaseMasterAgent(ABC):
-    def __init__(self, model: BaseChatModel, agents: list[dict[str, Any]]) -> None:
+    def __init__(
+            self,
+            model: BaseChatModel,
+            agents: list[dict[str, Any]],
+            parallel_tool_calls: bool = False,
+            max_parallel_tool_calls: int = 1
+    ) -> None:
+        """
+        Args:
+            model (BaseChatModel): Langchain chat model
+            agents (list[dict[str, Any]]): List of available agents
+            parallel_tool_calls (bool): Let the supervisor select several agents at once and run them concurrently
+            max_parallel_tool_calls (int): Maximum number of agents running at the same time in parallel mode
+        """
         self.model = model
         self.agents = agents
+        self.parallel_tool_calls = parallel_tool_calls
+        self.max_parallel_tool_calls = max(1, max_parallel_tool_calls)
         self._agents_to_bind_to_llm = [item["agent_schema"] for item in agents]
 
     @abstractmethod
     def select_agent(self, state: MasterAgentState):
         pass
 
-    def should_continue(self, state: MasterAgentState):
+    @staticmethod
+    def should_continue(state: MasterAgentState):
         """
         Continues the flow if any agent/flow has been selected, ends the flow otherwise.
         """
@@ -36,25 +54,55 @@ class BaseMasterAgent(ABC):
 
     async def execute_agent(self, state: MasterAgentState, config: RunnableConfig):
         """
-        Calls remote agent selected by Supervisor using AIConnector library.
+        Calls remote agents selected by Supervisor using AIConnector library.
+        In parallel mode every agent selected in the last message is called, concurrently
+        up to `max_parallel_tool_calls` at a time, otherwise only the first one.
+        """
+        messages = state.messages
+        agent_calls = messages[-1].tool_calls
+        if not self.parallel_tool_calls:
+            agent_calls = agent_calls[:1]
+
+        semaphore = asyncio.Semaphore(self.max_parallel_tool_calls)
+
+        async def limited(agent_call: dict[str, Any]) -> tuple[ToolMessage, dict[str, Any]]:
+            async with semaphore:
+                return await self._execute_agent_call(agent_call, messages, config)
+
+        results = await asyncio.gather(*(limited(agent_call) for agent_call in agent_calls))
+        return {
+            "messages": [message for message, _ in results],
+            "trace": [trace for _, trace in results]
+        }
+
+    async def _execute_agent_call(
+            self,
+            agent_call: dict[str, Any],
+            messages: list[BaseMessage],
+            config: RunnableConfig
+    ) -> tuple[ToolMessage, dict[str, Any]]:
+        """
+        Calls a single remote agent.
+
+        Returns:
+            tuple[ToolMessage, dict[str, Any]]: Response of the agent to the tool call, and its trace
         """
         from connectors.entities import AgentTypeEnum, GenAIConfig, GenAIFlowConfig, MCPConfig, A2AConfig
         from connectors.factory import ConnectorFactory
 
-        messages = state.messages
-        agent_call = messages[-1].tool_calls[0]
         agent_name = agent_call["name"]
 
-        agent_to_execute = [agent for agent in self.agents if agent["name"] == agent_name][0]
-        agent_type = agent_to_execute["type"]
-
         try:
+            agent_to_execute = [agent for agent in self.agents if agent["name"] == agent_name][0]
+            agent_type = agent_to_execute["type"]
+
             if agent_type == AgentTypeEnum.gen_ai.value:
                 agent_config = GenAIConfig(
                     id=agent_to_execute.get("id"),
                     name=remove_last_underscore_segment(agent_name),
                     arguments=agent_call["args"],
-                    session=config.get("configurable", {}).get("session")
+                    session=config.get("configurable", {}).get("session"),
+                    stream_relay=config.get("configurable", {}).get("stream_relay")
                 )
             elif agent_type == AgentTypeEnum.flow.value:
                 agent_config = GenAIFlowConfig(
@@ -66,7 +114,10 @@ class BaseMasterAgent(ABC):
                     ),
                     model=self.model,
                     messages=messages[:-1].copy(),  # exclude last AI message
-                    session=config.get("configurable", {}).get("session")
+                    session=config.get("configurable", {}).get("session"),
+                    stream_relay=config.get("configurable", {}).get("stream_relay"),
+                    arguments=agent_call["args"],
+                    input_mappings=agent_to_execute.get("input_mappings") or []
                 )
             elif agent_type == AgentTypeEnum.mcp.value:
                 agent_config = MCPConfig(
@@ -94,10 +145,10 @@ class BaseMasterAgent(ABC):
 
             agent_call_message = ToolMessage(
                 content=json.dumps(response),
-                name=agent_to_execute.get("name"),
+                name=agent_name,
                 tool_call_id=agent_call["id"],
             )
-            return {"messages": [agent_call_message], "trace": [trace]}
+            return agent_call_message, trace
 
         except Exception as e:
             error_message = f"Unexpected error while invoking {agent_name}: {e}"
@@ -109,31 +160,60 @@ class BaseMasterAgent(ABC):
                 "output": error_message,
                 "is_success": False
             }
-            return {
-                "messages": ToolMessage(
-                    content=error_message,
-                    name=agent_to_execute.get("name")
-                ),
-                "trace": [trace]
-            }
+            return ToolMessage(content=error_message, name=agent_name, tool_call_id=agent_call["id"]), trace
 
-    @property
-    def graph(self) -> CompiledStateGraph:
+    @staticmethod
+    async def _select_agent_node(state: MasterAgentState, config: RunnableConfig):
+        return await config["configurable"]["master_agent"].select_agent(state)
+
+    @staticmethod
+    async def _execute_agent_node(state: MasterAgentState, config: RunnableConfig):
+        return await config["configurable"]["master_agent"].execute_agent(state, config)
+
+    @classmethod
+    @cache
+    def compiled_graph(cls) -> CompiledStateGraph:
         """
-        Execution graph of Master Agent.
+        Execution graph of Master Agent, compiled once per Master Agent type.
+        The nodes take the Master Agent of the current run (its model and agents) from
+        `config["configurable"]["master_agent"]`, so the graph is shared between requests.
         """
         workflow = StateGraph(MasterAgentState)
 
-        workflow.add_node(Nodes.supervisor.value, self.select_agent)
-        workflow.add_node(Nodes.execute_agent.value, self.execute_agent)
+        workflow.add_node(Nodes.supervisor.value, cls._select_agent_node)
+        workflow.add_node(Nodes.execute_agent.value, cls._execute_agent_node)
 
         workflow.add_edge(START, Nodes.supervisor.value)
         workflow.add_conditional_edges(
             Nodes.supervisor.value,
-            self.should_continue,
+            cls.should_continue,
             [Nodes.execute_agent.value, END]
         )
         workflow.add_edge(Nodes.execute_agent.value, Nodes.supervisor.value)
 
         compiled_graph = workflow.compile()
         return compiled_graph
+
+    @property
+    def graph(self) -> CompiledStateGraph:
+        """
+        Execution graph of Master Agent.
+        """
+        return self.compiled_graph()
+
+    async def ainvoke(self, input: dict[str, Any], config: Optional[RunnableConfig] = None) -> dict[str, Any]:
+        """
+        Runs the shared execution graph with this Master Agent.
+
+        Args:
+            input (dict[str, Any]): Initial state of the graph.
+            config (Optional[RunnableConfig]): Graph config, e.g. the session in `configurable`.
+
+        Returns:
+            dict[str, Any]: Final state of the graph.
+        """
+        config = config or {}
+        return await self.graph.ainvoke(
+            input=input,
+            config={**config, "configurable": {**config.get("configurable", {}), "master_agent": self}}
+        )
@@ -1,7 +1,11 @@
-from typing import Any
+import json
+import uuid
+from typing import Any, Optional
 
+import jmespath
+from jmespath.exceptions import JMESPathError
 from langchain_core.language_models import BaseChatModel
-from langchain_core.messages import AIMessage
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
 from loguru import logger
 
 from agents.base import BaseMasterAgent
@@ -10,13 +14,83 @@ from utils.agents import select_agent_and_resolve_parameters
 from utils.tracing import trace_execution_time
 
 
+def parse_agent_output(content: Any) -> Any:
+    """
+    Decodes the output of an agent from its tool message, agents returning JSON as a string are decoded twice.
+    """
+    for _ in range(2):
+        if not isinstance(content, str):
+            break
+        try:
+            content = json.loads(content)
+        except json.JSONDecodeError:
+            break
+    return content
+
+
+def resolve_input_mapping(mapping: dict[str, str], source: Any) -> Optional[dict[str, Any]]:
+    """
+    Evaluates the input mapping of a flow step.
+
+    Args:
+        mapping (dict[str, str]): Argument name -> JMESPath expression, `@` passes the whole source
+        source (Any): Output of the previous step, or the arguments of the flow for the first step
+
+    Returns:
+        Optional[dict[str, Any]]: Arguments of the step, None if an expression is invalid or matches nothing
+    """
+    arguments = {}
+    for name, expression in mapping.items():
+        try:
+            value = jmespath.search(expression, source)
+        except JMESPathError as e:
+            logger.warning(f"Invalid input mapping {expression!r} for {name}: {e}")
+            return None
+        if value is None:
+            return None
+        arguments[name] = value
+    return arguments
+
+
 class FlowMasterAgent(BaseMasterAgent):
     def __init__(
             self,
             model: BaseChatModel,
             agents: list[dict[str, Any]], # ordered list of agents to execute
+            arguments: Optional[dict[str, Any]] = None,
+            input_mappings: Optional[list[Optional[dict[str, str]]]] = None
     ) -> None:
+        """
+        Executes the agents of a flow one after another. The arguments of steps with an input mapping
+        are taken from the output of the previous step, the LLM resolves those of the other steps.
+
+        Args:
+            model (BaseChatModel): Langchain chat model
+            agents (list[dict[str, Any]]): Ordered list of agents to execute
+            arguments (Optional[dict[str, Any]]): Arguments the flow was called with, the source of the first step
+            input_mappings (Optional[list[Optional[dict[str, str]]]]): Input mapping of every step, None
+                for the steps resolved by the LLM
+        """
         super().__init__(model=model, agents=agents)
+        self.arguments = arguments or {}
+        self.input_mappings = input_mappings or []
+        self._step = 0
+
+    def _map_input(self, step: int, messages: list[BaseMessage]) -> Optional[dict[str, Any]]:
+        mapping = self.input_mappings[step] if step < len(self.input_mappings) else None
+        if not mapping:
+            return None
+
+        if step == 0:
+            source = self.arguments
+        else:
+            previous_output = next((message for message in reversed(messages) if isinstance(message, ToolMessage)), None)
+            source = parse_agent_output(previous_output.content) if previous_output else None
+
+        arguments = resolve_input_mapping(mapping, source)
+        if arguments is None:
+            logger.warning(f"Input mapping of step {step + 1} matches nothing, resolving its parameters with the LLM")
+        return arguments
 
     async def select_agent(self, state: MasterAgentState):
         messages = state.messages
@@ -27,19 +101,29 @@ class FlowMasterAgent(BaseMasterAgent):
 
         try:
             if self._agents_to_bind_to_llm:
+                step = self._step
+                self._step += 1
                 agent_to_execute = self._agents_to_bind_to_llm.pop(0)  # get agent from the top of the list
-                logger.info(f"Resolving parameters for {agent_to_execute.get("name")} in the flow")
+                agent_name = self.agents[step]["name"]
 
                 async with trace_execution_time(trace=trace):
-                    response = await select_agent_and_resolve_parameters(
-                        model=self.model,
-                        messages=messages,
-                        agents=[agent_to_execute],
-                        agent_choice=True  # force the current agent to be called
-                    )
+                    if (arguments := self._map_input(step, messages)) is not None:
+                        logger.info(f"Mapping the input of {agent_name} in the flow")
+                        response = AIMessage(
+                            content="",
+                            tool_calls=[{"name": agent_name, "args": arguments, "id": f"call_{uuid.uuid4().hex}"}]
+                        )
+                    else:
+                        logger.info(f"Resolving parameters for {agent_name} in the flow")
+                        response = await select_agent_and_resolve_parameters(
+                            model=self.model,
+                            messages=messages,
+                            agents=[agent_to_execute],
+                            agent_choice=True  # force the current agent to be called
+                        )
 
                 logger.success(
-                    f"Agent {agent_to_execute.get('name')} will be executed with args {response.tool_calls[0]["args"]}"
+                    f"Agent {agent_name} will be executed with args {response.tool_calls[0]["args"]}"
                 )
 
                 trace.update(
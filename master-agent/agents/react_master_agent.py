@@ -1,12 +1,15 @@
-from typing import Any
+from typing import Any, Optional
 
 from langchain_core.language_models import BaseChatModel
-from langchain_core.messages import AIMessage
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
 from loguru import logger
 
 from agents.base import BaseMasterAgent
 from models.states import MasterAgentState
+from utils.agent_retrieval import FIND_MORE_AGENTS_TOOL, FIND_MORE_AGENTS_TOOL_NAME, AgentIndex
 from utils.agents import select_agent_and_resolve_parameters
+from utils.context import build_context
+from utils.tool_schemas import SchemaCompactor
 from utils.tracing import trace_execution_time
 
 
@@ -14,7 +17,14 @@ class ReActMasterAgent(BaseMasterAgent):
     def __init__(
             self,
             model: BaseChatModel,
-            agents: list[dict[str, Any]]
+            agents: list[dict[str, Any]],
+            parallel_tool_calls: bool = False,
+            max_parallel_tool_calls: int = 1,
+            agent_index: Optional[AgentIndex] = None,
+            top_k: int = 0,
+            schema_compactor: Optional[SchemaCompactor] = None,
+            context_token_budget: int = 0,
+            max_message_tokens: int = 0
     ) -> None:
         """
         Supervisor agent building on top of ReAct framework to automatically execute available agents and flows.
@@ -23,9 +33,60 @@ class ReActMasterAgent(BaseMasterAgent):
         Args:
             model (BaseChatModel): Langchain chat model (preferably OpenAI or Azure OpenAI)
             agents (list[dict[str, Any]]): List of available agents
+            parallel_tool_calls (bool): Let the supervisor select several agents at once and run them concurrently
+            max_parallel_tool_calls (int): Maximum number of agents running at the same time in parallel mode
+            agent_index (Optional[AgentIndex]): Index over `agents`, used to bind only the agents relevant to the task
+            top_k (int): Number of agents bound per supervisor call, doubled whenever the LLM asks for more;
+                0 binds every agent
+            schema_compactor (Optional[SchemaCompactor]): Compacts the agent schemas and counts their tokens,
+                the schemas are bound as they are if not given
+            context_token_budget (int): Maximum number of tokens of a supervisor prompt, including the agent schemas;
+                older messages are left out to stay within it, 0 sends every message
+            max_message_tokens (int): Tool outputs and responses longer than this are truncated, 0 disables it
         """
-        super().__init__(model, agents)
-        self._agents_to_bind_to_llm = [item["agent_schema"] for item in agents]
+        super().__init__(model, agents, parallel_tool_calls, max_parallel_tool_calls)
+        self.agent_index = agent_index
+        self.top_k = top_k
+        self.context_token_budget = context_token_budget
+        self.max_message_tokens = max_message_tokens
+        self._schema_tokens: dict[str, int] = {}
+        self._schemas: dict[str, dict[str, Any]] = {}
+        for item in agents:
+            if schema_compactor is None:
+                self._schemas[item["name"]] = item["agent_schema"]
+                continue
+            compact = schema_compactor.compact(item["agent_schema"])
+            self._schemas[item["name"]] = compact.schema
+            self._schema_tokens[item["name"]] = compact.tokens
+        self._agents_to_bind_to_llm = list(self._schemas.values())
+
+    def _agents_for(self, messages: list[BaseMessage], k: int) -> tuple[list[str], bool]:
+        """
+        Retrieves the names of the k agents best matching the last user message.
+        Returns every agent if there are no more than k of them.
+
+        Returns:
+            tuple[list[str], bool]: Names of the agents to bind, and whether some agents were left out
+        """
+        if self.agent_index is None or not 0 < k < len(self.agent_index):
+            return list(self._schemas), False
+
+        query = next((str(message.content) for message in reversed(messages) if isinstance(message, HumanMessage)), "")
+        return [item["name"] for item in self.agent_index.search(query, k) if item["name"] in self._schemas], True
+
+    def _context_for(self, messages: list[BaseMessage], names: list[str]) -> list[BaseMessage]:
+        """
+        Fits the messages into the token budget left by the schemas of the bound agents.
+        """
+        budget = 0
+        if self.context_token_budget:
+            schema_tokens = sum(self._schema_tokens.get(name, 0) for name in names)
+            budget = max(self.context_token_budget - schema_tokens, 1)
+
+        context = build_context(messages, budget=budget, max_message_tokens=self.max_message_tokens)
+        if context.dropped:
+            logger.info(f"Left {len(context.dropped)} older messages out of the prompt to stay within the token budget")
+        return context.messages
 
     async def select_agent(self, state: MasterAgentState):
         """
@@ -41,14 +102,34 @@ class ReActMasterAgent(BaseMasterAgent):
 
         try:
             async with trace_execution_time(trace=trace):
-                response = await select_agent_and_resolve_parameters(
-                    model=self.model,
-                    messages=messages,
-                    agents=self._agents_to_bind_to_llm
-                )
+                k = self.top_k
+                while True:
+                    names, is_partial = self._agents_for(messages, k)
+                    agents = [self._schemas[name] for name in names]
+                    if is_partial:
+                        # lets the LLM ask for more agents if none of these fits the task
+                        agents.append(FIND_MORE_AGENTS_TOOL)
+                    response = await select_agent_and_resolve_parameters(
+                        model=self.model,
+                        messages=self._context_for(messages, names),
+                        agents=agents,
+                        parallel_tool_calls=self.parallel_tool_calls
+                    )
+                    if not (is_partial and any(
+                            tool_call["name"] == FIND_MORE_AGENTS_TOOL_NAME for tool_call in response.tool_calls
+                    )):
+                        break
+                    k *= 2
+                    logger.info(f"None of the retrieved agents fits the task, retrying with {k} agents")
+
+            if self._schema_tokens:
+                tool_schema_tokens = {name: self._schema_tokens[name] for name in names}
+                logger.info(f"Bound {len(names)} agents, {sum(tool_schema_tokens.values())} tokens of schemas")
+                trace["tool_schema_tokens"] = tool_schema_tokens
 
             if response.tool_calls:
-                logger.success(f"Selected {response.tool_calls[0]["name"]} with args {response.tool_calls[0]["args"]}")
+                for tool_call in response.tool_calls:
+                    logger.success(f"Selected {tool_call["name"]} with args {tool_call["args"]}")
             else:
                 logger.success(f"No agent is selected, generating final response")
 
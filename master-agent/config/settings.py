@@ -24,4 +24,92 @@ class Settings(BaseSettings):
     SECRET_KEY: str = Field(
         default="GenAI-ddc5e9f5-c340-4dcc-9872-d7f098b6b172",
         alias="SECRET_KEY"
-    )
\ No newline at end of file
+    )
+
+    # LLM clients are pooled by provider configs, to reuse their connections between requests
+    LLM_CLIENT_POOL_MAX_SIZE: int = Field(
+        default=32, alias="LLM_CLIENT_POOL_MAX_SIZE"
+    )
+    LLM_CLIENT_IDLE_TIMEOUT_SECONDS: float = Field(
+        default=600, alias="LLM_CLIENT_IDLE_TIMEOUT_SECONDS"
+    )
+
+    # agent catalog: served from cache for AGENT_CATALOG_TTL_SECONDS, the backend publishes
+    # invalidations to AGENT_CATALOG_CHANNEL when agents change; AGENT_CATALOG_CACHE_SIZE entries
+    # (one per user and agent type) are kept
+    AGENT_CATALOG_TTL_SECONDS: float = Field(
+        default=30, alias="AGENT_CATALOG_TTL_SECONDS"
+    )
+    AGENT_CATALOG_CACHE_SIZE: int = Field(
+        default=1000, alias="AGENT_CATALOG_CACHE_SIZE"
+    )
+    REDIS_URL: str = Field(
+        default="redis://genai-redis:6379/0", alias="REDIS_URL"
+    )
+    AGENT_CATALOG_CHANNEL: str = Field(
+        default="agent_catalog_invalidations", alias="AGENT_CATALOG_CHANNEL"
+    )
+
+    # chat history of recent sessions, kept in memory and appended after every turn
+    SESSION_HISTORY_CACHE_SIZE: int = Field(
+        default=1000, alias="SESSION_HISTORY_CACHE_SIZE"
+    )
+    SESSION_HISTORY_TTL_SECONDS: float = Field(
+        default=1800, alias="SESSION_HISTORY_TTL_SECONDS"
+    )
+    SESSION_HISTORY_MAX_MESSAGES: int = Field(
+        default=50, alias="SESSION_HISTORY_MAX_MESSAGES"
+    )
+
+    # parallel mode: the supervisor may select several agents per step, they run concurrently
+    # up to MAX_PARALLEL_TOOL_CALLS at a time; both can be overridden per request in the LLM configs
+    PARALLEL_TOOL_CALLS: bool = Field(
+        default=False, alias="PARALLEL_TOOL_CALLS"
+    )
+    MAX_PARALLEL_TOOL_CALLS: int = Field(
+        default=4, alias="MAX_PARALLEL_TOOL_CALLS"
+    )
+
+    # agent retrieval: the supervisor is only given the AGENT_RETRIEVAL_TOP_K agents matching the task best
+    # and can ask for more; 0 gives it every agent, can be overridden per request in the LLM configs
+    AGENT_RETRIEVAL_TOP_K: int = Field(
+        default=20, alias="AGENT_RETRIEVAL_TOP_K"
+    )
+    AGENT_INDEX_CACHE_SIZE: int = Field(
+        default=1000, alias="AGENT_INDEX_CACHE_SIZE"
+    )
+
+    # agent schemas are compacted before they are bound to the LLM, descriptions are cut to these lengths
+    MAX_TOOL_DESCRIPTION_LENGTH: int = Field(
+        default=1024, alias="MAX_TOOL_DESCRIPTION_LENGTH"
+    )
+    MAX_PARAMETER_DESCRIPTION_LENGTH: int = Field(
+        default=256, alias="MAX_PARAMETER_DESCRIPTION_LENGTH"
+    )
+    SCHEMA_CACHE_SIZE: int = Field(
+        default=5000, alias="SCHEMA_CACHE_SIZE"
+    )
+
+    # supervisor prompts are fit into a token budget per model, the latest turns first; longer tool outputs
+    # are truncated and turns left out are replaced by a rolling summary, built from the last
+    # HISTORY_WINDOW_MESSAGES messages (keep it within SESSION_HISTORY_MAX_MESSAGES to serve them from cache);
+    # can be overridden per request
+    CONTEXT_TOKEN_BUDGET: int = Field(
+        default=16000, alias="CONTEXT_TOKEN_BUDGET"
+    )
+    CONTEXT_TOKEN_BUDGETS: dict[str, int] = Field(
+        default={}, alias="CONTEXT_TOKEN_BUDGETS"
+    )
+    HISTORY_WINDOW_MESSAGES: int = Field(
+        default=50, alias="HISTORY_WINDOW_MESSAGES"
+    )
+    MAX_MESSAGE_TOKENS: int = Field(
+        default=2000, alias="MAX_MESSAGE_TOKENS"
+    )
+    CONVERSATION_SUMMARY_MAX_TOKENS: int = Field(
+        default=500, alias="CONVERSATION_SUMMARY_MAX_TOKENS"
+    )
+    # messages past the last `max_last_messages` are summarized in batches of this many
+    CONVERSATION_SUMMARY_MIN_NEW_MESSAGES: int = Field(
+        default=6, alias="CONVERSATION_SUMMARY_MIN_NEW_MESSAGES"
+    )
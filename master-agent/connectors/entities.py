@@ -2,13 +2,14 @@ import uuid
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import Any
+from typing import Any, Optional
 
 from genai_session.session import GenAISession
 from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import BaseMessage
 
 from agents.flow_master_agent import FlowMasterAgent
+from utils.streaming import StreamHandler
 
 
 class AgentTypeEnum(Enum):
@@ -52,6 +53,7 @@ class MCPConfig(AgentConfig):
 class GenAIConfig(AgentConfig):
     arguments: dict
     session: GenAISession
+    stream_relay: Optional[StreamHandler] = None
 
     def __post_init__(self):
         self.agent_type = AgentTypeEnum.gen_ai.value
@@ -63,13 +65,18 @@ class GenAIFlowConfig(AgentConfig):
     model: BaseChatModel
     messages: list[BaseMessage]
     session: GenAISession
+    stream_relay: Optional[StreamHandler] = None
+    arguments: dict = field(default_factory=dict)
+    input_mappings: list[Optional[dict[str, str]]] = field(default_factory=list)
     flow_master_agent: FlowMasterAgent = field(init=False)
 
     def __post_init__(self):
         self.agent_type = AgentTypeEnum.flow.value
         self.flow_master_agent = FlowMasterAgent(
             model=self.model,
-            agents=self.agents
+            agents=self.agents,
+            arguments=self.arguments,
+            input_mappings=self.input_mappings
         )
 
 
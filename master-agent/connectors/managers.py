@@ -9,6 +9,7 @@ from mcp.client.session import ClientSession
 from mcp.client.streamable_http import streamablehttp_client
 
 from connectors.entities import ConnectorStrategy, A2AConfig, GenAIConfig, MCPConfig, GenAIFlowConfig
+from utils.streaming import send_with_stream
 from utils.tracing import trace_execution_time
 
 
@@ -130,10 +131,20 @@ class GenAIConnector(ConnectorStrategy):
         }
         try:
             session: GenAISession = config.session
-            response = await session.send(
-                client_id=config.id,
-                message=config.arguments
-            )
+            if config.stream_relay:
+                response = await send_with_stream(
+                    session=session,
+                    client_id=config.id,
+                    message=config.arguments,
+                    on_stream=config.stream_relay,
+                    request_id=config.stream_relay.request_id,
+                    session_id=config.stream_relay.session_id
+                )
+            else:
+                response = await session.send(
+                    client_id=config.id,
+                    message=config.arguments
+                )
 
             trace.update(
                 {
@@ -170,9 +181,9 @@ class GenAIFlowConnector(ConnectorStrategy):
         }
 
         async with trace_execution_time(trace=trace):
-            final_state = await config.flow_master_agent.graph.ainvoke(
+            final_state = await config.flow_master_agent.ainvoke(
                 input={"messages": config.messages.copy()},
-                config={"configurable": {"session": session}}
+                config={"configurable": {"session": session, "stream_relay": config.stream_relay}}
             )
 
         response = final_state["messages"][-1].content
@@ -4,11 +4,25 @@ from langchain_core.language_models import BaseChatModel
 from langchain_ollama import ChatOllama
 from langchain_openai import ChatOpenAI, AzureChatOpenAI
 
+from config.settings import Settings
 from llms.custom import ChatGenAI
+from llms.pool import LLMClientPool, client_key
+
+app_settings = Settings()
+
+# configs identifying the client of a provider, requests sharing them share the client
+CLIENT_CONFIG_KEYS = ("provider", "endpoint", "base_url", "api_version", "model", "api_key")
+
+# configs applied per request on a copy of the pooled client
+REQUEST_CONFIG_KEYS = ("temperature",)
 
 
 class LLMFactory:
     _registry = {}
+    _pool = LLMClientPool(
+        max_size=app_settings.LLM_CLIENT_POOL_MAX_SIZE,
+        idle_timeout=app_settings.LLM_CLIENT_IDLE_TIMEOUT_SECONDS
+    )
 
     @classmethod
     def register(cls, name: str):
@@ -26,7 +40,12 @@ class LLMFactory:
         if not constructor:
             raise ValueError(f"Unknown LLM provider: {llm_provider}")
 
-        return constructor(configs)
+        llm = cls._pool.get(
+            key=client_key({**configs, "provider": llm_provider}, CLIENT_CONFIG_KEYS),
+            create=lambda: constructor(configs)
+        )
+        # shallow copy: the request settings change, the HTTP client and its connections are shared
+        return llm.model_copy(update={key: configs.get(key) for key in REQUEST_CONFIG_KEYS})
 
 
 @LLMFactory.register("openai")
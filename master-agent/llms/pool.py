@@ -0,0 +1,87 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+from langchain_core.language_models import BaseChatModel
+from loguru import logger
+
+
+def client_key(configs: dict[str, Any], keys: tuple[str, ...]) -> str:
+    """
+    Hashes the parts of the LLM configs that identify a client, so credentials are not kept as keys.
+
+    Args:
+        configs (dict[str, Any]): LLM configs of the request
+        keys (tuple[str, ...]): Config keys identifying the client, e.g. provider, endpoint, model, api_key
+
+    Returns:
+        str: SHA-256 of the identifying configs
+    """
+    identity = json.dumps({key: configs.get(key) for key in keys}, sort_keys=True, default=str)
+    return hashlib.sha256(identity.encode()).hexdigest()
+
+
+class LLMClientPool:
+    def __init__(
+            self,
+            max_size: int,
+            idle_timeout: float,
+            clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        """
+        LRU-bounded pool of chat models, so requests with the same provider configs reuse the
+        underlying HTTP client and its keep-alive connections instead of opening new ones.
+        Evicted models are only dropped, requests still using them keep working.
+
+        Args:
+            max_size (int): Maximum number of pooled models, the least recently used one is evicted first
+            idle_timeout (float): Seconds after which an unused model is evicted, 0 disables it
+            clock (Callable[[], float]): Monotonic time source, in seconds
+        """
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._clock = clock
+        self._models: OrderedDict[str, tuple[BaseChatModel, float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+    def get(self, key: str, create: Callable[[], BaseChatModel]) -> BaseChatModel:
+        """
+        Returns the pooled model for the key, creating it if needed.
+
+        Args:
+            key (str): Hash of the client configs, see `client_key`
+            create (Callable[[], BaseChatModel]): Builds the model if it is not pooled
+
+        Returns:
+            BaseChatModel: The pooled model, shared between requests
+        """
+        now = self._clock()
+        self._evict_idle(now)
+
+        if key in self._models:
+            model, _ = self._models.pop(key)
+        else:
+            model = create()
+            logger.debug("Created pooled LLM client")
+
+        self._models[key] = (model, now)
+        while len(self._models) > self.max_size:
+            self._models.popitem(last=False)
+        return model
+
+    def _evict_idle(self, now: float) -> None:
+        if not self.idle_timeout:
+            return
+        # ordered by last use, the idle models are at the front
+        while self._models:
+            _, last_used = next(iter(self._models.values()))
+            if now - last_used < self.idle_timeout:
+                break
+            self._models.popitem(last=False)
+
+    def clear(self) -> None:
+        self._models.clear()
@@ -1,18 +1,26 @@
 import asyncio
+import json
+from functools import partial
 from typing import Any, Optional
 
 from genai_session.session import GenAISession
 from genai_session.utils.context import GenAIContext
-from langchain_core.messages import SystemMessage
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from loguru import logger
 
 from agents.react_master_agent import ReActMasterAgent
 from config.settings import Settings
 from llms import LLMFactory
-from prompts import FILE_RELATED_SYSTEM_PROMPT
-from utils.agents import get_agents
-from utils.chat_history import get_chat_history
+from prompts import FILE_RELATED_SYSTEM_PROMPT, HISTORY_SUMMARY_PREFIX
+from utils.agent_catalog import AgentCatalog
+from utils.agent_retrieval import AgentIndexCache
+from utils.agents import summarize_messages
+from utils.chat_history import SessionHistoryCache, get_chat_history
 from utils.common import attach_files_to_message
+from utils.context import ConversationSummaries, build_context, shorten_message
+from utils.streaming import StreamRelay
+from utils.tokens import count_tokens
+from utils.tool_schemas import SchemaCompactor
 
 app_settings = Settings()
 
@@ -21,6 +29,32 @@ session = GenAISession(
     ws_url=app_settings.ROUTER_WS_URL
 )
 
+agent_catalog = AgentCatalog(
+    url=f"{app_settings.BACKEND_API_URL}/agents/active",
+    api_key=app_settings.MASTER_BE_API_KEY,
+    ttl=app_settings.AGENT_CATALOG_TTL_SECONDS,
+    max_entries=app_settings.AGENT_CATALOG_CACHE_SIZE
+)
+
+agent_indexes = AgentIndexCache(max_users=app_settings.AGENT_INDEX_CACHE_SIZE)
+
+schema_compactor = SchemaCompactor(
+    max_description_length=app_settings.MAX_TOOL_DESCRIPTION_LENGTH,
+    max_parameter_description_length=app_settings.MAX_PARAMETER_DESCRIPTION_LENGTH,
+    max_size=app_settings.SCHEMA_CACHE_SIZE
+)
+
+session_history = SessionHistoryCache(
+    max_sessions=app_settings.SESSION_HISTORY_CACHE_SIZE,
+    ttl=app_settings.SESSION_HISTORY_TTL_SECONDS,
+    max_messages=app_settings.SESSION_HISTORY_MAX_MESSAGES
+)
+
+conversation_summaries = ConversationSummaries(
+    max_sessions=app_settings.SESSION_HISTORY_CACHE_SIZE,
+    max_tokens=app_settings.CONVERSATION_SUMMARY_MAX_TOKENS
+)
+
 
 @session.bind(name="MasterAgent", description="Master agent that orchestrates other agents")
 async def receive_message(
@@ -29,10 +63,22 @@ async def receive_message(
         user_id: str,
         configs: dict[str, Any],
         files: Optional[list[dict[str, Any]]],
-        timestamp: str
+        timestamp: str,
+        message: Optional[str] = None,
+        message_count: Optional[int] = None
 ):
+    # read before the first await, the agent context is updated by every incoming request
+    request_id = agent_context.request_id
     try:
-        graph_config = {"configurable": {"session": session}, "recursion_limit": 100}  # recursion_limit can be adjusted
+        stream_relay = StreamRelay(
+            websocket=agent_context.websocket,
+            request_id=request_id,
+            session_id=session_id
+        )
+        graph_config = {
+            "configurable": {"session": session, "stream_relay": stream_relay},
+            "recursion_limit": 100  # recursion_limit can be adjusted
+        }
 
         base_system_prompt = configs.get("system_prompt")
         user_system_prompt = configs.get("user_prompt")
@@ -40,33 +86,84 @@ async def receive_message(
         system_prompt = user_system_prompt or base_system_prompt
         system_prompt = f"{system_prompt}\n\n{FILE_RELATED_SYSTEM_PROMPT}"
 
-        chat_history = await get_chat_history(
-            f"{app_settings.BACKEND_API_URL}/chat",
-            session_id=session_id,
-            user_id=user_id,
-            api_key=app_settings.MASTER_BE_API_KEY,
-            max_last_messages=configs.get("max_last_messages", 5)
+        max_last_messages = configs.get("max_last_messages", 5)
+        # messages before the last `max_last_messages` are only fetched to be summarized
+        history_window = max(max_last_messages, app_settings.HISTORY_WINDOW_MESSAGES)
+        context_token_budget = configs.get(
+            "context_token_budget",
+            app_settings.CONTEXT_TOKEN_BUDGETS.get(configs.get("model"), app_settings.CONTEXT_TOKEN_BUDGET)
         )
-
-        chat_history[-1] = attach_files_to_message(message=chat_history[-1], files=files) if files else chat_history[-1]
-        init_messages = [
-            SystemMessage(content=system_prompt),
-            *chat_history
-        ]
-
-        agents = await get_agents(
-            url=f"{app_settings.BACKEND_API_URL}/agents/active",
-            agent_type="all",
-            api_key=app_settings.MASTER_BE_API_KEY,
-            user_id=user_id
+        max_message_tokens = configs.get("max_message_tokens", app_settings.MAX_MESSAGE_TOKENS)
+        chat_history = None
+        if message is not None and message_count is not None:
+            chat_history = session_history.get(
+                user_id=user_id,
+                session_id=session_id,
+                message=message,
+                message_count=message_count,
+                max_last_messages=history_window
+            )
+
+        if chat_history is None:
+            chat_history = await get_chat_history(
+                f"{app_settings.BACKEND_API_URL}/chat",
+                session_id=session_id,
+                user_id=user_id,
+                api_key=app_settings.MASTER_BE_API_KEY,
+                max_last_messages=history_window
+            )
+            if message_count is not None:
+                session_history.put(
+                    user_id=user_id,
+                    session_id=session_id,
+                    messages=chat_history,
+                    message_count=message_count
+                )
+
+        if files:
+            chat_history[-1] = HumanMessage(
+                content=attach_files_to_message(message=chat_history[-1].content, files=files)
+            )
+
+        system_messages = [SystemMessage(content=system_prompt)]
+        if summary := conversation_summaries.get(user_id=user_id, session_id=session_id):
+            system_messages.append(SystemMessage(content=f"{HISTORY_SUMMARY_PREFIX}\n{summary.text}"))
+
+        # the latest turns that fit into the budget, older ones are covered by the summary. Messages that left
+        # the last `max_last_messages` are summarized in batches and stay in the window until they are
+        recent_start = max(len(chat_history) - max(max_last_messages, 1), 0)
+        window_start = recent_start
+        if message_count is not None:
+            covered = summary.message_count if summary else 0
+            window_start = min(recent_start, max(covered - (message_count - len(chat_history)), 0))
+        context = build_context(
+            [*system_messages, *chat_history[window_start:]],
+            budget=context_token_budget,
+            max_message_tokens=max_message_tokens
         )
+        init_messages = context.messages
+        # messages older than the last `max_last_messages`, and any the budget left out of the window
+        summarized_end = max(recent_start, window_start + len(context.dropped))
+        dropped = [shorten_message(message, max_message_tokens) for message in chat_history[:summarized_end]]
+
+        agents = await agent_catalog.get(user_id=user_id)
 
         llm = LLMFactory.create(configs=configs)
-        master_agent = ReActMasterAgent(model=llm, agents=agents)
+        master_agent = ReActMasterAgent(
+            model=llm,
+            agents=agents,
+            parallel_tool_calls=configs.get("parallel_tool_calls", app_settings.PARALLEL_TOOL_CALLS),
+            max_parallel_tool_calls=configs.get("max_parallel_tool_calls", app_settings.MAX_PARALLEL_TOOL_CALLS),
+            agent_index=agent_indexes.get(user_id=user_id, agents=agents),
+            top_k=configs.get("agent_top_k", app_settings.AGENT_RETRIEVAL_TOP_K),
+            schema_compactor=schema_compactor,
+            context_token_budget=context_token_budget,
+            max_message_tokens=max_message_tokens
+        )
 
         logger.info("Running Master Agent")
 
-        final_state = await master_agent.graph.ainvoke(
+        final_state = await master_agent.ainvoke(
             input={"messages": init_messages},
             config=graph_config
         )
@@ -75,7 +172,19 @@ async def receive_message(
 
         logger.success("Master Agent run successfully")
 
-        return {"agents_trace": final_state["trace"], "response": response, "is_success": True}
+        result = {"agents_trace": final_state["trace"], "response": response, "is_success": True}
+
+        if dropped and message_count is not None:
+            conversation_summaries.update_in_background(
+                user_id=user_id,
+                session_id=session_id,
+                dropped=dropped,
+                first_position=message_count - len(chat_history) + 1,
+                summarize=partial(summarize_messages, llm),
+                # turns cut for the token budget are summarized right away, messages that only
+                # left the last `max_last_messages` once enough of them have piled up
+                min_new_messages=1 if context.dropped else app_settings.CONVERSATION_SUMMARY_MIN_NEW_MESSAGES
+            )
 
     except Exception as e:
         error_message = f"Unexpected error while running Master Agent: {e}"
@@ -86,12 +195,28 @@ async def receive_message(
             "output": error_message,
             "is_success": False
         }
-        return {"agents_trace": [trace], "response": error_message, "is_success": False}
+        result = {"agents_trace": [trace], "response": error_message, "is_success": False}
+
+    if message_count is not None:
+        # the backend stores the returned dict as JSON content of the next message
+        session_history.append(user_id=user_id, session_id=session_id, message=AIMessage(content=json.dumps(result)))
+    return result
 
 
 async def main():
     logger.info("Master Agent started")
-    await session.process_events()
+    # the tokenizer may be downloaded on first use, which shouldn't block a request
+    await asyncio.to_thread(count_tokens, "")
+    invalidations = asyncio.create_task(
+        agent_catalog.listen_for_invalidations(
+            redis_url=app_settings.REDIS_URL,
+            channel=app_settings.AGENT_CATALOG_CHANNEL
+        )
+    )
+    try:
+        await session.process_events()
+    finally:
+        invalidations.cancel()
 
 
 if __name__ == "__main__":
@@ -5,4 +5,10 @@ class Nodes(StrEnum):
     supervisor = "supervisor"
     execute_agent = "execute_agent"
 
+
+class StreamMessageType(StrEnum):
+    start = "agent_stream_start"
+    chunk = "agent_stream_chunk"
+    end = "agent_stream_end"
+
 print(Nodes.supervisor.value)
\ No newline at end of file
@@ -1 +1 @@
-from prompts.prompts import FILE_RELATED_SYSTEM_PROMPT  # noqa: F401
+from prompts.prompts import FILE_RELATED_SYSTEM_PROMPT, HISTORY_SUMMARY_PROMPT, HISTORY_SUMMARY_PREFIX  # noqa: F401
@@ -16,4 +16,13 @@ NOTE: it's just an example of file structure, not a real file.
 
 If any tool requires a file (or files) as input, pass file ID (or list of file IDs).
 Use files metadata to correctly select the tool and the file.
-"""
\ No newline at end of file
+"""
+
+HISTORY_SUMMARY_PROMPT = """
+You summarize conversations between a user and an assistant that orchestrates other agents.
+Given the current summary, if any, and new messages, write an updated summary of the whole conversation.
+Keep the facts, decisions, user preferences, file IDs and agent results that later messages may refer to.
+Leave out greetings and repetitions. Answer with the summary only, in at most 300 words.
+"""
+
+HISTORY_SUMMARY_PREFIX = "Summary of the earlier conversation, its messages are no longer included:"
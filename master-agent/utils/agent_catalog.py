@@ -0,0 +1,157 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import httpx
+import redis.asyncio as redis
+from loguru import logger
+
+
+@dataclass
+class CatalogEntry:
+    agents: list[dict[str, Any]]
+    etag: Optional[str]
+    fetched_at: float
+
+
+class AgentCatalog:
+    def __init__(self, url: str, api_key: str, ttl: float, max_entries: int) -> None:
+        """
+        Per-user cache of the agents available to the Master Agent. Entries are served without
+        asking the backend for `ttl` seconds, then revalidated with their ETag, so an unchanged
+        catalog costs a 304 instead of the whole agent query. The backend publishes an
+        invalidation whenever an agent, flow, MCP server or A2A card of a user changes, see
+        `listen_for_invalidations`.
+
+        Args:
+            url (str): URL of the active agents endpoint of the backend
+            api_key (str): API key of the backend
+            ttl (float): Seconds an entry is served without revalidation, 0 always revalidates
+            max_entries (int): Maximum number of entries, the least recently used one is evicted first
+        """
+        self.url = url
+        self.api_key = api_key
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple[str, str], CatalogEntry] = OrderedDict()
+        self._client: Optional[httpx.AsyncClient] = None
+        # every invalidation of a user moves it to a new generation, a fetch that started in an older
+        # generation may predate the change and is not cached. Users whose generation was evicted
+        # are in the newest evicted generation, which at worst skips caching a fresh response
+        self._generations: OrderedDict[str, int] = OrderedDict()
+        self._last_generation = 0
+        self._evicted_generation = 0
+
+    async def get(self, user_id: str, agent_type: str = "all") -> list[dict[str, Any]]:
+        """
+        Returns the active agents of a user, from the cache if the entry is fresh.
+
+        Args:
+            user_id (str): ID of the user
+            agent_type (str): Type of agents to list, `all` for every type
+
+        Returns:
+            list[dict[str, Any]]: The active agents
+        """
+        key = (user_id, agent_type)
+        entry = self._entries.get(key)
+        if entry:
+            self._entries.move_to_end(key)
+            if time.monotonic() - entry.fetched_at < self.ttl:
+                return entry.agents
+        generation = self._generation(user_id)
+
+        if self._client is None:
+            self._client = httpx.AsyncClient()
+
+        headers = {"X-API-KEY": self.api_key}
+        if entry and entry.etag:
+            headers["If-None-Match"] = entry.etag
+
+        response = await self._client.get(
+            self.url,
+            headers=headers,
+            params={"agent_type": agent_type, "user_id": user_id},
+        )
+
+        if response.status_code == httpx.codes.NOT_MODIFIED and entry:
+            entry.fetched_at = time.monotonic()
+            return entry.agents
+
+        response.raise_for_status()
+        agents = response.json()["active_connections"]
+        if self._generation(user_id) != generation:
+            # invalidated while the request was in flight
+            return agents
+
+        self._entries[key] = CatalogEntry(
+            agents=agents,
+            etag=response.headers.get("ETag"),
+            fetched_at=time.monotonic()
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return agents
+
+    def invalidate(self, user_ids: Optional[list[str]] = None) -> None:
+        """
+        Drops the entries of the given users, or of every user if `user_ids` is None.
+        Responses to requests sent before the invalidation are not cached.
+        """
+        self._last_generation += 1
+        if user_ids is None:
+            self._entries.clear()
+            self._generations.clear()
+            self._evicted_generation = self._last_generation
+            return
+
+        invalidated = set(user_ids)
+        for user_id in invalidated:
+            self._generations.pop(user_id, None)
+            self._generations[user_id] = self._last_generation
+        while len(self._generations) > self.max_entries:
+            _, evicted = self._generations.popitem(last=False)
+            self._evicted_generation = max(self._evicted_generation, evicted)
+
+        for key in [key for key in self._entries if key[0] in invalidated]:
+            del self._entries[key]
+
+    def _generation(self, user_id: str) -> int:
+        return self._generations.get(user_id, self._evicted_generation)
+
+    async def listen_for_invalidations(self, redis_url: str, channel: str) -> None:
+        """
+        Applies the invalidations published by the backend until cancelled. Whenever the
+        subscription is (re)established the whole cache is dropped, since invalidations
+        published in the meantime are lost.
+
+        Args:
+            redis_url (str): URL of the Redis server the backend publishes to
+            channel (str): Pub/sub channel of the invalidations
+        """
+        retry_delay = 1
+        while True:
+            try:
+                async with redis.from_url(redis_url) as client:
+                    async with client.pubsub() as pubsub:
+                        await pubsub.subscribe(channel)
+                        self.invalidate()
+                        retry_delay = 1
+                        logger.info(f"Listening for agent catalog invalidations on {channel}")
+
+                        async for message in pubsub.listen():
+                            if message["type"] != "message":
+                                continue
+                            self.invalidate(json.loads(message["data"]).get("user_ids"))
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Agent catalog invalidations unavailable, retrying in {retry_delay}s: {e}")
+                # without invalidations entries may be stale until their TTL passes
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, 30)
@@ -0,0 +1,179 @@
+import math
+import re
+from collections import Counter, OrderedDict
+from typing import Any, Iterator
+
+from utils.tool_schemas import schema_fingerprint
+
+# schema keys whose values describe what an agent does
+DESCRIPTIVE_KEYS = ("name", "title", "description")
+
+TOKEN_PATTERN = re.compile(r"[A-Za-z][a-z]+|[A-Z]+(?![a-z])|\d+")
+
+# the supervisor calls this tool when none of the retrieved agents fits the task
+FIND_MORE_AGENTS_TOOL_NAME = "find_more_agents"
+FIND_MORE_AGENTS_TOOL = {
+    "type": "function",
+    "function": {
+        "name": FIND_MORE_AGENTS_TOOL_NAME,
+        "description": "Call this only if none of the other tools can help with the task, "
+                       "to get more tools to choose from.",
+        "parameters": {"type": "object", "properties": {}},
+    },
+}
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Splits text into lowercase words, including the parts of snake_case and camelCase names.
+    """
+    return [token.lower() for token in TOKEN_PATTERN.findall(text)]
+
+
+def _schema_text(schema: Any) -> Iterator[str]:
+    if isinstance(schema, dict):
+        for key, value in schema.items():
+            if key in DESCRIPTIVE_KEYS and isinstance(value, str):
+                yield value
+            elif key == "properties" and isinstance(value, dict):
+                yield from value.keys()
+                yield from _schema_text(value)
+            else:
+                yield from _schema_text(value)
+    elif isinstance(schema, list):
+        for item in schema:
+            yield from _schema_text(item)
+
+
+def agent_document(agent: dict[str, Any]) -> str:
+    """
+    Text an agent is retrieved by: its name, description and the names and descriptions in its schema.
+    """
+    return " ".join((agent.get("name") or "", agent.get("description") or "", *_schema_text(agent.get("agent_schema"))))
+
+
+class AgentIndex:
+    def __init__(self, k1: float = 1.5, b: float = 0.75) -> None:
+        """
+        BM25 index over the agents available to a user. `update` only re-indexes agents that were
+        added or whose schema changed, so a changed catalog does not rebuild the whole index.
+
+        Args:
+            k1 (float): BM25 term frequency saturation
+            b (float): BM25 document length normalization
+        """
+        self.k1 = k1
+        self.b = b
+        self._agents: dict[str, dict[str, Any]] = {}
+        self._fingerprints: dict[str, str] = {}
+        self._term_frequencies: dict[str, Counter[str]] = {}
+        self._lengths: dict[str, int] = {}
+        self._document_frequencies: Counter[str] = Counter()
+        self._total_length = 0
+        self._source: list[dict[str, Any]] | None = None
+
+    def __len__(self) -> int:
+        return len(self._agents)
+
+    def update(self, agents: list[dict[str, Any]]) -> None:
+        """
+        Brings the index in line with the agent catalog.
+
+        Args:
+            agents (list[dict[str, Any]]): The current agent catalog, agents are identified by name
+        """
+        if agents is self._source:
+            return  # the catalog is cached, nothing changed
+        self._source = agents
+
+        current = {agent["name"]: agent for agent in agents}
+        for name in self._agents.keys() - current.keys():
+            self._remove(name)
+
+        for name, agent in current.items():
+            fingerprint = schema_fingerprint(agent.get("agent_schema"))
+            if self._fingerprints.get(name) == fingerprint:
+                self._agents[name] = agent
+                continue
+            if name in self._agents:
+                self._remove(name)
+            self._add(name, agent, fingerprint)
+
+        # re-added agents went to the end, search() returns agents in catalog order
+        self._agents = {name: self._agents[name] for name in current}
+
+    def _add(self, name: str, agent: dict[str, Any], fingerprint: str) -> None:
+        tokens = tokenize(agent_document(agent))
+        self._agents[name] = agent
+        self._fingerprints[name] = fingerprint
+        self._term_frequencies[name] = Counter(tokens)
+        self._lengths[name] = len(tokens)
+        self._document_frequencies.update(self._term_frequencies[name].keys())
+        self._total_length += len(tokens)
+
+    def _remove(self, name: str) -> None:
+        self._document_frequencies.subtract(self._term_frequencies.pop(name).keys())
+        self._total_length -= self._lengths.pop(name)
+        del self._agents[name]
+        del self._fingerprints[name]
+
+    def search(self, query: str, k: int) -> list[dict[str, Any]]:
+        """
+        Returns the k agents that best match the query, in catalog order. Agents that don't
+        match at all fill up the remaining places, so k agents are returned whenever possible.
+
+        Args:
+            query (str): The task, e.g. the last user message
+            k (int): Number of agents to return
+
+        Returns:
+            list[dict[str, Any]]: The retrieved agents
+        """
+        if k >= len(self._agents):
+            return list(self._agents.values())
+
+        terms = set(tokenize(query))
+        average_length = self._total_length / len(self._agents) or 1
+        scores = {}
+        for name in self._agents:
+            frequencies = self._term_frequencies[name]
+            score = 0.0
+            for term in terms:
+                frequency = frequencies.get(term)
+                if not frequency:
+                    continue
+                document_frequency = self._document_frequencies[term]
+                idf = math.log(1 + (len(self._agents) - document_frequency + 0.5) / (document_frequency + 0.5))
+                length_norm = 1 - self.b + self.b * self._lengths[name] / average_length
+                score += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+            scores[name] = score
+
+        # sorted() is stable, agents with equal scores keep their catalog order
+        top = set(sorted(scores, key=scores.get, reverse=True)[:k])
+        return [agent for name, agent in self._agents.items() if name in top]
+
+
+class AgentIndexCache:
+    def __init__(self, max_users: int) -> None:
+        """
+        Keeps the agent index of the most recently active users.
+
+        Args:
+            max_users (int): Maximum number of indexes, the least recently used one is evicted first
+        """
+        self.max_users = max_users
+        self._indexes: OrderedDict[str, AgentIndex] = OrderedDict()
+
+    def get(self, user_id: str, agents: list[dict[str, Any]]) -> AgentIndex:
+        """
+        Returns the index of a user, updated to the given agent catalog.
+        """
+        index = self._indexes.pop(user_id, None)
+        if index is None:
+            # not `or`, an index without agents is falsy
+            index = AgentIndex()
+        index.update(agents)
+        self._indexes[user_id] = index
+        while len(self._indexes) > self.max_users:
+            self._indexes.popitem(last=False)
+        return index
@@ -1,14 +1,16 @@
-from typing import Any
+from typing import Any, Optional
 
 import httpx
 from langchain_core.language_models import BaseChatModel
-from langchain_core.messages import BaseMessage, AIMessage
-from langchain_openai import ChatOpenAI
+from langchain_core.messages import BaseMessage, AIMessage, HumanMessage, SystemMessage
 
 from llms.custom import ChatGenAI
+from prompts import HISTORY_SUMMARY_PROMPT
 from utils.common import bind_tools_safely, generate_hmac, combine_messages
 from config.settings import Settings
 
+app_settings = Settings()
+
 async def get_agents(url: str, agent_type: str, api_key: str, user_id: str):
     async with httpx.AsyncClient() as client:
         response = await client.get(
@@ -23,20 +25,49 @@ async def get_agents(url: str, agent_type: str, api_key: str, user_id: str):
     return agents["active_connections"]
 
 
+def _invoke_kwargs(model: BaseChatModel, messages: list[BaseMessage]) -> dict[str, Any]:
+    if not isinstance(model, ChatGenAI):
+        return {}
+    # the proxy verifies this signature, it is sent with this call only instead of rebuilding the model
+    return {"extra_headers": {"X-HMAC": generate_hmac(app_settings.SECRET_KEY, combine_messages(messages))}}
+
+
 async def select_agent_and_resolve_parameters(
         model: BaseChatModel,
         messages: list[BaseMessage],
         agents: list[dict[str, Any]],
-        agent_choice: bool = False
+        agent_choice: bool = False,
+        parallel_tool_calls: bool = False
 ) -> AIMessage:
-    if isinstance(model, ChatGenAI):
-        model_json = model.model_dump()
-        model_json["default_headers"] = {
-            "X-HMAC": generate_hmac(Settings().SECRET_KEY, combine_messages(messages))
-        }
-        model = ChatOpenAI.model_validate(model_json)
+    invoke_kwargs = _invoke_kwargs(model, messages)
 
-    model_with_agents = bind_tools_safely(model=model, tools=agents, tool_choice=agent_choice)
+    model_with_agents = bind_tools_safely(
+        model=model,
+        tools=agents,
+        parallel_tool_calls=parallel_tool_calls,
+        tool_choice=agent_choice
+    )
 
-    response = await model_with_agents.ainvoke(messages)
+    response = await model_with_agents.ainvoke(messages, **invoke_kwargs)
     return response
+
+
+async def summarize_messages(model: BaseChatModel, summary: Optional[str], messages: list[BaseMessage]) -> str:
+    """
+    Extends the summary of a conversation with the given messages.
+
+    Args:
+        model (BaseChatModel): Langchain chat model
+        summary (Optional[str]): Summary of the conversation before the messages, None if there is none
+        messages (list[BaseMessage]): Messages to add to the summary, oldest first
+
+    Returns:
+        str: The extended summary
+    """
+    transcript = "\n\n".join(f"{message.type}: {message.content}" for message in messages)
+    if summary:
+        transcript = f"Current summary:\n{summary}\n\nNew messages:\n{transcript}"
+
+    prompt = [SystemMessage(content=HISTORY_SUMMARY_PROMPT), HumanMessage(content=transcript)]
+    response = await model.ainvoke(prompt, **_invoke_kwargs(model, prompt))
+    return str(response.content)
@@ -1,3 +1,8 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
 import httpx
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
 
@@ -32,3 +37,91 @@ async def get_chat_history(url: str, session_id: str, user_id: str, api_key: str
 
     messages = chat_history_to_messages(chat_history=raw_chat_history[::-1])
     return messages
+
+
+@dataclass
+class SessionHistory:
+    messages: list[BaseMessage]
+    message_count: int  # messages in the conversation on the backend, including older ones not kept here
+    updated_at: float
+
+
+class SessionHistoryCache:
+    def __init__(self, max_sessions: int, ttl: float, max_messages: int) -> None:
+        """
+        LRU cache of the latest messages of chat sessions. The Master Agent appends the user
+        message and its own response after every turn, so the history is only fetched from the
+        backend when a session is new to the cache or the backend counts a different number of
+        messages than the cache expects, e.g. after a lost response.
+
+        Args:
+            max_sessions (int): Maximum number of cached sessions, the least recently used one is evicted first
+            ttl (float): Seconds after which an unused session is evicted
+            max_messages (int): Maximum number of messages kept per session
+        """
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self._sessions: OrderedDict[tuple[str, str], SessionHistory] = OrderedDict()
+
+    def get(
+            self,
+            user_id: str,
+            session_id: str,
+            message: str,
+            message_count: int,
+            max_last_messages: int
+    ) -> Optional[list[BaseMessage]]:
+        """
+        Returns the history of a session with the new user message appended, if the cache holds
+        every message before it.
+
+        Args:
+            user_id (str): ID of the user
+            session_id (str): ID of the chat session
+            message (str): The new user message
+            message_count (int): Messages in the conversation on the backend, including the new one
+            max_last_messages (int): Number of latest messages to return
+
+        Returns:
+            Optional[list[BaseMessage]]: The latest messages, None if the history must be fetched
+        """
+        key = (user_id, session_id)
+        history = self._sessions.get(key)
+        now = time.monotonic()
+        if history is None or now - history.updated_at > self.ttl:
+            return None
+        if history.message_count != message_count - 1:
+            return None  # messages are missing from the cache
+        if len(history.messages) + 1 < min(message_count, max_last_messages):
+            return None  # fewer messages cached than requested
+
+        history.messages.append(HumanMessage(content=message))
+        history.message_count = message_count
+        self._touch(key, history, now)
+        return history.messages[-max_last_messages:]
+
+    def put(self, user_id: str, session_id: str, messages: list[BaseMessage], message_count: int) -> None:
+        """
+        Replaces the cached history of a session with the history fetched from the backend.
+        """
+        history = SessionHistory(messages=list(messages), message_count=message_count, updated_at=0)
+        self._touch((user_id, session_id), history, time.monotonic())
+
+    def append(self, user_id: str, session_id: str, message: BaseMessage) -> None:
+        """
+        Appends a message stored by the backend, e.g. the response of the Master Agent, to a cached session.
+        """
+        key = (user_id, session_id)
+        if history := self._sessions.get(key):
+            history.messages.append(message)
+            history.message_count += 1
+            self._touch(key, history, time.monotonic())
+
+    def _touch(self, key: tuple[str, str], history: SessionHistory, now: float) -> None:
+        history.updated_at = now
+        del history.messages[:-self.max_messages]
+        self._sessions[key] = history
+        self._sessions.move_to_end(key)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
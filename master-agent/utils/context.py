@@ -0,0 +1,201 @@
+import asyncio
+import json
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from loguru import logger
+
+from utils.tokens import count_message_tokens, count_tokens, truncate_to_tokens
+
+
+@dataclass
+class Context:
+    messages: list[BaseMessage]
+    dropped: list[BaseMessage]  # oldest messages left out to stay within the budget, oldest first
+
+
+def shorten_message(message: BaseMessage, max_tokens: int) -> BaseMessage:
+    """
+    Truncates tool outputs and responses of the Master Agent, which include them in their trace,
+    to `max_tokens`, 0 keeps them whole. JSON content stays valid JSON, its strings are cut instead.
+    """
+    if not max_tokens or not isinstance(message, (ToolMessage, AIMessage)) or not isinstance(message.content, str):
+        return message
+    if count_tokens(message.content) <= max_tokens:
+        return message
+    content = _truncate_json(message.content, max_tokens) or truncate_to_tokens(message.content, max_tokens)
+    return message.model_copy(update={"content": content})
+
+
+def _truncate_json(text: str, max_tokens: int) -> Optional[str]:
+    # cuts every string of a JSON object or array to the longest length that fits, None if the text
+    # isn't one or doesn't fit even with its strings emptied
+    try:
+        value = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(value, (dict, list)):
+        return None
+
+    fitting = None
+    low, high = 0, _longest_string(value)
+    while low <= high:
+        max_chars = (low + high) // 2
+        candidate = json.dumps(_truncate_strings(value, max_chars))
+        if count_tokens(candidate) <= max_tokens:
+            fitting, low = candidate, max_chars + 1
+        else:
+            high = max_chars - 1
+    return fitting
+
+
+def _truncate_strings(value: Any, max_chars: int) -> Any:
+    if isinstance(value, str) and len(value) > max_chars:
+        return f"{value[:max_chars]} [truncated, {len(value) - max_chars} more characters]"
+    if isinstance(value, list):
+        return [_truncate_strings(item, max_chars) for item in value]
+    if isinstance(value, dict):
+        return {key: _truncate_strings(item, max_chars) for key, item in value.items()}
+    return value
+
+
+def _longest_string(value: Any) -> int:
+    if isinstance(value, str):
+        return len(value)
+    items = value.values() if isinstance(value, dict) else value if isinstance(value, list) else ()
+    return max((_longest_string(item) for item in items), default=0)
+
+
+def _turns(messages: list[BaseMessage]) -> list[list[BaseMessage]]:
+    # a user message and every message answering it, tool calls included, are kept or dropped together
+    turns = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return turns
+
+
+def build_context(messages: list[BaseMessage], budget: int, max_message_tokens: int) -> Context:
+    """
+    Fits the messages into a token budget. The leading system messages and the latest user message,
+    with everything that follows it, are always kept; older messages are kept newest first while
+    they fit, a whole turn at a time. Tool outputs and responses longer than `max_message_tokens` are truncated.
+
+    Args:
+        messages (list[BaseMessage]): System messages, the chat history and the messages of the current turn
+        budget (int): Maximum number of tokens of the messages, 0 keeps every message
+        max_message_tokens (int): Maximum number of tokens of a single tool output or response, 0 disables it
+
+    Returns:
+        Context: The messages to send, and the older messages left out
+    """
+    messages = [shorten_message(message, max_message_tokens) for message in messages]
+    if not budget:
+        return Context(messages=messages, dropped=[])
+
+    system_end = next(
+        (index for index, message in enumerate(messages) if not isinstance(message, SystemMessage)),
+        len(messages)
+    )
+    current_start = next(
+        (index for index in range(len(messages) - 1, system_end - 1, -1) if isinstance(messages[index], HumanMessage)),
+        len(messages)
+    )
+    system, current = messages[:system_end], messages[current_start:]
+    turns = _turns(messages[system_end:current_start])
+
+    remaining = budget - sum(count_message_tokens(message) for message in (*system, *current))
+    first_kept = len(turns)
+    for index in range(len(turns) - 1, -1, -1):
+        remaining -= sum(count_message_tokens(message) for message in turns[index])
+        if remaining < 0:
+            break
+        first_kept = index
+
+    kept = [message for turn in turns[first_kept:] for message in turn]
+    dropped = [message for turn in turns[:first_kept] for message in turn]
+    return Context(messages=[*system, *kept, *current], dropped=dropped)
+
+
+@dataclass
+class Summary:
+    text: str
+    message_count: int  # messages of the conversation covered by the summary, from its start
+
+
+class ConversationSummaries:
+    def __init__(self, max_sessions: int, max_tokens: int) -> None:
+        """
+        Rolling summaries of the messages that no longer fit into the context of a chat session.
+        A summary is extended in the background after a turn drops messages it doesn't cover yet,
+        so the next turn can send it in place of those messages.
+
+        Args:
+            max_sessions (int): Maximum number of summaries, the least recently used one is evicted first
+            max_tokens (int): Maximum number of tokens of a summary
+        """
+        self.max_sessions = max_sessions
+        self.max_tokens = max_tokens
+        self._summaries: OrderedDict[tuple[str, str], Summary] = OrderedDict()
+        self._updating: dict[tuple[str, str], asyncio.Task] = {}
+
+    def get(self, user_id: str, session_id: str) -> Optional[Summary]:
+        key = (user_id, session_id)
+        if key in self._summaries:
+            self._summaries.move_to_end(key)
+        return self._summaries.get(key)
+
+    def update_in_background(
+            self,
+            user_id: str,
+            session_id: str,
+            dropped: list[BaseMessage],
+            first_position: int,
+            summarize: Callable[[Optional[str], list[BaseMessage]], Awaitable[str]],
+            min_new_messages: int = 1
+    ) -> None:
+        """
+        Extends the summary of a session with the dropped messages it doesn't cover yet,
+        once there are at least `min_new_messages` of them.
+
+        Args:
+            user_id (str): ID of the user
+            session_id (str): ID of the chat session
+            dropped (list[BaseMessage]): Messages left out of the context, oldest first
+            first_position (int): Position of the first dropped message in the conversation, from 1
+            summarize (Callable[[Optional[str], list[BaseMessage]], Awaitable[str]]): Extends
+                a summary, None if there is none yet, with the given messages
+            min_new_messages (int): Fewer uncovered messages are left for a later turn,
+                so the summary isn't rebuilt by the LLM on every turn
+        """
+        key = (user_id, session_id)
+        last_position = first_position + len(dropped) - 1
+        summary = self._summaries.get(key)
+        covered = summary.message_count if summary else 0
+        if not dropped or covered >= last_position or key in self._updating:
+            return
+
+        new_messages = dropped[max(0, covered - first_position + 1):]
+        if len(new_messages) < min_new_messages:
+            return
+
+        async def update() -> None:
+            try:
+                text = await summarize(summary.text if summary else None, new_messages)
+                self._summaries[key] = Summary(
+                    text=truncate_to_tokens(text, self.max_tokens),
+                    message_count=last_position
+                )
+                self._summaries.move_to_end(key)
+                while len(self._summaries) > self.max_sessions:
+                    self._summaries.popitem(last=False)
+            except Exception as e:
+                logger.warning(f"Could not summarize the chat history of session {session_id}: {e}")
+            finally:
+                del self._updating[key]
+
+        self._updating[key] = asyncio.create_task(update())
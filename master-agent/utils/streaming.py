@@ -0,0 +1,138 @@
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Optional
+
+import msgspec
+import websockets
+from genai_session.session import GenAISession
+from genai_session.utils.agents import AgentResponse
+from genai_session.utils.naming_enums import WSMessageType
+from loguru import logger
+from websockets.asyncio.client import ClientConnection
+
+from models.enums import StreamMessageType
+
+StreamHandler = Callable[[dict[str, Any]], Awaitable[None]]
+
+# the router sends MessagePack binary frames on connections opened with this subprotocol
+MSGPACK_SUBPROTOCOL = "genai.msgpack"
+
+
+class StreamRelay:
+    """
+    Forwards stream frames of the agents called by the Master Agent to whoever invoked
+    the Master Agent. The router matches the frames to that invoker by request ID,
+    so `invoked_by` is not needed.
+
+    Frames go out on the socket the session answers requests on. websockets writes every
+    message in one go, so they can't interleave with the responses and logs of the session,
+    and the relay only serializes its own frames to keep them in order.
+    """
+
+    def __init__(
+            self,
+            websocket: ClientConnection,
+            request_id: str,
+            session_id: str
+    ) -> None:
+        # request and session IDs are passed per invocation, the agent context is shared between requests
+        self.websocket = websocket
+        self.request_id = request_id
+        self.session_id = session_id
+        self._send_lock = asyncio.Lock()
+
+    async def __call__(self, frame: dict[str, Any]) -> None:
+        message = json.dumps(
+            {
+                "message_type": frame["message_type"],
+                "agent_id": frame.get("agent_id"),
+                "chunk": frame.get("chunk"),
+                "request_metadata": {
+                    "request_id": self.request_id,
+                    "session_id": self.session_id,
+                },
+            }
+        )
+        try:
+            async with self._send_lock:
+                await self.websocket.send(message)
+        except websockets.ConnectionClosed:
+            logger.warning(f"Could not relay stream frame of request {self.request_id}")
+
+
+async def send_with_stream(
+        session: GenAISession,
+        client_id: str,
+        message: dict[str, Any],
+        on_stream: StreamHandler,
+        request_id: str,
+        session_id: str,
+        close_timeout: Optional[int] = None
+) -> AgentResponse:
+    """
+    Invokes an agent like GenAISession.send, but hands the stream frames received before
+    the final response to `on_stream` instead of dropping them. Frames are exchanged as
+    MessagePack if the router supports it, so large payloads skip JSON on this hop.
+
+    The backend keeps a copy in backend/src/utils/streaming.py. The two services are
+    separate Docker build contexts and share no package besides the SDK, so neither can
+    import the other's. The copies differ only in the enum the stream message types
+    come from, change both together.
+
+    Args:
+        session (GenAISession): Session of the Master Agent.
+        client_id (str): UUID of the agent to invoke.
+        message (dict[str, Any]): Arguments of the agent.
+        on_stream (StreamHandler): Called with every start/chunk/end frame, tagged with `agent_id`.
+        request_id (str): Request ID of the invocation. The session only holds the ID of the latest request.
+        session_id (str): Session ID of the invocation.
+        close_timeout (Optional[int]): Seconds to wait for each frame.
+
+    Returns:
+        AgentResponse: The final response of the agent.
+    """
+    headers = {"x-custom-invoke-key": f"{session.agent_id}:{client_id}"}
+    stream_message_types = {message_type.value for message_type in StreamMessageType}
+
+    async with websockets.connect(
+            session.ws_url,
+            additional_headers=headers,
+            subprotocols=[MSGPACK_SUBPROTOCOL]
+    ) as ws:
+        invoke_message = {
+            "message_type": WSMessageType.AGENT_INVOKE.value,
+            "agent_uuid": client_id,
+            "request_payload": {**message},
+            "request_metadata": {
+                "request_id": request_id,
+                "session_id": session_id,
+            },
+        }
+        if ws.subprotocol == MSGPACK_SUBPROTOCOL:
+            await ws.send(msgspec.msgpack.encode(invoke_message))
+        else:
+            await ws.send(json.dumps(invoke_message))
+
+        while True:
+            try:
+                frame = await asyncio.wait_for(ws.recv(), timeout=close_timeout)
+            except asyncio.TimeoutError:
+                return AgentResponse(is_success=False, execution_time=0, response="Request timed out")
+
+            body = msgspec.msgpack.decode(frame) if isinstance(frame, bytes) else json.loads(frame)
+            message_type = body.get("message_type")
+
+            if message_type in stream_message_types:
+                await on_stream({**body, "agent_id": body.get("agent_id") or client_id})
+            elif message_type == WSMessageType.AGENT_RESPONSE.value:
+                return AgentResponse(
+                    is_success=True,
+                    execution_time=body.get("execution_time", 0),
+                    response=body.get("response", "")
+                )
+            elif message_type == WSMessageType.AGENT_ERROR.value:
+                return AgentResponse(
+                    is_success=False,
+                    execution_time=body.get("execution_time", 0),
+                    response=body.get("error", {}).get("error_message", "")
+                )
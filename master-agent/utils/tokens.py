@@ -0,0 +1,78 @@
+import json
+from functools import cache
+from typing import Optional
+
+import tiktoken
+from langchain_core.messages import BaseMessage
+from loguru import logger
+
+# encoding of the current OpenAI models, counts of other models are close enough for budgeting
+ENCODING_NAME = "o200k_base"
+# used when the encoding can't be loaded, e.g. without network access on first use
+CHARS_PER_TOKEN = 4
+# tokens the chat format adds around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+# room left for the note about the truncation, so a truncated text stays within its limit
+TRUNCATION_NOTE_TOKENS = 16
+
+
+@cache
+def _encoding() -> Optional[tiktoken.Encoding]:
+    try:
+        return tiktoken.get_encoding(ENCODING_NAME)
+    except Exception as e:
+        logger.warning(f"Tokenizer unavailable, estimating token counts from text length: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Counts the tokens of a text as the LLM sees them.
+
+    Args:
+        text (str): Text to count
+
+    Returns:
+        int: Number of tokens, estimated from the text length if the tokenizer is unavailable
+    """
+    encoding = _encoding()
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cuts a text to its first `max_tokens` tokens, noting how much was left out.
+
+    Args:
+        text (str): Text to truncate
+        max_tokens (int): Maximum number of tokens kept
+
+    Returns:
+        str: The text, truncated if it was longer
+    """
+    encoding = _encoding()
+    kept_tokens = max(max_tokens - TRUNCATION_NOTE_TOKENS, 0)
+    if encoding is None:
+        if len(text) <= max_tokens * CHARS_PER_TOKEN:
+            return text
+        kept = text[:kept_tokens * CHARS_PER_TOKEN]
+    else:
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        # the cut may fall inside a multi-byte character, its leftover bytes are dropped
+        kept = encoding.decode(tokens[:kept_tokens], errors="ignore")
+    return f"{kept}\n[truncated, {len(text) - len(kept)} more characters]"
+
+
+def count_message_tokens(message: BaseMessage) -> int:
+    """
+    Counts the tokens a message adds to the prompt, including its tool calls.
+    """
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content)
+    tokens = MESSAGE_OVERHEAD_TOKENS + count_tokens(content)
+    for tool_call in getattr(message, "tool_calls", None) or []:
+        tokens += count_tokens(tool_call["name"]) + count_tokens(json.dumps(tool_call["args"]))
+    return tokens
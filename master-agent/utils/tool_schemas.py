@@ -0,0 +1,200 @@
+import hashlib
+import json
+import re
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Any, Iterator
+
+from utils.tokens import count_tokens
+
+# keywords the LLM doesn't need to call a tool
+DROPPED_KEYWORDS = {"$schema", "$id", "$comment", "examples", "example", "readOnly", "writeOnly"}
+# keywords whose value maps names to schemas
+SCHEMA_MAP_KEYWORDS = {"properties", "patternProperties", "$defs", "definitions"}
+# keywords whose value is a schema, or a list of schemas
+SCHEMA_KEYWORDS = {"items", "additionalProperties", "not", "contains", "if", "then", "else"}
+SCHEMA_LIST_KEYWORDS = {"anyOf", "oneOf", "allOf", "prefixItems"}
+DEFINITIONS_KEYWORDS = ("$defs", "definitions")
+
+WHITESPACE_PATTERN = re.compile(r"[ \t]+")
+BLANK_LINES_PATTERN = re.compile(r"\s*\n\s*")
+
+
+def schema_fingerprint(schema: Any) -> str:
+    """
+    Identifies a version of an agent schema: the hash changes whenever the schema does.
+    """
+    return hashlib.sha256(json.dumps(schema, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def truncate_description(description: str, max_length: int) -> str:
+    """
+    Collapses whitespace and cuts the description at the last word fitting into `max_length` characters.
+    """
+    description = BLANK_LINES_PATTERN.sub("\n", WHITESPACE_PATTERN.sub(" ", description)).strip()
+    if len(description) <= max_length:
+        return description
+    return description[:max_length - 1].rsplit(" ", 1)[0].rstrip(" ,.;:") + "…"
+
+
+def _compact_node(node: Any, max_description_length: int, is_root: bool = False) -> Any:
+    if not isinstance(node, dict):
+        return node
+
+    compacted = {}
+    for key, value in node.items():
+        if key in DROPPED_KEYWORDS:
+            continue
+        if key == "title" and not is_root:
+            # pydantic titles every property after its name, only the title of the tool itself matters
+            continue
+        if key == "description" and isinstance(value, str):
+            compacted[key] = truncate_description(value, max_description_length)
+        elif key in SCHEMA_MAP_KEYWORDS and isinstance(value, dict):
+            compacted[key] = {name: _compact_node(schema, max_description_length) for name, schema in value.items()}
+        elif key in SCHEMA_KEYWORDS:
+            compacted[key] = _compact_node(value, max_description_length)
+        elif key in SCHEMA_LIST_KEYWORDS and isinstance(value, list):
+            compacted[key] = [_compact_node(schema, max_description_length) for schema in value]
+        else:
+            compacted[key] = value
+    return compacted
+
+
+def _refs(node: Any) -> Iterator[str]:
+    if isinstance(node, dict):
+        if isinstance(node.get("$ref"), str):
+            yield node["$ref"]
+        for value in node.values():
+            yield from _refs(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _refs(item)
+
+
+def _replace_ref(node: Any, ref: str, definition: dict[str, Any]) -> Any:
+    if isinstance(node, dict):
+        if node.get("$ref") == ref:
+            # keywords next to the reference, e.g. its description, take precedence over the definition
+            return {**definition, **{key: value for key, value in node.items() if key != "$ref"}}
+        return {key: _replace_ref(value, ref, definition) for key, value in node.items()}
+    if isinstance(node, list):
+        return [_replace_ref(item, ref, definition) for item in node]
+    return node
+
+
+def inline_definitions(schema: dict[str, Any]) -> dict[str, Any]:
+    """
+    Inlines the definitions referenced only once and drops the unused ones. Definitions used
+    several times stay shared, as do recursive ones.
+
+    Args:
+        schema (dict[str, Any]): JSON schema, the root of its local references
+
+    Returns:
+        dict[str, Any]: The schema with as few definitions as possible
+    """
+    for keyword in DEFINITIONS_KEYWORDS:
+        if not isinstance(schema.get(keyword), dict):
+            continue
+
+        # every change may free up other definitions, so references are counted again after each
+        changed = True
+        while changed:
+            changed = False
+            counts = Counter(_refs(schema))
+            for name, definition in list(schema[keyword].items()):
+                ref = f"#/{keyword}/{name}"
+                if counts[ref] == 0:
+                    del schema[keyword][name]
+                    changed = True
+                    break
+                if counts[ref] == 1 and not any(_refs(definition)):
+                    del schema[keyword][name]
+                    schema = _replace_ref(schema, ref, definition)
+                    changed = True
+                    break
+
+        if not schema[keyword]:
+            del schema[keyword]
+    return schema
+
+
+def compact_schema(
+        schema: dict[str, Any],
+        max_description_length: int,
+        max_parameter_description_length: int
+) -> dict[str, Any]:
+    """
+    Strips an agent schema down to what the LLM needs to call the agent: drops examples and
+    property titles, inlines single-use definitions and truncates descriptions. Tool names are kept.
+
+    Args:
+        schema (dict[str, Any]): Agent schema, either an OpenAI function or a JSON schema titled after the tool
+        max_description_length (int): Maximum length of the tool description, in characters
+        max_parameter_description_length (int): Maximum length of parameter descriptions, in characters
+
+    Returns:
+        dict[str, Any]: The compacted schema, the input is left untouched
+    """
+    if schema.get("type") == "function" and isinstance(schema.get("function"), dict):
+        function = dict(schema["function"])
+        if isinstance(function.get("description"), str):
+            function["description"] = truncate_description(function["description"], max_description_length)
+        if isinstance(function.get("parameters"), dict):
+            function["parameters"] = inline_definitions(
+                _compact_node(function["parameters"], max_parameter_description_length)
+            )
+        return {**schema, "function": function}
+
+    description = schema.get("description")
+    compacted = inline_definitions(_compact_node(schema, max_parameter_description_length, is_root=True))
+    if isinstance(description, str):
+        compacted["description"] = truncate_description(description, max_description_length)
+    return compacted
+
+
+@dataclass
+class CompactSchema:
+    schema: dict[str, Any]
+    tokens: int
+
+
+class SchemaCompactor:
+    def __init__(
+            self,
+            max_description_length: int,
+            max_parameter_description_length: int,
+            max_size: int
+    ) -> None:
+        """
+        Compacts agent schemas before they are bound to the LLM, see `compact_schema`, and counts the
+        tokens each of them adds to the prompt. Results are cached per schema version.
+
+        Args:
+            max_description_length (int): Maximum length of tool descriptions, in characters
+            max_parameter_description_length (int): Maximum length of parameter descriptions, in characters
+            max_size (int): Maximum number of cached schemas, the least recently used one is evicted first
+        """
+        self.max_description_length = max_description_length
+        self.max_parameter_description_length = max_parameter_description_length
+        self.max_size = max_size
+        self._schemas: OrderedDict[str, CompactSchema] = OrderedDict()
+
+    def compact(self, schema: dict[str, Any]) -> CompactSchema:
+        """
+        Returns the compacted schema and its size in tokens, from the cache if this version was compacted before.
+        """
+        key = schema_fingerprint(schema)
+        compact = self._schemas.pop(key, None)
+        if compact is None:
+            compacted = compact_schema(schema, self.max_description_length, self.max_parameter_description_length)
+            compact = CompactSchema(
+                schema=compacted,
+                tokens=count_tokens(json.dumps(compacted, separators=(",", ":"), ensure_ascii=False))
+            )
+
+        self._schemas[key] = compact
+        while len(self._schemas) > self.max_size:
+            self._schemas.popitem(last=False)
+        return compact
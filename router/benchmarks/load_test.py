@@ -0,0 +1,436 @@
+"""
+Router load test with simulated agents and invokers.
+
+Starts the router app in-process (or targets a running router with --router-url),
+connects fake agents and invokers using the same headers as genai_session and reports
+throughput, latency percentiles and the router CPU time and memory. No backend, database
+or LLM is needed.
+
+Usage (from the router directory):
+    uv run python -m benchmarks.load_test --agents 4 --invokers 16 --duration 10
+    uv run python -m benchmarks.load_test --mix echo=0.6,latency=0.3,large=0.1 --json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import resource
+import statistics
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+import jwt
+import uvicorn
+import websockets
+
+AGENT_KINDS = ("echo", "latency", "large")
+
+
+@dataclass
+class LoadTestConfig:
+    agents: int = 2
+    invokers: int = 8
+    concurrency: int = 4
+    duration: float = 10.0
+    warmup: float = 1.0
+    mix: Dict[str, float] = field(
+        default_factory=lambda: {"echo": 0.8, "latency": 0.15, "large": 0.05}
+    )
+    latency_ms: float = 50.0
+    payload_kb: int = 256
+    call_timeout: float = 30.0
+    port: int = 8090
+    router_url: Optional[str] = None
+
+
+@dataclass
+class LoadTestReport:
+    requests: int
+    errors: int
+    duration: float
+    throughput: float
+    latency_ms: Dict[str, float]
+    latency_ms_by_kind: Dict[str, Dict[str, float]]
+    router_cpu_seconds: Optional[float]
+    router_cpu_percent: Optional[float]
+    peak_rss_mb: float
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    """
+    Returns:
+        Dict[str, float]: p50, p95, p99 and max of the samples, in milliseconds.
+    """
+    if len(samples) < 2:
+        value = samples[0] * 1000 if samples else 0.0
+        return {"p50": value, "p95": value, "p99": value, "max": value}
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {
+        "p50": cuts[49] * 1000,
+        "p95": cuts[94] * 1000,
+        "p99": cuts[98] * 1000,
+        "max": max(samples) * 1000,
+    }
+
+
+class RouterThread:
+    """
+    Runs the router on its own event loop in a background thread, so the CPU time the
+    router spends can be told apart from the load generator's.
+    """
+
+    def __init__(self, port: int):
+        # imported here so --router-url runs do not need the router settings
+        from main import app
+
+        self.server = uvicorn.Server(
+            uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+        )
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self.server.serve())
+
+    async def start(self) -> None:
+        self.thread.start()
+        while not self.server.started:
+            await asyncio.sleep(0.05)
+
+    def cpu_time(self) -> float:
+        """
+        Returns:
+            float: CPU seconds consumed by the router thread so far.
+        """
+
+        async def _thread_time() -> float:
+            return time.thread_time()
+
+        return asyncio.run_coroutine_threadsafe(_thread_time(), self.loop).result()
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+class FakeAgent:
+    """
+    Agent answering invocations like genai_session does, with a canned behaviour:
+    echo returns the payload, latency sleeps first, large returns a big response.
+    """
+
+    def __init__(self, agent_id: str, kind: str, config: LoadTestConfig):
+        self.agent_id = agent_id
+        self.kind = kind
+        self.config = config
+        self.large_response = "x" * (config.payload_kb * 1024)
+        self.ws = None
+
+    async def connect(self, url: str) -> None:
+        token = jwt.encode({"sub": self.agent_id}, "load-test", algorithm="HS256")
+        self.ws = await websockets.connect(
+            url, additional_headers={"x-custom-authorization": token}, max_size=None
+        )
+        await self.ws.send(
+            json.dumps(
+                {
+                    "message_type": "agent_register",
+                    "request_payload": {
+                        "agent_name": self.agent_id,
+                        "agent_description": f"load test {self.kind} agent",
+                        "agent_input_schema": {},
+                    },
+                }
+            )
+        )
+
+    async def serve(self) -> None:
+        try:
+            async for message in self.ws:
+                asyncio.create_task(self._handle(json.loads(message)))
+        except websockets.ConnectionClosed:
+            pass
+
+    async def _handle(self, body: dict) -> None:
+        started = time.perf_counter()
+        payload = body.get("request_payload") or {}
+        if self.kind == "latency":
+            await asyncio.sleep(self.config.latency_ms / 1000)
+        response = self.large_response if self.kind == "large" else payload
+        await self.ws.send(
+            json.dumps(
+                {
+                    "message_type": "agent_response",
+                    "response": {"seq": payload.get("seq"), "data": response},
+                    "execution_time": time.perf_counter() - started,
+                    "invoked_by": body.get("invoked_by", ""),
+                }
+            )
+        )
+
+
+class Invoker:
+    """
+    Keeps `concurrency` invocations in flight over a single invoke-key connection and
+    records the latency of every response.
+    """
+
+    def __init__(self, name: str, agents: Dict[str, List[str]], config: LoadTestConfig):
+        self.name = name
+        self.agents = agents
+        self.config = config
+        self.kinds = [kind for kind in config.mix if agents.get(kind)]
+        self.weights = [config.mix[kind] for kind in self.kinds]
+        self.latencies: Dict[str, List[float]] = {kind: [] for kind in self.kinds}
+        self.errors = 0
+        self.recording = False
+        self._waiters: Dict[int, asyncio.Future] = {}
+        self._seq = 0
+        self.ws = None
+
+    async def connect(self, url: str) -> None:
+        self.ws = await websockets.connect(
+            url,
+            additional_headers={"x-custom-invoke-key": f"{self.name}:load-test"},
+            max_size=None,
+        )
+        asyncio.create_task(self._receive())
+
+    async def _receive(self) -> None:
+        try:
+            async for message in self.ws:
+                body = json.loads(message)
+                seq = (body.get("response") or {}).get("seq")
+                if body.get("message_type") != "agent_response" or seq is None:
+                    # router errors carry no sequence number, fail the oldest call
+                    seq = min(self._waiters, default=None)
+                    if self.recording:
+                        self.errors += 1
+                if (waiter := self._waiters.pop(seq, None)) and not waiter.done():
+                    waiter.set_result(body)
+        except websockets.ConnectionClosed:
+            pass
+
+    async def _call(self) -> None:
+        kind = random.choices(self.kinds, weights=self.weights)[0]
+        agent_id = random.choice(self.agents[kind])
+        self._seq += 1
+        seq = self._seq
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[seq] = waiter
+
+        started = time.perf_counter()
+        await self.ws.send(
+            json.dumps(
+                {
+                    "message_type": "agent_invoke",
+                    "agent_uuid": agent_id,
+                    "request_payload": {"seq": seq, "text": "ping"},
+                    "request_metadata": {
+                        "request_id": f"{self.name}-{seq}",
+                        "session_id": self.name,
+                    },
+                }
+            )
+        )
+        try:
+            body = await asyncio.wait_for(waiter, timeout=self.config.call_timeout)
+        except asyncio.TimeoutError:
+            self._waiters.pop(seq, None)
+            if self.recording:
+                self.errors += 1
+            return
+        if self.recording and body.get("message_type") == "agent_response":
+            self.latencies[kind].append(time.perf_counter() - started)
+
+    async def run(self, stop_at: float) -> None:
+        async def _worker() -> None:
+            while time.perf_counter() < stop_at:
+                await self._call()
+
+        await asyncio.gather(*(_worker() for _ in range(self.config.concurrency)))
+
+
+async def run_load_test(config: LoadTestConfig) -> LoadTestReport:
+    """
+    Runs one load test.
+
+    Args:
+        config (LoadTestConfig): Size and shape of the load.
+
+    Returns:
+        LoadTestReport: Throughput, latencies and router resource usage.
+    """
+    router = None
+    url = config.router_url
+    if url is None:
+        router = RouterThread(config.port)
+        await router.start()
+        url = f"ws://127.0.0.1:{config.port}/ws"
+
+    agents = [
+        FakeAgent(f"load-test-{kind}-{i}", kind, config)
+        for kind in AGENT_KINDS
+        if config.mix.get(kind)
+        for i in range(config.agents)
+    ]
+    for agent in agents:
+        await agent.connect(url)
+    agent_tasks = [asyncio.create_task(agent.serve()) for agent in agents]
+
+    agent_ids: Dict[str, List[str]] = {}
+    for agent in agents:
+        agent_ids.setdefault(agent.kind, []).append(agent.agent_id)
+
+    invokers = [
+        Invoker(f"load-test-invoker-{i}", agent_ids, config)
+        for i in range(config.invokers)
+    ]
+    for invoker in invokers:
+        await invoker.connect(url)
+
+    started = time.perf_counter()
+    stop_at = started + config.warmup + config.duration
+    run = asyncio.gather(*(invoker.run(stop_at) for invoker in invokers))
+
+    await asyncio.sleep(config.warmup)
+    for invoker in invokers:
+        invoker.recording = True
+    measured_from = time.perf_counter()
+    cpu_from = router.cpu_time() if router else None
+
+    await run
+    elapsed = time.perf_counter() - measured_from
+    cpu = router.cpu_time() - cpu_from if router else None
+
+    for invoker in invokers:
+        await invoker.ws.close()
+    for agent in agents:
+        await agent.ws.close()
+    await asyncio.gather(*agent_tasks, return_exceptions=True)
+    if router is not None:
+        router.stop()
+
+    by_kind: Dict[str, List[float]] = {}
+    for invoker in invokers:
+        for kind, samples in invoker.latencies.items():
+            by_kind.setdefault(kind, []).extend(samples)
+    all_samples = [sample for samples in by_kind.values() for sample in samples]
+
+    return LoadTestReport(
+        requests=len(all_samples),
+        errors=sum(invoker.errors for invoker in invokers),
+        duration=elapsed,
+        throughput=len(all_samples) / elapsed if elapsed else 0.0,
+        latency_ms=_percentiles(all_samples),
+        latency_ms_by_kind={
+            kind: _percentiles(samples) for kind, samples in by_kind.items()
+        },
+        router_cpu_seconds=cpu,
+        router_cpu_percent=cpu / elapsed * 100 if cpu is not None else None,
+        # ru_maxrss is in kilobytes on Linux, includes the load generator
+        peak_rss_mb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    )
+
+
+def _parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in AGENT_KINDS:
+            raise argparse.ArgumentTypeError(
+                f"Unknown agent kind {kind!r}, expected one of {', '.join(AGENT_KINDS)}"
+            )
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def _print_report(report: LoadTestReport) -> None:
+    print(f"requests:   {report.requests} in {report.duration:.1f}s")
+    print(f"throughput: {report.throughput:.0f} invocations/s")
+    print(f"errors:     {report.errors}")
+    for name, latency in (
+        ("all", report.latency_ms),
+        *report.latency_ms_by_kind.items(),
+    ):
+        print(
+            f"latency {name:<8} p50 {latency['p50']:8.2f} ms  p95 {latency['p95']:8.2f} ms"
+            f"  p99 {latency['p99']:8.2f} ms  max {latency['max']:8.2f} ms"
+        )
+    if report.router_cpu_seconds is not None:
+        print(
+            f"router cpu: {report.router_cpu_seconds:.2f}s ({report.router_cpu_percent:.0f}% of one core)"
+        )
+    print(f"peak rss:   {report.peak_rss_mb:.0f} MB (router and load generator)")
+
+
+def main() -> None:
+    defaults = LoadTestConfig()
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--agents", type=int, default=defaults.agents, help="Agents per kind"
+    )
+    parser.add_argument("--invokers", type=int, default=defaults.invokers)
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=defaults.concurrency,
+        help="Invocations in flight per invoker",
+    )
+    parser.add_argument("--duration", type=float, default=defaults.duration)
+    parser.add_argument("--warmup", type=float, default=defaults.warmup)
+    parser.add_argument(
+        "--mix",
+        type=_parse_mix,
+        default=defaults.mix,
+        help="Weights of the agent kinds, e.g. echo=0.8,latency=0.15,large=0.05",
+    )
+    parser.add_argument(
+        "--latency-ms",
+        type=float,
+        default=defaults.latency_ms,
+        help="Response delay of the latency agents",
+    )
+    parser.add_argument(
+        "--payload-kb",
+        type=int,
+        default=defaults.payload_kb,
+        help="Response size of the large agents",
+    )
+    parser.add_argument("--port", type=int, default=defaults.port)
+    parser.add_argument(
+        "--router-url",
+        default=None,
+        help="Target a running router, e.g. ws://localhost:8080/ws (no CPU stats)",
+    )
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(
+        run_load_test(
+            LoadTestConfig(
+                agents=args.agents,
+                invokers=args.invokers,
+                concurrency=args.concurrency,
+                duration=args.duration,
+                warmup=args.warmup,
+                mix=args.mix,
+                latency_ms=args.latency_ms,
+                payload_kb=args.payload_kb,
+                port=args.port,
+                router_url=args.router_url,
+            )
+        )
+    )
+    if args.json:
+        print(json.dumps(asdict(report), indent=2))
+    else:
+        _print_report(report)
+
+
+if __name__ == "__main__":
+    main()
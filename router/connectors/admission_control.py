@@ -0,0 +1,183 @@
+import time
+from typing import Callable, Dict, Iterable, NamedTuple, Optional, Tuple
+
+from utils.enums import RateLimitScope
+
+# buckets that refilled completely are forgotten this often, they behave like new ones
+PRUNE_INTERVAL_SECONDS = 60
+
+
+class RateLimit(NamedTuple):
+    """
+    Invocations per second, and how many may be sent at once after an idle period.
+    """
+
+    rate: float
+    burst: int
+
+
+class Rejection(NamedTuple):
+    scope: RateLimitScope
+    key: str
+    retry_after: float
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, limit: RateLimit, now: float):
+        self.rate = limit.rate
+        self.burst = limit.burst
+        self.tokens = float(limit.burst)
+        self.updated = now
+
+    def refill(self, now: float) -> float:
+        """
+        Returns:
+            float: Tokens available now.
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens
+
+    def retry_after(self) -> float:
+        """
+        Returns:
+            float: Seconds until the next token is available, as of the last refill.
+        """
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    def is_full(self, now: float) -> bool:
+        return self.tokens + (now - self.updated) * self.rate >= self.burst
+
+
+class AdmissionController:
+    """
+    Token-bucket limits for agent invocations, keyed by invoker, target agent and user.
+    An invocation is admitted only if every bucket that applies to it has a token, and
+    it then takes one token from each. Limits are per router shard and can be changed
+    while the router is running; buckets pick up the new limits right away.
+    """
+
+    def __init__(
+        self,
+        limits: Dict[RateLimitScope, Optional[RateLimit]],
+        overrides: Optional[Dict[RateLimitScope, Dict[str, RateLimit]]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            limits (Dict[RateLimitScope, Optional[RateLimit]]): Default limit per scope,
+                None (or a rate of 0) leaves the scope unlimited.
+            overrides (Optional[Dict[RateLimitScope, Dict[str, RateLimit]]]): Limits of
+                single keys, e.g. a higher one for a busy agent. A rate of 0 exempts the key.
+            clock (Callable[[], float]): Monotonic time source, in seconds.
+        """
+        self.limits: Dict[RateLimitScope, Optional[RateLimit]] = {
+            scope: None for scope in RateLimitScope
+        }
+        self.overrides: Dict[RateLimitScope, Dict[str, RateLimit]] = {
+            scope: {} for scope in RateLimitScope
+        }
+        self._buckets: Dict[Tuple[RateLimitScope, str], TokenBucket] = {}
+        self._clock = clock
+        self._last_prune = clock()
+
+        for scope, limit in limits.items():
+            self.set_limit(scope, limit)
+        for scope, keys in (overrides or {}).items():
+            for key, limit in keys.items():
+                self.set_limit(scope, limit, key=key)
+
+    @property
+    def enabled(self) -> bool:
+        return any(self.limits.values()) or any(self.overrides.values())
+
+    def limit_for(self, scope: RateLimitScope, key: str) -> Optional[RateLimit]:
+        """
+        Returns:
+            Optional[RateLimit]: The limit applying to the key, None if it is unlimited.
+        """
+        limit = self.overrides[scope].get(key, self.limits[scope])
+        return limit if limit and limit.rate > 0 else None
+
+    def set_limit(
+        self,
+        scope: RateLimitScope,
+        limit: Optional[RateLimit],
+        key: Optional[str] = None,
+    ) -> None:
+        """
+        Changes the default limit of a scope, or the override of a single key.
+
+        Args:
+            scope (RateLimitScope): The scope to change.
+            limit (Optional[RateLimit]): The new limit. For a key, None removes its
+                override, and a rate of 0 exempts it from the default limit.
+            key (Optional[str]): Key of the override, None for the default limit.
+        """
+        if key is None:
+            self.limits[scope] = limit if limit and limit.rate > 0 else None
+        elif limit is None:
+            self.overrides[scope].pop(key, None)
+        else:
+            self.overrides[scope][key] = limit
+
+        now = self._clock()
+        for bucket_scope, bucket_key in list(self._buckets):
+            if bucket_scope != scope or (key is not None and bucket_key != key):
+                continue
+            bucket = self._buckets[(bucket_scope, bucket_key)]
+            new_limit = self.limit_for(bucket_scope, bucket_key)
+            if new_limit is None:
+                del self._buckets[(bucket_scope, bucket_key)]
+                continue
+            bucket.refill(now)
+            bucket.rate, bucket.burst = new_limit
+            bucket.tokens = min(bucket.tokens, new_limit.burst)
+
+    def admit(
+        self, keys: Iterable[Tuple[RateLimitScope, Optional[str]]]
+    ) -> Optional[Rejection]:
+        """
+        Takes a token from every bucket of the invocation, unless one of them is empty.
+
+        Args:
+            keys (Iterable[Tuple[RateLimitScope, Optional[str]]]): Scope and key of every
+                limit that may apply, keys that are None are skipped.
+
+        Returns:
+            Optional[Rejection]: None if the invocation is admitted, otherwise the limit
+                with the longest wait and the seconds until it has a token again.
+        """
+        now = self._clock()
+        if now - self._last_prune > PRUNE_INTERVAL_SECONDS:
+            self._prune(now)
+
+        buckets = []
+        rejection = None
+        for scope, key in keys:
+            if key is None or (limit := self.limit_for(scope, key)) is None:
+                continue
+            bucket = self._buckets.get((scope, key))
+            if bucket is None:
+                bucket = self._buckets[(scope, key)] = TokenBucket(limit, now)
+            if bucket.refill(now) >= 1:
+                buckets.append(bucket)
+            elif rejection is None or bucket.retry_after() > rejection.retry_after:
+                rejection = Rejection(scope, key, bucket.retry_after())
+
+        if rejection is not None:
+            return rejection
+        for bucket in buckets:
+            bucket.tokens -= 1
+        return None
+
+    def _prune(self, now: float) -> None:
+        self._last_prune = now
+        for bucket_key, bucket in list(self._buckets.items()):
+            if bucket.is_full(now):
+                del self._buckets[bucket_key]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
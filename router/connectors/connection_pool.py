@@ -0,0 +1,64 @@
+import hashlib
+from typing import Dict, List, Optional
+
+from connectors.ws_client_connection import ClientConnection
+from utils.enums import LoadBalancingStrategy
+
+
+class ConnectionPool:
+    """
+    Replicas connected under the same client ID, e.g. several processes running the same
+    agent JWT. Invocations are spread across replicas by in-flight count or session affinity.
+    """
+
+    def __init__(self, client_id: str, strategy: LoadBalancingStrategy):
+        """
+        Initializes an empty pool.
+
+        Args:
+            client_id (str): The client ID shared by all replicas in the pool.
+            strategy (LoadBalancingStrategy): How to pick a replica for a new invocation.
+        """
+        self.client_id = client_id
+        self.strategy = strategy
+        self._connections: Dict[str, ClientConnection] = {}
+
+    def __len__(self) -> int:
+        return len(self._connections)
+
+    @property
+    def connections(self) -> List[ClientConnection]:
+        return list(self._connections.values())
+
+    def add(self, connection: ClientConnection) -> None:
+        self._connections[connection.connection_id] = connection
+
+    def remove(self, connection: ClientConnection) -> None:
+        self._connections.pop(connection.connection_id, None)
+
+    def pick(self, session_id: Optional[str] = None) -> Optional[ClientConnection]:
+        """
+        Picks the replica that should receive the next message.
+
+        Args:
+            session_id (Optional[str]): Session of the invocation, used for session affinity.
+
+        Returns:
+            Optional[ClientConnection]: The selected replica, None if the pool is empty.
+        """
+        connections = [c for c in self._connections.values() if not c.is_closed]
+        if not connections:
+            return None
+        if len(connections) == 1:
+            return connections[0]
+
+        if session_id and self.strategy == LoadBalancingStrategy.SESSION_AFFINITY:
+            # Rendezvous hashing keeps a session on the same replica while the pool changes
+            return max(
+                connections,
+                key=lambda c: hashlib.blake2b(
+                    f"{session_id}:{c.connection_id}".encode(), digest_size=8
+                ).digest(),
+            )
+
+        return min(connections, key=lambda c: c.in_flight)
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+class AgentLogBatcher:
+    """
+    Low-priority lane for AGENT_LOG traffic. Log entries are buffered and sent to the
+    backend in batches, either every interval or as soon as a batch is full. Batches
+    are held back while the backend is behind; once the buffer is full new entries are
+    dropped and counted instead of competing with registration and response traffic.
+    """
+
+    def __init__(
+        self,
+        send_batch: Callable[[List[Dict[str, Any]]], Awaitable[bool]],
+        interval: float,
+        max_batch_size: int,
+        max_buffer_size: int,
+    ):
+        """
+        Initializes an empty log buffer.
+
+        Args:
+            send_batch (Callable): Coroutine sending a batch, returns False if it was not sent.
+            interval (float): Seconds between two flushes.
+            max_batch_size (int): Maximum number of entries per batch.
+            max_buffer_size (int): Maximum number of buffered entries before dropping.
+        """
+        self.interval = interval
+        self.max_batch_size = max_batch_size
+        self.max_buffer_size = max_buffer_size
+        self.dropped_logs = 0
+
+        self._send_batch = send_batch
+        self._buffer: List[Dict[str, Any]] = []
+        self._batch_ready = asyncio.Event()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    @property
+    def buffered_logs(self) -> int:
+        return len(self._buffer)
+
+    def add(self, entry: Dict[str, Any]) -> None:
+        """
+        Buffers a log entry, dropping it if the buffer is full.
+
+        Args:
+            entry (Dict[str, Any]): The log entry.
+        """
+        if len(self._buffer) >= self.max_buffer_size:
+            self.dropped_logs += 1
+            if self.dropped_logs % self.max_batch_size == 1:
+                logging.warning(
+                    f"Agent log buffer is full, dropped {self.dropped_logs} log entries so far"
+                )
+            return
+
+        self._buffer.append(entry)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._run())
+        if len(self._buffer) >= self.max_batch_size:
+            self._batch_ready.set()
+
+    async def flush(self) -> bool:
+        """
+        Sends the oldest batch of buffered entries.
+
+        Returns:
+            bool: False if the batch has been held back.
+        """
+        if not self._buffer:
+            return True
+
+        batch = self._buffer[: self.max_batch_size]
+        if not await self._send_batch(batch):
+            return False
+
+        del self._buffer[: len(batch)]
+        if len(self._buffer) >= self.max_batch_size:
+            self._batch_ready.set()
+        return True
+
+    async def close(self) -> None:
+        """
+        Stops the flush task, buffered entries are discarded.
+        """
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+
+            try:
+                if not await self.flush():
+                    await asyncio.sleep(self.interval)
+            except Exception:
+                logging.exception("Failed to flush agent logs")
@@ -0,0 +1,285 @@
+import asyncio
+import logging
+import math
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from typing import (
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+
+@dataclass
+class PendingInvocation:
+    request_id: str
+    invoker: str  # connection ID of the invoker
+    agent_uuid: str  # client ID of the invoked agent
+    connection_id: str  # connection ID of the replica handling the invocation
+    started_at: float  # event loop time
+    client_request_id: Optional[str] = None  # request_id of the request metadata
+    deadline: Optional[float] = (
+        None  # event loop time, None if the invocation never expires
+    )
+    slot: Optional[int] = None
+
+
+class PendingInvocationRegistry:
+    """
+    Tracks invocations forwarded to agents until their response comes back.
+
+    Entries are indexed by replica and request ID to match responses and stream frames,
+    by invoker/replica pair for responses without a request ID, by connection ID to fail
+    fast when either side disconnects, and by deadline on a hashed timer wheel so
+    expiring them costs O(expired) per tick.
+    """
+
+    def __init__(
+        self,
+        timeout: float,
+        tick: float,
+        on_expire: Callable[[PendingInvocation], Awaitable[None]],
+        wheel_size: int = 512,
+    ):
+        """
+        Initializes an empty registry.
+
+        Args:
+            timeout (float): Seconds an invocation may stay pending, 0 disables deadlines.
+            tick (float): Resolution of the timer wheel in seconds.
+            on_expire (Callable): Coroutine called with every invocation past its deadline.
+            wheel_size (int): Number of slots of the timer wheel.
+        """
+        self.timeout = timeout
+        self.tick = tick
+        self._on_expire = on_expire
+
+        self._pending: Dict[str, PendingInvocation] = {}
+        self._by_route: Dict[Tuple[str, str], Deque[str]] = {}
+        # (replica connection ID, client request ID) -> invocations, oldest first
+        self._by_client_request: Dict[Tuple[str, str], Deque[str]] = {}
+        self._by_connection: Dict[str, Set[str]] = {}
+
+        self._wheel: List[Set[str]] = [set() for _ in range(wheel_size)]
+        self._cursor: Optional[int] = None
+        self._timer_task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(
+        self,
+        invoker: str,
+        agent_uuid: str,
+        connection_id: str,
+        client_request_id: Optional[str] = None,
+    ) -> PendingInvocation:
+        """
+        Registers an invocation forwarded to an agent replica.
+
+        Args:
+            invoker (str): Connection ID of the invoker.
+            agent_uuid (str): Client ID of the invoked agent.
+            connection_id (str): Connection ID of the replica the invocation was sent to.
+            client_request_id (Optional[str]): Request ID from the request metadata.
+
+        Returns:
+            PendingInvocation: The registered invocation.
+        """
+        invocation = PendingInvocation(
+            request_id=uuid.uuid4().hex,
+            invoker=invoker,
+            agent_uuid=agent_uuid,
+            connection_id=connection_id,
+            started_at=asyncio.get_running_loop().time(),
+            client_request_id=client_request_id,
+        )
+
+        if self.timeout > 0:
+            self._ensure_timer()
+            invocation.deadline = invocation.started_at + self.timeout
+            # the slot of the first tick starting at or after the deadline, the slot of
+            # the tick the deadline falls in is visited before the deadline has passed
+            invocation.slot = math.ceil(invocation.deadline / self.tick) % len(
+                self._wheel
+            )
+            self._wheel[invocation.slot].add(invocation.request_id)
+
+        self._pending[invocation.request_id] = invocation
+        self._by_route.setdefault((invoker, connection_id), deque()).append(
+            invocation.request_id
+        )
+        if client_request_id:
+            self._by_client_request.setdefault(
+                (connection_id, client_request_id), deque()
+            ).append(invocation.request_id)
+        self._by_connection.setdefault(invoker, set()).add(invocation.request_id)
+        self._by_connection.setdefault(connection_id, set()).add(invocation.request_id)
+        return invocation
+
+    def complete(
+        self,
+        invoker: str,
+        connection_id: str,
+        client_request_id: Optional[str] = None,
+    ) -> Optional[PendingInvocation]:
+        """
+        Removes the invocation a response answers. Responses carrying the request ID of
+        the request metadata are matched on it, so concurrent invocations of a replica by
+        the same invoker complete the right entry. Without it, or when the invocation was
+        sent without one, the oldest invocation the replica is handling for the invoker
+        is taken.
+
+        Args:
+            invoker (str): Connection ID of the invoker (`invoked_by` of the response).
+            connection_id (str): Connection ID of the replica that sent the response.
+            client_request_id (Optional[str]): Request ID from the request metadata of
+                the response.
+
+        Returns:
+            Optional[PendingInvocation]: The completed invocation, None if unknown.
+        """
+        if client_request_id and (
+            invocation := self._find(
+                self._by_client_request.get((connection_id, client_request_id), ()),
+                lambda invocation: invocation.invoker == invoker,
+            )
+        ):
+            return self._remove(invocation.request_id)
+
+        # invocations sent with a request ID are only completed by a response carrying it
+        if invocation := self._find(
+            self._by_route.get((invoker, connection_id), ()),
+            lambda invocation: not client_request_id
+            or not invocation.client_request_id,
+        ):
+            return self._remove(invocation.request_id)
+        return None
+
+    def find_for_request(
+        self, connection_id: str, client_request_id: str
+    ) -> Optional[PendingInvocation]:
+        """
+        Looks up the invocation a replica is handling for a request, without removing it.
+
+        Args:
+            connection_id (str): Connection ID of the replica.
+            client_request_id (str): Request ID from the request metadata.
+
+        Returns:
+            Optional[PendingInvocation]: The oldest such invocation, None if unknown.
+        """
+        return self._find(
+            self._by_client_request.get((connection_id, client_request_id), ()),
+            lambda invocation: True,
+        )
+
+    def pop_for_connection(self, connection_id: str) -> List[PendingInvocation]:
+        """
+        Removes every invocation the connection takes part in, as invoker or as replica.
+
+        Args:
+            connection_id (str): The connection ID.
+
+        Returns:
+            List[PendingInvocation]: The removed invocations.
+        """
+        request_ids = self._by_connection.pop(connection_id, set())
+        return [
+            invocation
+            for request_id in list(request_ids)
+            if (invocation := self._remove(request_id))
+        ]
+
+    async def close(self) -> None:
+        """
+        Stops the timer task.
+        """
+        if self._timer_task is not None:
+            self._timer_task.cancel()
+            try:
+                await self._timer_task
+            except asyncio.CancelledError:
+                pass
+            self._timer_task = None
+
+    def _find(
+        self,
+        request_ids: Iterable[str],
+        predicate: Callable[[PendingInvocation], bool],
+    ) -> Optional[PendingInvocation]:
+        for request_id in request_ids:
+            invocation = self._pending.get(request_id)
+            if invocation is not None and predicate(invocation):
+                return invocation
+        return None
+
+    def _remove(self, request_id: str) -> Optional[PendingInvocation]:
+        invocation = self._pending.pop(request_id, None)
+        if invocation is None:
+            return None
+
+        for index, key in (
+            (self._by_route, (invocation.invoker, invocation.connection_id)),
+            (
+                self._by_client_request,
+                (invocation.connection_id, invocation.client_request_id),
+            ),
+        ):
+            if request_ids := index.get(key):
+                request_ids.remove(request_id)
+                if not request_ids:
+                    del index[key]
+
+        for connection_id in (invocation.invoker, invocation.connection_id):
+            if request_ids := self._by_connection.get(connection_id):
+                request_ids.discard(request_id)
+                if not request_ids:
+                    del self._by_connection[connection_id]
+
+        if invocation.slot is not None:
+            self._wheel[invocation.slot].discard(request_id)
+        return invocation
+
+    def _tick_of(self, loop_time: float) -> int:
+        return math.floor(loop_time / self.tick)
+
+    def _ensure_timer(self) -> None:
+        if self._timer_task is None or self._timer_task.done():
+            self._cursor = self._tick_of(asyncio.get_running_loop().time())
+            self._timer_task = asyncio.create_task(self._run_timer())
+
+    async def _run_timer(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                await self._advance(loop.time())
+            except Exception:
+                logging.exception("Failed to expire pending invocations")
+
+    async def _advance(self, now: float) -> None:
+        current = self._tick_of(now)
+        # A full turn of the wheel visits every slot, no need to go further on a stall
+        first = max(self._cursor + 1, current - len(self._wheel) + 1)
+        self._cursor = current
+
+        expired = []
+        for tick in range(first, current + 1):
+            slot = self._wheel[tick % len(self._wheel)]
+            for request_id in list(slot):
+                invocation = self._pending.get(request_id)
+                if invocation is None:
+                    slot.discard(request_id)
+                elif invocation.deadline <= now:
+                    expired.append(self._remove(request_id))
+
+        for invocation in expired:
+            await self._on_expire(invocation)
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+def format_sse(event: str, data: str) -> str:
+    """
+    Formats one server-sent event.
+
+    Args:
+        event (str): The event name.
+        data (str): The event data, a single line of JSON.
+
+    Returns:
+        str: The event, ready to be written to the stream.
+    """
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+class PresenceFeed:
+    """
+    Fans presence changes out to the subscribers of the change stream. Every subscriber
+    gets a bounded queue; one that falls that far behind is cut off instead of holding
+    events in memory, and is expected to reconnect and start over from a snapshot.
+    """
+
+    def __init__(self, max_queue_size: int = 1000):
+        """
+        Args:
+            max_queue_size (int): Events buffered per subscriber before it is cut off.
+        """
+        self.max_queue_size = max_queue_size
+        self._subscribers: List[asyncio.Queue[Optional[BaseModel]]] = []
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> asyncio.Queue[Optional[BaseModel]]:
+        """
+        Returns:
+            asyncio.Queue[Optional[BaseModel]]: Receives every event published from now on,
+                and None once the subscriber has been cut off.
+        """
+        queue: asyncio.Queue[Optional[BaseModel]] = asyncio.Queue(
+            maxsize=self.max_queue_size
+        )
+        self._subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue[Optional[BaseModel]]) -> None:
+        if queue in self._subscribers:
+            self._subscribers.remove(queue)
+
+    def publish(self, event: BaseModel) -> None:
+        """
+        Queues an event for every subscriber, without waiting for any of them.
+
+        Args:
+            event (BaseModel): The presence change.
+        """
+        for queue in list(self._subscribers):
+            if not queue.full():
+                queue.put_nowait(event)
+                continue
+
+            logging.warning("Presence subscriber fell behind, closing its stream")
+            self._subscribers.remove(queue)
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
@@ -0,0 +1,470 @@
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import socket
+import struct
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, Set
+
+from redis import asyncio as aioredis
+
+from settings import Settings
+from utils.enums import BusMessageKind, RoutingBusType
+
+BUS_FIELD_SEPARATOR = b"\n"
+
+_length_prefix = struct.Struct("!I")
+
+
+class BusMessage(NamedTuple):
+    """
+    A frame travelling between router shards. The routing fields are a few newline
+    separated header lines in front of the frame, so the frame itself is never re-encoded.
+    `binary` tells MessagePack frames from JSON text frames.
+    """
+
+    kind: BusMessageKind
+    sender: str
+    target: str = ""
+    session_id: str = ""
+    reply_to: str = ""
+    binary: bool = False
+    frame: bytes = b""
+
+    def pack(self) -> bytes:
+        return BUS_FIELD_SEPARATOR.join(
+            (
+                self.kind.value.encode(),
+                self.sender.encode(),
+                self.target.encode(),
+                self.session_id.encode(),
+                self.reply_to.encode(),
+                b"1" if self.binary else b"",
+                self.frame,
+            )
+        )
+
+    @classmethod
+    def unpack(cls, data: bytes) -> "BusMessage":
+        kind, sender, target, session_id, reply_to, binary, frame = data.split(
+            BUS_FIELD_SEPARATOR, 6
+        )
+        return cls(
+            kind=BusMessageKind(kind.decode()),
+            sender=sender.decode(),
+            target=target.decode(),
+            session_id=session_id.decode(),
+            reply_to=reply_to.decode(),
+            binary=binary == b"1",
+            frame=frame,
+        )
+
+
+BusHandler = Callable[[BusMessage], Awaitable[None]]
+
+
+def default_shard_id() -> str:
+    """
+    Returns:
+        str: An ID unique to this router process, e.g. `router-7f9c-12`.
+    """
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def shard_of_connection(connection_id: str) -> Optional[str]:
+    """
+    Extracts the owning shard from a connection ID created by a sharded router.
+
+    Args:
+        connection_id (str): A connection ID in the `<client_id>#<shard_id>.<suffix>` form.
+
+    Returns:
+        Optional[str]: The shard ID, None if the ID does not name a shard.
+    """
+    _, separator, suffix = connection_id.rpartition("#")
+    if not separator:
+        return None
+    shard_id, _, _ = suffix.rpartition(".")
+    return shard_id or None
+
+
+class RoutingBus(ABC):
+    """
+    Delivers frames to sockets owned by other router shards. Every shard announces the
+    client IDs it holds, and each one keeps a replica of that presence directory, so
+    deciding whether and where to forward a frame never leaves the process.
+
+    Implementations only provide the transport: a point-to-point send to one shard and a
+    broadcast to all of them.
+    """
+
+    def __init__(self, shard_id: str):
+        """
+        Args:
+            shard_id (str): ID of this shard, unique across the deployment.
+        """
+        self.shard_id = shard_id
+        # client ID -> other shards holding at least one socket for it
+        self.directory: Dict[str, Set[str]] = defaultdict(set)
+        self.local_clients: Set[str] = set()
+        self._handler: Optional[BusHandler] = None
+
+    async def start(self, handler: BusHandler) -> None:
+        """
+        Starts receiving frames and asks the other shards for their presence.
+
+        Args:
+            handler (BusHandler): Called with every frame addressed to this shard.
+        """
+        self._handler = handler
+        await self._start()
+        await self._broadcast(BusMessage(BusMessageKind.SYNC, self.shard_id).pack())
+
+    async def close(self) -> None:
+        """
+        Tells the other shards to forget this one and stops the transport.
+        """
+        await self._broadcast(
+            BusMessage(BusMessageKind.SHARD_LEAVE, self.shard_id).pack()
+        )
+        await self._close()
+
+    def shards_of(self, client_id: str) -> Set[str]:
+        """
+        Args:
+            client_id (str): A client or connection ID.
+
+        Returns:
+            Set[str]: The other shards the client is connected to.
+        """
+        if shard_id := shard_of_connection(client_id):
+            return {shard_id} if shard_id != self.shard_id else set()
+        return self.directory.get(client_id, set())
+
+    def pick_shard(
+        self, client_id: str, session_id: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Picks the shard that should receive a frame for the client.
+
+        Args:
+            client_id (str): A client or connection ID.
+            session_id (Optional[str]): Session of the frame, keeps a session on one shard.
+
+        Returns:
+            Optional[str]: The shard ID, None if no other shard holds the client.
+        """
+        shards = self.shards_of(client_id)
+        if len(shards) <= 1:
+            return next(iter(shards), None)
+        if session_id:
+            return max(
+                shards,
+                key=lambda s: hashlib.blake2b(
+                    f"{session_id}:{s}".encode(), digest_size=8
+                ).digest(),
+            )
+        return random.choice(tuple(shards))
+
+    async def join(self, client_id: str) -> None:
+        """
+        Announces that this shard holds the first socket of a client.
+        """
+        self.local_clients.add(client_id)
+        await self._broadcast(
+            BusMessage(BusMessageKind.JOIN, self.shard_id, client_id).pack()
+        )
+
+    async def leave(self, client_id: str) -> None:
+        """
+        Announces that the last socket of a client on this shard is gone.
+        """
+        self.local_clients.discard(client_id)
+        await self._broadcast(
+            BusMessage(BusMessageKind.LEAVE, self.shard_id, client_id).pack()
+        )
+
+    async def send(
+        self,
+        shard_id: str,
+        kind: BusMessageKind,
+        target: str,
+        frame: str | bytes,
+        session_id: Optional[str] = None,
+        reply_to: Optional[str] = None,
+    ) -> bool:
+        """
+        Sends a frame to another shard.
+
+        Args:
+            shard_id (str): The receiving shard.
+            kind (BusMessageKind): What the receiving shard should do with the frame.
+            target (str): Client or connection ID the frame is for.
+            frame (str | bytes): The WebSocket frame, JSON text or MessagePack bytes.
+            session_id (Optional[str]): Session of the frame, used to pick a replica.
+            reply_to (Optional[str]): Connection ID of the invoker.
+
+        Returns:
+            bool: False if the shard is unreachable, it is dropped from the directory then.
+        """
+        message = BusMessage(
+            kind=kind,
+            sender=self.shard_id,
+            target=target,
+            session_id=session_id or "",
+            reply_to=reply_to or "",
+            binary=isinstance(frame, bytes),
+            frame=frame.encode() if isinstance(frame, str) else frame,
+        )
+        if await self._send(shard_id, message.pack()):
+            return True
+
+        logging.warning(f"Router shard {shard_id} is unreachable, forgetting it")
+        self._forget_shard(shard_id)
+        return False
+
+    async def _receive(self, data: bytes) -> None:
+        """
+        Applies presence updates and hands everything else to the handler.
+        """
+        message = BusMessage.unpack(data)
+        if message.sender == self.shard_id:
+            return
+
+        if message.kind == BusMessageKind.JOIN:
+            self.directory[message.target].add(message.sender)
+        elif message.kind == BusMessageKind.LEAVE:
+            self._forget(message.target, message.sender)
+        elif message.kind == BusMessageKind.SHARD_LEAVE:
+            self._forget_shard(message.sender)
+        elif message.kind == BusMessageKind.SYNC:
+            for client_id in list(self.local_clients):
+                await self._send(
+                    message.sender,
+                    BusMessage(BusMessageKind.JOIN, self.shard_id, client_id).pack(),
+                )
+        elif self._handler is not None:
+            await self._handler(message)
+
+    def _forget(self, client_id: str, shard_id: str) -> None:
+        if shards := self.directory.get(client_id):
+            shards.discard(shard_id)
+            if not shards:
+                del self.directory[client_id]
+
+    def _forget_shard(self, shard_id: str) -> None:
+        for client_id in list(self.directory):
+            self._forget(client_id, shard_id)
+
+    @abstractmethod
+    async def _start(self) -> None: ...
+
+    @abstractmethod
+    async def _close(self) -> None: ...
+
+    @abstractmethod
+    async def _send(self, shard_id: str, data: bytes) -> bool: ...
+
+    @abstractmethod
+    async def _broadcast(self, data: bytes) -> None: ...
+
+
+class InMemoryBusHub:
+    """
+    Shared medium of the in-memory buses, one per group of shards that talk to each other.
+    """
+
+    def __init__(self):
+        self.buses: Dict[str, "InMemoryRoutingBus"] = {}
+
+
+class InMemoryRoutingBus(RoutingBus):
+    """
+    Bus between shards running in the same event loop, e.g. several connection managers
+    in one test process. Delivery is a direct call, so it is deterministic.
+    """
+
+    def __init__(self, shard_id: str, hub: InMemoryBusHub):
+        super().__init__(shard_id)
+        self.hub = hub
+
+    async def _start(self) -> None:
+        self.hub.buses[self.shard_id] = self
+
+    async def _close(self) -> None:
+        self.hub.buses.pop(self.shard_id, None)
+
+    async def _send(self, shard_id: str, data: bytes) -> bool:
+        if bus := self.hub.buses.get(shard_id):
+            await bus._receive(data)
+            return True
+        return False
+
+    async def _broadcast(self, data: bytes) -> None:
+        for shard_id in list(self.hub.buses):
+            if shard_id != self.shard_id:
+                await self._send(shard_id, data)
+
+
+class UnixSocketRoutingBus(RoutingBus):
+    """
+    Bus between router processes on the same host. Every shard listens on
+    `<socket_dir>/<shard_id>.sock` and frames are length-prefixed on the stream, the
+    socket directory doubles as the list of live shards.
+    """
+
+    def __init__(self, shard_id: str, socket_dir: str):
+        super().__init__(shard_id)
+        self.socket_dir = Path(socket_dir)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writers: Dict[str, asyncio.StreamWriter] = {}
+        self._peer_writers: Set[asyncio.StreamWriter] = set()
+        self._connect_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    def _socket_path(self, shard_id: str) -> Path:
+        return self.socket_dir / f"{shard_id}.sock"
+
+    async def _start(self) -> None:
+        self.socket_dir.mkdir(parents=True, exist_ok=True)
+        path = self._socket_path(self.shard_id)
+        path.unlink(missing_ok=True)
+        self._server = await asyncio.start_unix_server(self._serve, path=str(path))
+
+    async def _close(self) -> None:
+        for writer in (*self._writers.values(), *self._peer_writers):
+            writer.close()
+        self._writers.clear()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self._socket_path(self.shard_id).unlink(missing_ok=True)
+
+    async def _serve(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self._peer_writers.add(writer)
+        try:
+            while True:
+                (size,) = _length_prefix.unpack(
+                    await reader.readexactly(_length_prefix.size)
+                )
+                data = await reader.readexactly(size)
+                try:
+                    await self._receive(data)
+                except Exception:
+                    logging.exception("Failed to handle a frame from the routing bus")
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._peer_writers.discard(writer)
+            writer.close()
+
+    async def _writer(self, shard_id: str) -> asyncio.StreamWriter:
+        async with self._connect_locks[shard_id]:
+            writer = self._writers.get(shard_id)
+            if writer is None or writer.is_closing():
+                _, writer = await asyncio.open_unix_connection(
+                    str(self._socket_path(shard_id))
+                )
+                self._writers[shard_id] = writer
+            return writer
+
+    async def _send(self, shard_id: str, data: bytes) -> bool:
+        try:
+            writer = await self._writer(shard_id)
+            writer.write(_length_prefix.pack(len(data)) + data)
+            await writer.drain()
+        except ConnectionRefusedError:
+            # the shard crashed without removing its socket
+            self._socket_path(shard_id).unlink(missing_ok=True)
+            return False
+        except OSError:
+            if writer := self._writers.pop(shard_id, None):
+                writer.close()
+            return False
+        return True
+
+    async def _broadcast(self, data: bytes) -> None:
+        for path in self.socket_dir.glob("*.sock"):
+            if path.stem != self.shard_id:
+                await self._send(path.stem, data)
+
+
+class RedisRoutingBus(RoutingBus):
+    """
+    Bus between router processes on any number of hosts over Redis pub/sub. Every shard
+    subscribes to its own channel and to a broadcast channel.
+    """
+
+    def __init__(self, shard_id: str, redis_url: str, channel_prefix: str):
+        super().__init__(shard_id)
+        self.redis_url = redis_url
+        self.channel_prefix = channel_prefix
+        self._redis = None
+        self._pubsub = None
+        self._reader_task: Optional[asyncio.Task] = None
+
+    @property
+    def _broadcast_channel(self) -> str:
+        return f"{self.channel_prefix}:shards"
+
+    def _shard_channel(self, shard_id: str) -> str:
+        return f"{self.channel_prefix}:shard:{shard_id}"
+
+    async def _start(self) -> None:
+        self._redis = aioredis.from_url(self.redis_url)
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(
+            self._shard_channel(self.shard_id), self._broadcast_channel
+        )
+        self._reader_task = asyncio.create_task(self._read_loop())
+
+    async def _close(self) -> None:
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+        if self._redis is not None:
+            await self._redis.aclose()
+
+    async def _read_loop(self) -> None:
+        async for message in self._pubsub.listen():
+            try:
+                await self._receive(message["data"])
+            except Exception:
+                logging.exception("Failed to handle a frame from the routing bus")
+
+    async def _send(self, shard_id: str, data: bytes) -> bool:
+        # PUBLISH returns the number of subscribers, 0 means the shard is gone
+        return await self._redis.publish(self._shard_channel(shard_id), data) > 0
+
+    async def _broadcast(self, data: bytes) -> None:
+        await self._redis.publish(self._broadcast_channel, data)
+
+
+def create_routing_bus(settings: Settings) -> Optional[RoutingBus]:
+    """
+    Creates the bus configured by ROUTING_BUS.
+
+    Args:
+        settings (Settings): The router settings.
+
+    Returns:
+        Optional[RoutingBus]: The bus, None when the router runs as a single shard.
+    """
+    shard_id = settings.ROUTER_SHARD_ID or default_shard_id()
+    if settings.ROUTING_BUS == RoutingBusType.LOCAL:
+        return UnixSocketRoutingBus(
+            shard_id=shard_id, socket_dir=settings.ROUTING_BUS_SOCKET_DIR
+        )
+    if settings.ROUTING_BUS == RoutingBusType.REDIS:
+        return RedisRoutingBus(
+            shard_id=shard_id,
+            redis_url=settings.ROUTING_BUS_REDIS_URL,
+            channel_prefix=settings.ROUTING_BUS_CHANNEL_PREFIX,
+        )
+    return None
@@ -0,0 +1,377 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, Optional
+
+import msgspec
+from fastapi import WebSocket, WebSocketDisconnect
+
+from utils.codec import MSGPACK_SUBPROTOCOL, encode_message, transcode
+from utils.enums import (
+    ConnectionRole,
+    FrameEncoding,
+    SendQueueOverflowPolicy,
+    WSMessageType,
+)
+from utils.exceptions import SendQueueFullError
+
+
+def negotiate_frame_encoding(
+    websocket: WebSocket,
+) -> tuple[FrameEncoding, Optional[str]]:
+    """
+    Picks the encoding of the frames the router sends to a client. Clients opt into
+    MessagePack binary frames with the `genai.msgpack` subprotocol, or with the
+    `x-frame-encoding: msgpack` header for clients that can't set subprotocols.
+    Everyone else keeps getting JSON text frames.
+
+    Args:
+        websocket (WebSocket): The WebSocket connection, not accepted yet.
+
+    Returns:
+        tuple[FrameEncoding, Optional[str]]: The encoding, and the subprotocol to accept
+            the connection with, if the client asked for one.
+    """
+    if MSGPACK_SUBPROTOCOL in websocket.scope.get("subprotocols", ()):
+        return FrameEncoding.MSGPACK, MSGPACK_SUBPROTOCOL
+    if (
+        websocket.headers.get("x-frame-encoding", "").lower()
+        == FrameEncoding.MSGPACK.value
+    ):
+        return FrameEncoding.MSGPACK, None
+    return FrameEncoding.JSON, None
+
+
+def wants_heartbeat(websocket: WebSocket) -> bool:
+    """
+    Tells whether a client answers `router_ping` frames. genai_session agents handle every
+    frame they receive as an invocation, so only clients sending the
+    `x-router-heartbeat: true` header get them.
+
+    Args:
+        websocket (WebSocket): The WebSocket connection.
+
+    Returns:
+        bool: True if the router should send heartbeats to the client.
+    """
+    return websocket.headers.get("x-router-heartbeat", "").lower() in ("1", "true")
+
+
+class ClientConnection:
+    """
+    Wraps a single WebSocket connection with a bounded outbound queue and a writer task,
+    so a slow consumer never stalls the receive loop of the client sending to it.
+
+    Several connections may share a client ID (agent replicas), the connection ID is
+    unique per socket and is used as `invoked_by` so responses find their way back.
+
+    Frames are received as sent, text frames are JSON and binary frames are MessagePack.
+    The writer task converts outgoing frames to the encoding the client negotiated.
+    """
+
+    def __init__(
+        self,
+        client_id: str,
+        websocket: WebSocket,
+        max_queue_size: int,
+        overflow_policy: SendQueueOverflowPolicy,
+        role: ConnectionRole = ConnectionRole.AGENT,
+        shard_id: Optional[str] = None,
+        encoding: FrameEncoding = FrameEncoding.JSON,
+        user_id: Optional[str] = None,
+        heartbeat: bool = False,
+    ):
+        """
+        Initializes the connection with an empty outbound queue.
+
+        Args:
+            client_id (str): The resolved client ID of the connection.
+            websocket (WebSocket): The accepted WebSocket connection.
+            max_queue_size (int): Maximum number of queued outbound frames.
+            overflow_policy (SendQueueOverflowPolicy): What to do when the queue is full.
+            role (ConnectionRole): Kind of client, resolved from the connection headers.
+            shard_id (Optional[str]): Router shard owning the socket, it is embedded in the
+                connection ID so other shards can route responses back to it.
+            encoding (FrameEncoding): Encoding of the frames sent to the client.
+            user_id (Optional[str]): Owner of the client, from the agent JWT.
+            heartbeat (bool): Whether the client answers `router_ping` frames.
+        """
+        self.client_id = client_id
+        suffix = uuid.uuid4().hex[:12]
+        self.connection_id = (
+            f"{client_id}#{shard_id}.{suffix}" if shard_id else f"{client_id}#{suffix}"
+        )
+        self.websocket = websocket
+        self.role = role
+        self.encoding = encoding
+        self.user_id = user_id
+        self.overflow_policy = overflow_policy
+        self.dropped_messages = 0
+        self.in_flight = 0
+        self.bytes_sent = 0
+        self.transcoded_frames = 0
+        self.connected_at = time.time()
+        # updated by the manager for every frame received on the socket
+        self.last_activity = self.connected_at
+
+        self.heartbeat = heartbeat
+        self.missed_heartbeats = 0
+        # round-trip time of the last answered ping, in seconds
+        self.heartbeat_rtt: Optional[float] = None
+        self._ping_id = 0
+        self._ping_sent_at: Optional[float] = None
+
+        self._queue: asyncio.Queue[str | bytes] = asyncio.Queue(maxsize=max_queue_size)
+        self._writer_task: Optional[asyncio.Task] = None
+        self._closed = False
+        # wakes senders blocked on a full queue once nothing will drain it anymore
+        self._closed_event = asyncio.Event()
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        Returns:
+            int: Number of frames waiting to be written to the socket.
+        """
+        return self._queue.qsize()
+
+    @property
+    def invoker_id(self) -> str:
+        """
+        Returns:
+            str: Who is behind the invocations sent on this socket. Invoke keys are
+                `<invoking agent>:<target>`, so all sockets an agent opens share it.
+        """
+        if self.role == ConnectionRole.INVOKER:
+            return self.client_id.rsplit(":", 1)[0]
+        return self.client_id
+
+    @property
+    def is_closed(self) -> bool:
+        return self._closed
+
+    async def receive(self) -> str | bytes:
+        """
+        Waits for the next frame of the client.
+
+        Returns:
+            str | bytes: A JSON text frame or a MessagePack binary frame.
+
+        Raises:
+            WebSocketDisconnect: If the client disconnected.
+        """
+        message = await self.websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(
+                code=message.get("code", 1000), reason=message.get("reason")
+            )
+        if (text := message.get("text")) is not None:
+            return text
+        return message["bytes"]
+
+    def ping(self) -> int:
+        """
+        Queues a `router_ping` frame, unless the previous one is still unanswered. The
+        ping goes through the send queue, so a socket that stopped draining it misses
+        its pongs as well.
+
+        Returns:
+            int: Number of pings in a row the client failed to answer.
+        """
+        if self._ping_sent_at is not None or self._queue.full():
+            self.missed_heartbeats += 1
+            return self.missed_heartbeats
+
+        self._ping_id += 1
+        self._ping_sent_at = time.monotonic()
+        self._queue.put_nowait(
+            encode_message(
+                {
+                    "message_type": WSMessageType.ROUTER_PING.value,
+                    "ping_id": self._ping_id,
+                }
+            )
+        )
+        return self.missed_heartbeats
+
+    def pong(self, ping_id: Any) -> Optional[float]:
+        """
+        Handles the answer of the client to the last ping.
+
+        Args:
+            ping_id (Any): `ping_id` of the `router_pong` frame.
+
+        Returns:
+            Optional[float]: The round-trip time in seconds, None if the pong does not
+                answer the pending ping.
+        """
+        if self._ping_sent_at is None or ping_id != self._ping_id:
+            return None
+        self.heartbeat_rtt = time.monotonic() - self._ping_sent_at
+        self._ping_sent_at = None
+        self.missed_heartbeats = 0
+        return self.heartbeat_rtt
+
+    def complete_invocation(self) -> None:
+        """
+        Marks one invocation handled by this socket as finished.
+        """
+        if self.in_flight > 0:
+            self.in_flight -= 1
+
+    def start(self) -> None:
+        """
+        Starts the writer task draining the outbound queue into the socket.
+        """
+        if self._writer_task is None:
+            self._writer_task = asyncio.create_task(self._write_loop())
+
+    async def enqueue(self, message: str | bytes) -> None:
+        """
+        Puts a frame on the outbound queue, applying the overflow policy when it is full.
+
+        Args:
+            message (str | bytes): The encoded frame to send.
+
+        Raises:
+            SendQueueFullError: If the queue is full and the policy is ERROR.
+        """
+        if self._closed:
+            return
+
+        if not self._queue.full():
+            self._queue.put_nowait(message)
+            return
+
+        if self.overflow_policy == SendQueueOverflowPolicy.BLOCK:
+            await self._put_unless_closed(message)
+
+        elif self.overflow_policy == SendQueueOverflowPolicy.DROP_OLDEST:
+            self._queue.get_nowait()
+            self._queue.put_nowait(message)
+            self.dropped_messages += 1
+            logging.warning(
+                f"Send queue of {self.client_id} is full, dropped the oldest message"
+            )
+
+        else:
+            self.dropped_messages += 1
+            raise SendQueueFullError(
+                f"Send queue of {self.client_id} is full ({self._queue.maxsize} messages)"
+            )
+
+    async def close(self) -> None:
+        """
+        Stops the writer task and discards any frames still queued. Senders blocked on
+        the full queue return without queueing their frame.
+        """
+        self._mark_closed()
+        if self._writer_task is not None:
+            self._writer_task.cancel()
+            try:
+                await self._writer_task
+            except asyncio.CancelledError:
+                pass
+            self._writer_task = None
+        while not self._queue.empty():
+            self._queue.get_nowait()
+
+    async def flush(self, timeout: float) -> bool:
+        """
+        Waits until the writer has sent every queued frame, giving up after `timeout`
+        seconds or once the connection is closed.
+
+        Args:
+            timeout (float): Seconds to wait at most.
+
+        Returns:
+            bool: Whether every queued frame was sent.
+        """
+        if self._writer_task is None:
+            return self._queue.empty()
+        flushed = asyncio.ensure_future(self._queue.join())
+        closed = asyncio.ensure_future(self._closed_event.wait())
+        try:
+            await asyncio.wait(
+                (flushed, closed), timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            return flushed.done()
+        finally:
+            flushed.cancel()
+            closed.cancel()
+
+    async def close_websocket(self, code: int = 1000, reason: str = "") -> None:
+        """
+        Closes the socket itself, errors are ignored as the peer is usually gone already.
+
+        Args:
+            code (int): WebSocket close code.
+            reason (str): Close reason, at most 123 bytes.
+        """
+        try:
+            await self.websocket.close(code=code, reason=reason)
+        except Exception:
+            pass
+
+    async def _put_unless_closed(self, message: str | bytes) -> None:
+        """
+        Waits for room in the queue, giving up once the connection is closed.
+        """
+        put = asyncio.ensure_future(self._queue.put(message))
+        closed = asyncio.ensure_future(self._closed_event.wait())
+        try:
+            await asyncio.wait((put, closed), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            closed.cancel()
+            if not put.done():
+                put.cancel()
+                self.dropped_messages += 1
+
+    def _mark_closed(self) -> None:
+        self._closed = True
+        self._closed_event.set()
+
+    async def _write_loop(self) -> None:
+        while True:
+            message = await self._queue.get()
+            try:
+                if not await self._write(message):
+                    return
+            finally:
+                # flush() waits for every frame to be marked done
+                self._queue.task_done()
+
+    async def _write(self, message: str | bytes) -> bool:
+        """
+        Writes one frame to the socket.
+
+        Returns:
+            bool: False once the socket is unusable and the writer should stop.
+        """
+        try:
+            encoded = transcode(message, self.encoding)
+        except (msgspec.DecodeError, msgspec.EncodeError, TypeError) as e:
+            logging.warning(f"Failed to convert a frame for {self.client_id}: {e}")
+            return True
+        if encoded is not message:
+            self.transcoded_frames += 1
+            message = encoded
+
+        try:
+            if isinstance(message, bytes):
+                await self.websocket.send_bytes(message)
+            else:
+                await self.websocket.send_text(message)
+            # text frames go out as UTF-8, ASCII text is as long in bytes as in characters
+            self.bytes_sent += (
+                len(message)
+                if isinstance(message, bytes) or message.isascii()
+                else len(message.encode())
+            )
+        except Exception as e:
+            # The receive loop of this socket observes the disconnect and cleans up
+            logging.warning(f"Failed to send message to {self.client_id}: {e}")
+            self._mark_closed()
+            return False
+        return True
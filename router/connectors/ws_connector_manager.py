@@ -1,15 +1,84 @@
-import json
+import asyncio
 import logging
+import random
+import time
 import jwt
+import msgspec
 
-from typing import Dict
+from datetime import datetime, timezone
+
+from typing import Any, Dict, List, Optional, Set
 
 from fastapi import WebSocket
+from connectors.admission_control import AdmissionController, RateLimit
+from connectors.connection_pool import ConnectionPool
+from connectors.log_batcher import AgentLogBatcher
+from connectors.pending_invocations import PendingInvocation, PendingInvocationRegistry
+from connectors.presence import PresenceFeed
+from connectors.routing_bus import BusMessage, RoutingBus
+from connectors.ws_client_connection import (
+    ClientConnection,
+    negotiate_frame_encoding,
+    wants_heartbeat,
+)
 from settings import get_settings
-from utils.enums import WSMessageType, MasterServerName, ErrorType
+from utils.codec import (
+    append_field,
+    decode_envelope,
+    decode_message,
+    encode_message,
+    payload_has_error_message,
+)
+from utils.enums import (
+    BusMessageKind,
+    ConnectionRole,
+    PresenceEventType,
+    RateLimitScope,
+    WSMessageType,
+    MasterServerName,
+    ErrorType,
+)
+from utils.exceptions import SendQueueFullError
+from utils.frame_logger import FrameLogger
+from utils.metrics import (
+    RouterMetrics,
+    format_histograms,
+    format_metric,
+    message_type_label,
+)
+from utils.pydantic_models import DrainResponse, PresenceEntry, PresenceEvent
 
 app_settings = get_settings()
 
+# close code telling clients the router is restarting and they should reconnect
+SERVICE_RESTART_CLOSE_CODE = 1012
+
+# close code of the sockets that stopped answering heartbeats
+HEARTBEAT_TIMEOUT_CLOSE_CODE = 1011
+
+# order in which sockets are closed on drain: the backend goes last, so it still
+# receives the unregistrations of the agents closed before it
+DRAIN_CLOSE_ORDER = (
+    ConnectionRole.INVOKER,
+    ConnectionRole.AGENT,
+    ConnectionRole.MASTER_SERVER_ML,
+    ConnectionRole.MASTER_SERVER_BE,
+)
+
+STREAM_MESSAGE_TYPES = (
+    WSMessageType.AGENT_STREAM_START.value,
+    WSMessageType.AGENT_STREAM_CHUNK.value,
+    WSMessageType.AGENT_STREAM_END.value,
+)
+
+frame_logger = FrameLogger(
+    logger=logging.getLogger(__name__),
+    max_payload_bytes=app_settings.LOG_PAYLOAD_MAX_BYTES,
+    sample_rate=app_settings.LOG_SAMPLE_RATE,
+    sample_rates=app_settings.LOG_SAMPLE_RATES,
+    full_payload_client_ids=app_settings.LOG_FULL_PAYLOAD_AGENT_IDS,
+)
+
 
 class WSConnectionManager:
     """
@@ -23,39 +92,171 @@ class WSConnectionManager:
         app_settings.MASTER_AGENT_API_KEY: MasterServerName.MASTER_SERVER_ML.value,
     }
 
-    def __init__(self):
+    def __init__(self, bus: Optional[RoutingBus] = None):
         """
         Initializes the WebSocket connection manager with an empty active connections dictionary.
+
+        Args:
+            bus (Optional[RoutingBus]): Bus to the other router shards, None when the
+                router runs as a single process.
+        """
+        self.bus = bus
+        # client ID -> replicas connected under it
+        self.active_connections: Dict[str, ConnectionPool] = {}
+        # connection ID -> single socket, used to route responses to the exact invoker
+        self.connections: Dict[str, ClientConnection] = {}
+        self.pending_invocations = PendingInvocationRegistry(
+            timeout=app_settings.INVOCATION_TIMEOUT_SECONDS,
+            tick=app_settings.INVOCATION_TIMER_TICK_SECONDS,
+            on_expire=self._expire_invocation,
+        )
+        self.metrics = RouterMetrics()
+        self.log_batcher = AgentLogBatcher(
+            send_batch=self._send_log_batch,
+            interval=app_settings.LOG_BATCH_INTERVAL_MS / 1000,
+            max_batch_size=app_settings.LOG_BATCH_MAX_SIZE,
+            max_buffer_size=app_settings.LOG_BUFFER_MAX_SIZE,
+        )
+        self.admission = AdmissionController(
+            limits={
+                RateLimitScope.INVOKER: RateLimit(
+                    app_settings.INVOKE_RATE_LIMIT_PER_INVOKER,
+                    app_settings.INVOKE_BURST_PER_INVOKER,
+                ),
+                RateLimitScope.AGENT: RateLimit(
+                    app_settings.INVOKE_RATE_LIMIT_PER_AGENT,
+                    app_settings.INVOKE_BURST_PER_AGENT,
+                ),
+                RateLimitScope.USER: RateLimit(
+                    app_settings.INVOKE_RATE_LIMIT_PER_USER,
+                    app_settings.INVOKE_BURST_PER_USER,
+                ),
+            },
+            overrides={
+                scope: {key: RateLimit(c.rate, c.burst) for key, c in keys.items()}
+                for scope, keys in app_settings.INVOKE_RATE_LIMIT_OVERRIDES.items()
+            },
+        )
+        self.presence = PresenceFeed()
+        # set by drain(), new connections and invocations are turned away from then on
+        self.draining = False
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._closing_sockets: Set[asyncio.Task] = set()
+
+    async def start(self) -> None:
+        """
+        Connects the manager to the other router shards and starts the heartbeats.
+        """
+        if self.bus is not None:
+            await self.bus.start(self._on_bus_message)
+        if app_settings.HEARTBEAT_INTERVAL_SECONDS > 0 and self._heartbeat_task is None:
+            self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(app_settings.HEARTBEAT_INTERVAL_SECONDS)
+            try:
+                await self.send_heartbeats()
+            except Exception:
+                logging.exception("Failed to send heartbeats")
+
+    async def send_heartbeats(self) -> None:
+        """
+        Pings the sockets that opted into heartbeats and reaps the ones that stopped
+        answering, e.g. half-open connections of crashed clients that would otherwise
+        keep receiving invocations until a send fails. Every socket also gets the
+        WebSocket pings of uvicorn, which close it without a round-trip time.
+        """
+        for connection in list(self.connections.values()):
+            if connection.heartbeat and (
+                connection.ping() >= app_settings.HEARTBEAT_MAX_MISSED
+            ):
+                await self._reap(connection)
+
+    async def _reap(self, connection: ClientConnection) -> None:
+        """
+        Disconnects a socket that stopped answering heartbeats.
+
+        Args:
+            connection (ClientConnection): The unresponsive socket.
         """
-        self.active_connections: Dict[str, WebSocket] = {}
+        logging.warning(
+            f"{connection.connection_id} missed {connection.missed_heartbeats} heartbeats, disconnecting"
+        )
+        self.metrics.heartbeat_reaped_total += 1
+        await self.disconnect(connection)
+        # unblocks the receive loop of the socket, its own disconnect() is then a no-op
+        task = asyncio.create_task(
+            connection.close_websocket(
+                code=HEARTBEAT_TIMEOUT_CLOSE_CODE, reason="Heartbeat timeout"
+            )
+        )
+        self._closing_sockets.add(task)
+        task.add_done_callback(self._closing_sockets.discard)
+
+    def is_active(self, client_id: str) -> bool:
+        """
+        Args:
+            client_id (str): A client ID.
+
+        Returns:
+            bool: True if the client is connected to this or any other router shard.
+        """
+        if client_id in self.active_connections:
+            return True
+        return self.bus is not None and bool(self.bus.shards_of(client_id))
 
     async def process_message(
-        self, client_id: str, message: str, agent_jwt: str
+        self, connection: ClientConnection, message: str | bytes, agent_jwt: str
     ) -> None:
         """
         Processes incoming messages from clients and routes them based on message type.
 
         Args:
-            client_id (str): The ID of the client sending the message.
-            message (str): The message content as a JSON string.
+            connection (ClientConnection): The connection the message was received on.
+            message (str | bytes): The message content as a JSON string, or MessagePack
+                bytes if it was received as a binary frame.
         """
+        client_id = connection.client_id
+        connection.last_activity = time.time()
+        # frames forwarded to other clients keep the encoding they were received in
+        binary = isinstance(message, bytes)
+
+        if app_settings.RAW_FRAME_FORWARDING and await self._forward_raw(
+            connection, message
+        ):
+            return
+
         try:
-            data = json.loads(message)
-            logging.debug(f"Received message: {data}")
-        except json.JSONDecodeError:
+            data = decode_message(message)
+        except msgspec.DecodeError:
+            self.metrics.count_message("invalid", len(message))
             await self.send_message(
-                client_id=client_id,
+                client_id=connection.connection_id,
                 message={
                     "error": {
-                        "error_message": "Invalid JSON format",
+                        "error_message": (
+                            "Invalid MessagePack format"
+                            if binary
+                            else "Invalid JSON format"
+                        ),
                         "error_type": ErrorType.INVALID_JSON_REQUEST_FORMAT.value,
                     }
                 },
             )
         else:
-            message_type = data.pop("message_type", None)
-            agent_uuid = data.pop("agent_uuid", None)
+            # forwarded frames keep their fields, like the frames of the raw path do
+            message_type = data.get("message_type")
+            agent_uuid = data.get("agent_uuid")
             payload = data.get("request_payload")
+            self.metrics.count_message(message_type, len(message))
+            frame_logger.log_frame(
+                logging.DEBUG,
+                "received",
+                message_type_label(message_type),
+                client_id,
+                message,
+            )
 
             if message_type == WSMessageType.AGENT_REGISTER.value:
                 if client_id not in self.MASTER_SERVERS_API_KEY_MAPPING.values():
@@ -78,17 +279,34 @@ class WSConnectionManager:
                 WSMessageType.AGENT_RESPONSE.value,
                 WSMessageType.AGENT_ERROR.value,
             ):
-                invoked_by = data.pop("invoked_by", None)
-                data["message_type"] = message_type
-                logging.info(
-                    f"Got response: {data}, from: {client_id}, invoked_by: {invoked_by}"
+                invoked_by = data.get("invoked_by")
+                self._complete_invocation(
+                    connection,
+                    invoked_by,
+                    (data.get("request_metadata") or {}).get("request_id"),
+                )
+                await self.send_message(
+                    invoked_by,
+                    encode_message(data, binary=binary),
+                    message_type=message_type,
                 )
-                await self.send_message(invoked_by, data)
+
+            elif message_type in STREAM_MESSAGE_TYPES:
+                if invoker := self._stream_invoker(
+                    connection,
+                    data.get("invoked_by"),
+                    (data.get("request_metadata") or {}).get("request_id"),
+                ):
+                    await self.send_message(
+                        invoker,
+                        encode_message(data, binary=binary),
+                        message_type=message_type,
+                    )
 
             elif message_type == WSMessageType.AGENT_INVOKE.value:
                 if not payload and not agent_uuid:
                     await self.send_message(
-                        client_id=client_id,
+                        client_id=connection.connection_id,
                         message={
                             "error": {
                                 "error_message": "Missing request payload or agent UUID",
@@ -97,9 +315,9 @@ class WSConnectionManager:
                         },
                     )
 
-                if agent_uuid not in self.active_connections:
+                if not self.is_active(agent_uuid):
                     await self.send_message(
-                        client_id=client_id,
+                        client_id=connection.connection_id,
                         message={
                             "message_type": WSMessageType.AGENT_ERROR.value,
                             "error": {
@@ -114,7 +332,7 @@ class WSConnectionManager:
                     and not client_id.startswith(app_settings.MASTER_BE_API_KEY)
                 ):
                     await self.send_message(
-                        client_id=client_id,
+                        client_id=connection.connection_id,
                         message={
                             "error": {
                                 "error_message": "Agent is NOT active",
@@ -129,12 +347,33 @@ class WSConnectionManager:
                     ):
                         payload["message_type"] = WSMessageType.AGENT_ERROR.value
                         payload = {"error": payload}
-                        await self.send_message(agent_uuid, payload)
-                    else:
-                        data["invoked_by"] = client_id
-                        await self.send_message(agent_uuid, data)
+                        await self.broadcast_message(agent_uuid, payload)
+                    elif await self._admit(connection, agent_uuid):
+                        data["invoked_by"] = connection.connection_id
+                        await self._dispatch_invoke(
+                            connection.connection_id,
+                            agent_uuid,
+                            encode_message(data, binary=binary),
+                            session_id=(data.get("request_metadata") or {}).get(
+                                "session_id"
+                            ),
+                            request_id=(data.get("request_metadata") or {}).get(
+                                "request_id"
+                            ),
+                        )
+
+            elif message_type == WSMessageType.ROUTER_PONG.value:
+                if (rtt := connection.pong(data.get("ping_id"))) is not None:
+                    self.metrics.observe_heartbeat(client_id, rtt)
 
             elif message_type == WSMessageType.AGENT_LOG.value:
+                # the agent UUID of a log is the sender, whatever the frame claims
+                data.pop("message_type")
+                data.pop("agent_uuid", None)
+                if app_settings.LOG_BATCHING_ENABLED:
+                    self.log_batcher.add({"agent_uuid": client_id, **data})
+                    return
+
                 await self.send_message(
                     client_id=MasterServerName.MASTER_SERVER_BE.value,
                     message={
@@ -148,7 +387,7 @@ class WSConnectionManager:
 
             else:
                 await self.send_message(
-                    client_id=client_id,
+                    client_id=connection.connection_id,
                     message={
                         "error": {
                             "error_message": f"Unexpected exception: {message}",
@@ -157,34 +396,906 @@ class WSConnectionManager:
                     },
                 )
 
-    async def send_message(self, client_id: str, message: str | dict):
+    async def _forward_raw(
+        self, connection: ClientConnection, message: str | bytes
+    ) -> bool:
+        """
+        Fast path for the high-volume invoke/response traffic: decodes only the routing
+        envelope and forwards the frame as-is, without re-encoding the payload.
+        Anything that needs the full message (registration, logs, errors) is left to
+        the regular path. Frames keep their encoding, the writer of the receiving socket
+        converts them if needed.
+
+        Args:
+            connection (ClientConnection): The connection the message was received on.
+            message (str | bytes): The message content as a JSON string or MessagePack bytes.
+
+        Returns:
+            bool: True if the message has been forwarded.
+        """
+        client_id = connection.client_id
+        envelope = decode_envelope(message)
+        if envelope is None:
+            return False
+
+        if envelope.message_type in (
+            WSMessageType.AGENT_RESPONSE.value,
+            WSMessageType.AGENT_ERROR.value,
+        ):
+            if not envelope.invoked_by:
+                return False
+            self.metrics.count_message(envelope.message_type, len(message))
+            frame_logger.log_frame(
+                logging.DEBUG,
+                "received",
+                envelope.message_type,
+                client_id,
+                message,
+                peer=envelope.invoked_by,
+            )
+            self._complete_invocation(
+                connection, envelope.invoked_by, envelope.request_metadata.request_id
+            )
+            await self.send_message(
+                envelope.invoked_by, message, message_type=envelope.message_type
+            )
+            return True
+
+        if envelope.message_type in STREAM_MESSAGE_TYPES:
+            invoker = self._stream_invoker(
+                connection, envelope.invoked_by, envelope.request_metadata.request_id
+            )
+            self.metrics.count_message(envelope.message_type, len(message))
+            if invoker:
+                await self.send_message(
+                    invoker, message, message_type=envelope.message_type
+                )
+            return True
+
+        if envelope.message_type == WSMessageType.AGENT_INVOKE.value:
+            agent_uuid = envelope.agent_uuid
+            if not agent_uuid or not self.is_active(agent_uuid):
+                return False
+
+            if client_id.startswith(app_settings.MASTER_BE_API_KEY):
+                if (
+                    payload_has_error_message(
+                        envelope.request_payload, binary=isinstance(message, bytes)
+                    )
+                    is not False
+                ):
+                    return False
+            elif agent_uuid == MasterServerName.MASTER_SERVER_ML.value:
+                return False
+
+            self.metrics.count_message(envelope.message_type, len(message))
+            frame_logger.log_frame(
+                logging.DEBUG,
+                "received",
+                envelope.message_type,
+                client_id,
+                message,
+                peer=agent_uuid,
+            )
+            if not await self._admit(connection, agent_uuid):
+                return True
+            await self._dispatch_invoke(
+                connection.connection_id,
+                agent_uuid,
+                append_field(message, "invoked_by", connection.connection_id),
+                session_id=envelope.request_metadata.session_id,
+                request_id=envelope.request_metadata.request_id,
+            )
+            return True
+
+        return False
+
+    async def _admit(self, connection: ClientConnection, agent_uuid: str) -> bool:
         """
-        Sends a message to the specified client if the connection exists.
+        Applies the invocation rate limits of the invoker, the target agent and the user.
+        Rejected invocations are answered right away with an AGENT_ERROR telling the
+        invoker when to retry, instead of piling up in the agent's send queue.
+
+        Args:
+            connection (ClientConnection): The connection the invocation was received on.
+            agent_uuid (str): The client ID of the invoked agent.
+
+        Returns:
+            bool: True if the invocation may be forwarded.
+        """
+        if self.draining:
+            await self.send_message(
+                client_id=connection.connection_id,
+                message={
+                    "message_type": WSMessageType.AGENT_ERROR.value,
+                    "error": {
+                        "error_message": "Router is restarting, retry later",
+                        "error_type": ErrorType.ROUTER_DRAINING.value,
+                        "agent_uuid": agent_uuid,
+                        "retry_after": round(self._reconnect_delay(), 3),
+                    },
+                },
+            )
+            return False
+
+        if not self.admission.enabled:
+            return True
+
+        rejection = self.admission.admit(
+            (
+                (RateLimitScope.INVOKER, connection.invoker_id),
+                (RateLimitScope.AGENT, agent_uuid),
+                (RateLimitScope.USER, connection.user_id),
+            )
+        )
+        if rejection is None:
+            return True
+
+        self.metrics.rate_limited_total[rejection.scope.value] += 1
+        await self.send_message(
+            client_id=connection.connection_id,
+            message={
+                "message_type": WSMessageType.AGENT_ERROR.value,
+                "error": {
+                    "error_message": f"Too many invocations per {rejection.scope.value}, retry later",
+                    "error_type": ErrorType.RATE_LIMITED.value,
+                    "agent_uuid": agent_uuid,
+                    "limit_scope": rejection.scope.value,
+                    "retry_after": round(rejection.retry_after, 3),
+                },
+            },
+        )
+        return False
+
+    async def _dispatch_invoke(
+        self,
+        invoker: str,
+        agent_uuid: str,
+        message: str | bytes | dict,
+        session_id: Optional[str] = None,
+        request_id: Optional[str] = None,
+    ) -> None:
+        """
+        Sends an invocation to one replica of the agent and counts it as in flight there.
+        Replicas connected to this shard are preferred, otherwise the invocation is handed
+        to a shard holding the agent, which tracks it from then on.
+
+        Args:
+            invoker (str): Connection ID of the invoker, possibly on another shard.
+            agent_uuid (str): The client ID of the invoked agent.
+            message (str | bytes | dict): The invocation to forward.
+            session_id (Optional[str]): Session of the invocation, used for session affinity.
+            request_id (Optional[str]): Request ID from the request metadata, used to
+                route stream frames that do not carry `invoked_by`.
+        """
+        if agent_uuid not in self.active_connections and self.bus is not None:
+            await self._send_remote(
+                BusMessageKind.INVOKE,
+                agent_uuid,
+                encode_message(message) if isinstance(message, dict) else message,
+                session_id=session_id,
+                reply_to=invoker,
+            )
+            return
+
+        target = await self.send_message(
+            agent_uuid,
+            message,
+            reply_to=invoker,
+            session_id=session_id,
+            message_type=WSMessageType.AGENT_INVOKE.value,
+        )
+        if target is not None:
+            target.in_flight += 1
+            self.pending_invocations.add(
+                invoker=invoker,
+                agent_uuid=agent_uuid,
+                connection_id=target.connection_id,
+                client_request_id=request_id,
+            )
+
+    def _stream_invoker(
+        self,
+        connection: ClientConnection,
+        invoked_by: Optional[str],
+        request_id: Optional[str],
+    ) -> Optional[str]:
+        """
+        Resolves the invoker a stream frame is for. Agents that do not know their invoker,
+        e.g. the master agent relaying chunks of the agents it called, only send the
+        request ID, which is matched against the invocations the connection is handling.
+
+        Args:
+            connection (ClientConnection): The replica that sent the stream frame.
+            invoked_by (Optional[str]): Connection ID of the invoker, if the frame has it.
+            request_id (Optional[str]): Request ID from the request metadata.
+
+        Returns:
+            Optional[str]: Connection ID of the invoker, None if it is unknown.
+        """
+        if invoked_by:
+            return invoked_by
+        if request_id and (
+            invocation := self.pending_invocations.find_for_request(
+                connection.connection_id, request_id
+            )
+        ):
+            return invocation.invoker
+        return None
+
+    def _complete_invocation(
+        self,
+        connection: ClientConnection,
+        invoked_by: Optional[str],
+        request_id: Optional[str] = None,
+    ) -> None:
+        """
+        Clears the pending invocation answered by a response received on the connection.
+
+        Args:
+            connection (ClientConnection): The replica that sent the response.
+            invoked_by (Optional[str]): Connection ID of the invoker.
+            request_id (Optional[str]): Request ID from the request metadata, if the
+                response has it.
+        """
+        if not invoked_by:
+            return
+
+        if invocation := self.pending_invocations.complete(
+            invoker=invoked_by,
+            connection_id=connection.connection_id,
+            client_request_id=request_id,
+        ):
+            connection.complete_invocation()
+            self.metrics.observe_invocation(
+                invocation.agent_uuid,
+                asyncio.get_running_loop().time() - invocation.started_at,
+            )
+
+    async def _send_log_batch(self, logs: List[Dict[str, Any]]) -> bool:
+        """
+        Sends a batch of agent logs to the backend unless it is falling behind.
+
+        Args:
+            logs (List[Dict[str, Any]]): The log entries.
+
+        Returns:
+            bool: False if the batch has been held back.
+        """
+        backend = self._resolve(MasterServerName.MASTER_SERVER_BE.value)
+        if backend is not None:
+            if backend.queue_depth >= app_settings.LOG_BACKEND_MAX_QUEUE_DEPTH:
+                return False
+        elif not self.is_active(MasterServerName.MASTER_SERVER_BE.value):
+            return False
+
+        await self.send_message(
+            client_id=(
+                backend.connection_id
+                if backend is not None
+                else MasterServerName.MASTER_SERVER_BE.value
+            ),
+            message={
+                "request_payload": {
+                    "message_type": WSMessageType.AGENT_LOG_BATCH.value,
+                    "logs": logs,
+                }
+            },
+        )
+        return True
+
+    async def _expire_invocation(self, invocation: PendingInvocation) -> None:
+        """
+        Fails an invocation that has not been answered before its deadline.
+
+        Args:
+            invocation (PendingInvocation): The expired invocation.
+        """
+        if target := self.connections.get(invocation.connection_id):
+            target.complete_invocation()
+        self.metrics.invocation_timeouts_total[invocation.agent_uuid] += 1
+
+        logging.warning(
+            f"Invocation of {invocation.agent_uuid} by {invocation.invoker} timed out"
+        )
+        await self.send_message(
+            client_id=invocation.invoker,
+            message={
+                "message_type": WSMessageType.AGENT_ERROR.value,
+                "error": {
+                    "error_message": "Agent did not respond in time",
+                    "error_type": ErrorType.INVOCATION_TIMEOUT.value,
+                    "agent_uuid": invocation.agent_uuid,
+                },
+            },
+        )
+
+    def _resolve(
+        self, client_id: str, session_id: Optional[str] = None
+    ) -> Optional[ClientConnection]:
+        """
+        Resolves a client or connection ID to the socket that should receive a message.
+
+        Args:
+            client_id (str): Either a connection ID or a client ID shared by replicas.
+            session_id (Optional[str]): Session of the message, used for session affinity.
+
+        Returns:
+            Optional[ClientConnection]: The target socket, None if nothing is connected.
+        """
+        if connection := self.connections.get(client_id):
+            return connection
+        if pool := self.active_connections.get(client_id):
+            return pool.pick(session_id=session_id)
+        return None
+
+    async def send_message(
+        self,
+        client_id: str,
+        message: str | bytes | dict,
+        reply_to: Optional[str] = None,
+        session_id: Optional[str] = None,
+        message_type: Optional[str] = None,
+    ) -> Optional[ClientConnection]:
+        """
+        Queues a message for the specified client if the connection exists. Clients
+        connected to other router shards are reached through the routing bus.
+
+        Args:
+            client_id (str): The client or connection ID to which the message should be sent.
+            message (str | bytes | dict): The message content, can be a JSON string,
+                MessagePack bytes or a dictionary.
+            reply_to (Optional[str]): The client to notify with an AGENT_ERROR if the
+                message is rejected because the target send queue is full.
+            session_id (Optional[str]): Session of the message, used to pick a replica.
+            message_type (Optional[str]): Message type, only used for log sampling.
+                Taken from the message itself when it is a dictionary.
+
+        Returns:
+            Optional[ClientConnection]: The socket the message was queued for, None if it
+                was not queued on this shard.
+        """
+        if isinstance(message, dict):
+            message_type = message_type or message.get("message_type")
+            message = encode_message(message)
+        connection = self._resolve(client_id, session_id=session_id)
+        if connection is None:
+            if self.bus is not None:
+                await self._send_remote(
+                    BusMessageKind.DELIVER,
+                    client_id,
+                    message,
+                    session_id=session_id,
+                    reply_to=reply_to,
+                )
+            return None
+
+        return await self._enqueue(connection, message, message_type, reply_to)
+
+    async def _enqueue(
+        self,
+        connection: ClientConnection,
+        message: str | bytes,
+        message_type: Optional[str] = None,
+        reply_to: Optional[str] = None,
+    ) -> Optional[ClientConnection]:
+        """
+        Queues an encoded message on a socket of this shard.
+
+        Args:
+            connection (ClientConnection): The target socket.
+            message (str | bytes): The encoded message.
+            message_type (Optional[str]): Message type, only used for log sampling.
+            reply_to (Optional[str]): The client to notify if the send queue is full.
+
+        Returns:
+            Optional[ClientConnection]: The socket, None if the message was rejected.
+        """
+        frame_logger.log_frame(
+            logging.INFO, "sending", message_type, connection.client_id, message
+        )
+
+        try:
+            await connection.enqueue(message)
+        except SendQueueFullError as e:
+            logging.warning(str(e))
+            if reply_to and reply_to not in (
+                connection.client_id,
+                connection.connection_id,
+            ):
+                await self.send_message(
+                    client_id=reply_to,
+                    message={
+                        "message_type": WSMessageType.AGENT_ERROR.value,
+                        "error": {
+                            "error_message": "Agent is busy, try again later",
+                            "error_type": ErrorType.SEND_QUEUE_FULL.value,
+                        },
+                    },
+                )
+            return None
+        return connection
+
+    async def broadcast_message(
+        self, client_id: str, message: str | bytes | dict
+    ) -> None:
+        """
+        Queues a message for every replica connected under the client ID.
 
         Args:
             client_id (str): The client ID to which the message should be sent.
-            message (str | dict): The message content, can be a string or a dictionary.
+            message (str | bytes | dict): The message content, can be a JSON string,
+                MessagePack bytes or a dictionary.
+        """
+        if pool := self.active_connections.get(client_id):
+            for connection in pool.connections:
+                await self.send_message(connection.connection_id, message)
+
+        if self.bus is not None:
+            for shard_id in self.bus.shards_of(client_id):
+                await self.bus.send(
+                    shard_id,
+                    BusMessageKind.BROADCAST,
+                    client_id,
+                    encode_message(message) if isinstance(message, dict) else message,
+                )
+
+    async def _send_remote(
+        self,
+        kind: BusMessageKind,
+        client_id: str,
+        message: str | bytes,
+        session_id: Optional[str] = None,
+        reply_to: Optional[str] = None,
+    ) -> bool:
+        """
+        Hands a message to the router shard holding the client.
+
+        Args:
+            kind (BusMessageKind): DELIVER for plain messages, INVOKE for invocations.
+            client_id (str): The client or connection ID the message is for.
+            message (str | bytes): The encoded message.
+            session_id (Optional[str]): Session of the message, used to pick a shard.
+            reply_to (Optional[str]): Connection ID of the invoker.
+
+        Returns:
+            bool: False if no shard holds the client.
+        """
+        tried = set()
+        while (
+            shard_id := self.bus.pick_shard(client_id, session_id=session_id)
+        ) and shard_id not in tried:
+            tried.add(shard_id)
+            if await self.bus.send(
+                shard_id,
+                kind,
+                client_id,
+                message,
+                session_id=session_id,
+                reply_to=reply_to,
+            ):
+                return True
+        return False
+
+    async def _on_bus_message(self, message: BusMessage) -> None:
+        """
+        Handles a message another router shard forwarded for a socket of this shard.
+
+        Args:
+            message (BusMessage): The forwarded message.
+        """
+        frame = message.frame if message.binary else message.frame.decode()
+        session_id = message.session_id or None
+        reply_to = message.reply_to or None
+
+        if message.kind == BusMessageKind.INVOKE:
+            if message.target in self.active_connections:
+                envelope = decode_envelope(frame)
+                await self._dispatch_invoke(
+                    reply_to,
+                    message.target,
+                    frame,
+                    session_id=session_id,
+                    request_id=(
+                        envelope.request_metadata.request_id if envelope else None
+                    ),
+                )
+            elif reply_to:
+                await self.send_message(
+                    client_id=reply_to,
+                    message={
+                        "message_type": WSMessageType.AGENT_ERROR.value,
+                        "error": {
+                            "error_message": "Agent is NOT active",
+                            "error_type": ErrorType.AGENT_NOT_ACTIVE.value,
+                        },
+                    },
+                )
+
+        elif message.kind == BusMessageKind.DELIVER:
+            if connection := self._resolve(message.target, session_id=session_id):
+                await self._enqueue(connection, frame, reply_to=reply_to)
+
+        elif message.kind == BusMessageKind.BROADCAST:
+            if pool := self.active_connections.get(message.target):
+                for connection in pool.connections:
+                    await self._enqueue(connection, frame)
+
+    def _publish_presence(
+        self,
+        event: PresenceEventType,
+        connection: ClientConnection,
+        replicas: int,
+    ) -> None:
+        if not self.presence:
+            return
+        self.presence.publish(
+            PresenceEvent(
+                event=event,
+                client_id=connection.client_id,
+                connection_id=connection.connection_id,
+                role=connection.role,
+                replicas=replicas,
+                timestamp=datetime.now(timezone.utc),
+            )
+        )
+
+    def get_presence(self) -> List[PresenceEntry]:
+        """
+        Builds the list of connected clients from the live connection table, together
+        with the clients other router shards announced on the routing bus.
+
+        Returns:
+            List[PresenceEntry]: One entry per client ID.
+        """
+        entries = {}
+        for client_id, pool in self.active_connections.items():
+            connections = pool.connections
+            if not connections:
+                continue
+            entries[client_id] = PresenceEntry(
+                client_id=client_id,
+                role=connections[0].role,
+                replicas=len(connections),
+                connected_at=datetime.fromtimestamp(
+                    min(c.connected_at for c in connections), timezone.utc
+                ),
+                last_activity=datetime.fromtimestamp(
+                    max(c.last_activity for c in connections), timezone.utc
+                ),
+                heartbeat_rtt=max(
+                    (
+                        c.heartbeat_rtt
+                        for c in connections
+                        if c.heartbeat_rtt is not None
+                    ),
+                    default=None,
+                ),
+            )
+
+        if self.bus is not None:
+            for client_id, shards in self.bus.directory.items():
+                if not shards:
+                    continue
+                entry = entries.get(client_id)
+                if entry is None:
+                    entry = entries[client_id] = PresenceEntry(
+                        client_id=client_id, replicas=0
+                    )
+                entry.shards = sorted(shards)
+
+        return list(entries.values())
+
+    def get_send_queue_depths(self) -> Dict[str, int]:
+        """
+        Returns the number of frames waiting to be written for every connected socket.
+
+        Returns:
+            Dict[str, int]: Mapping of connection ID to outbound queue depth.
+        """
+        return {
+            connection_id: connection.queue_depth
+            for connection_id, connection in self.connections.items()
+        }
+
+    def get_metrics(self) -> str:
+        """
+        Renders the router metrics in the Prometheus text exposition format.
+        Gauges are computed from the connection table at scrape time.
+
+        Returns:
+            str: The metrics page.
+        """
+        connections = list(self.connections.values())
+
+        connections_by_role = {role.value: 0 for role in ConnectionRole}
+        in_flight_by_agent: Dict[str, int] = {}
+        for connection in connections:
+            connections_by_role[connection.role.value] += 1
+            if connection.role != ConnectionRole.INVOKER:
+                in_flight_by_agent[connection.client_id] = (
+                    in_flight_by_agent.get(connection.client_id, 0)
+                    + connection.in_flight
+                )
+
+        lines = [
+            *format_metric(
+                "router_active_connections",
+                "gauge",
+                "Open WebSocket connections by client role.",
+                (
+                    ({"role": role}, count)
+                    for role, count in connections_by_role.items()
+                ),
+            ),
+            *format_metric(
+                "router_messages_total",
+                "counter",
+                "Frames received by message type.",
+                (
+                    ({"message_type": message_type}, count)
+                    for message_type, count in self.metrics.messages_total.items()
+                ),
+            ),
+            *format_metric(
+                "router_received_bytes_total",
+                "counter",
+                "Size of the frames received.",
+                [({}, self.metrics.bytes_in_total)],
+            ),
+            *format_metric(
+                "router_sent_bytes_total",
+                "counter",
+                "Size of the frames written to sockets.",
+                [
+                    (
+                        {},
+                        self.metrics.bytes_out_total
+                        + sum(connection.bytes_sent for connection in connections),
+                    )
+                ],
+            ),
+            *format_metric(
+                "router_transcoded_frames_total",
+                "counter",
+                "Frames converted between JSON and MessagePack for the receiving client.",
+                [
+                    (
+                        {},
+                        self.metrics.transcoded_frames_total
+                        + sum(
+                            connection.transcoded_frames for connection in connections
+                        ),
+                    )
+                ],
+            ),
+            *format_metric(
+                "router_rate_limited_total",
+                "counter",
+                "Invocations rejected by admission control, by the limit that was hit.",
+                (
+                    ({"scope": scope}, count)
+                    for scope, count in self.metrics.rate_limited_total.items()
+                ),
+            ),
+            *format_histograms(
+                "router_invocation_duration_seconds",
+                "Time from forwarding agent_invoke to receiving the agent response.",
+                self.metrics.invocation_latency,
+                label="agent_uuid",
+            ),
+            *format_metric(
+                "router_invocation_timeouts_total",
+                "counter",
+                "Invocations failed because the agent did not respond in time.",
+                (
+                    ({"agent_uuid": agent_uuid}, count)
+                    for agent_uuid, count in self.metrics.invocation_timeouts_total.items()
+                ),
+            ),
+            *format_histograms(
+                "router_heartbeat_rtt_seconds",
+                "Round-trip time of router_ping frames.",
+                self.metrics.heartbeat_rtt,
+                label="client_id",
+            ),
+            *format_metric(
+                "router_heartbeat_rtt_last_seconds",
+                "gauge",
+                "Round-trip time of the last answered router_ping of a socket.",
+                (
+                    (
+                        {
+                            "client_id": connection.client_id,
+                            "connection_id": connection.connection_id,
+                        },
+                        connection.heartbeat_rtt,
+                    )
+                    for connection in connections
+                    if connection.heartbeat_rtt is not None
+                ),
+            ),
+            *format_metric(
+                "router_heartbeat_reaped_total",
+                "counter",
+                "Sockets disconnected after missing too many heartbeats.",
+                [({}, self.metrics.heartbeat_reaped_total)],
+            ),
+            *format_metric(
+                "router_draining",
+                "gauge",
+                "1 while the router is draining before a restart.",
+                [({}, int(self.draining))],
+            ),
+            *format_metric(
+                "router_pending_invocations",
+                "gauge",
+                "Invocations waiting for a response.",
+                [({}, len(self.pending_invocations))],
+            ),
+            *format_metric(
+                "router_in_flight_invocations",
+                "gauge",
+                "Invocations being handled by the replicas of a client.",
+                (
+                    ({"client_id": client_id}, count)
+                    for client_id, count in in_flight_by_agent.items()
+                ),
+            ),
+            *format_metric(
+                "router_send_queue_depth",
+                "gauge",
+                "Frames waiting to be written to a socket.",
+                (
+                    (
+                        {
+                            "client_id": connection.client_id,
+                            "connection_id": connection.connection_id,
+                        },
+                        connection.queue_depth,
+                    )
+                    for connection in connections
+                ),
+            ),
+            *format_metric(
+                "router_send_queue_dropped_total",
+                "counter",
+                "Frames dropped or rejected because a send queue was full.",
+                [
+                    (
+                        {},
+                        self.metrics.send_queue_dropped_total
+                        + sum(
+                            connection.dropped_messages for connection in connections
+                        ),
+                    )
+                ],
+            ),
+            *format_metric(
+                "router_buffered_agent_logs",
+                "gauge",
+                "Agent log entries waiting to be sent to the backend.",
+                [({}, self.log_batcher.buffered_logs)],
+            ),
+            *format_metric(
+                "router_dropped_agent_logs_total",
+                "counter",
+                "Agent log entries dropped because the log buffer was full.",
+                [({}, self.log_batcher.dropped_logs)],
+            ),
+        ]
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _reconnect_delay() -> float:
+        """
+        Returns:
+            float: A random delay for a client to wait before reconnecting after a drain.
+        """
+        return random.uniform(0, app_settings.DRAIN_RECONNECT_JITTER_SECONDS)
+
+    async def drain(
+        self,
+        timeout: float = app_settings.DRAIN_TIMEOUT_SECONDS,
+        close_spread: float = app_settings.DRAIN_CLOSE_SPREAD_SECONDS,
+        flush_timeout: float = app_settings.DRAIN_FLUSH_TIMEOUT_SECONDS,
+    ) -> DrainResponse:
+        """
+        Prepares the shard for a restart without failing the work in progress. New
+        connections and invocations are rejected and the other shards stop routing to the
+        clients of this one, while invocations already in flight get until the timeout to
+        complete. The sockets are then closed with code 1012 (service restart), spread
+        over `close_spread` seconds and each with a random reconnect delay in the reason,
+        so the clients don't all reconnect and register again at the same moment.
+        Before a socket is closed, the frames in its send queue get `flush_timeout`
+        seconds to go out.
+
+        Args:
+            timeout (float): Seconds to wait for the pending invocations.
+            close_spread (float): Seconds over which the sockets are closed.
+            flush_timeout (float): Seconds to wait for the send queue of each socket.
+
+        Returns:
+            DrainResponse: Invocations left unfinished and sockets closed.
         """
-        message = json.dumps(message) if isinstance(message, dict) else message
-        logging.info(f"Sending message: {message}, to: {client_id}")
-        if websocket := self.active_connections.get(client_id):
-            await websocket.send_text(message)
+        if not self.draining:
+            self.draining = True
+            logging.info(
+                f"Draining router, {len(self.pending_invocations)} invocations pending"
+            )
+            if self.bus is not None:
+                for client_id in list(self.active_connections):
+                    await self.bus.leave(client_id)
+
+        deadline = time.monotonic() + timeout
+        while self.pending_invocations and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        unfinished = len(self.pending_invocations)
+        if unfinished:
+            logging.warning(f"Drain timed out with {unfinished} invocations pending")
+
+        connections = list(self.connections.values())
+        random.shuffle(connections)
+        connections.sort(key=lambda c: DRAIN_CLOSE_ORDER.index(c.role))
+        interval = close_spread / len(connections) if connections else 0
+        unflushed = 0
+        for connection in connections:
+            reason = f"Router restarting, reconnect in {self._reconnect_delay():.1f}s"
+            # disconnect() discards whatever is still queued for the socket
+            if not await connection.flush(flush_timeout):
+                unflushed += 1
+                logging.warning(
+                    f"Closing {connection.connection_id} with "
+                    f"{connection.queue_depth} frames unsent"
+                )
+            await self.disconnect(connection)
+            # unblocks the receive loop of the socket, its own disconnect() is then a no-op
+            await connection.close_websocket(
+                code=SERVICE_RESTART_CLOSE_CODE, reason=reason
+            )
+            await asyncio.sleep(interval)
+
+        return DrainResponse(
+            unfinished_invocations=unfinished,
+            closed_connections=len(connections),
+            unflushed_connections=unflushed,
+        )
+
+    async def close(self) -> None:
+        """
+        Stops the background tasks of the manager.
+        """
+        await self.pending_invocations.close()
+        await self.log_batcher.close()
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+        if self.bus is not None:
+            await self.bus.close()
 
-    async def connect(self, websocket: WebSocket) -> str:
+    async def connect(
+        self, websocket: WebSocket
+    ) -> tuple[Optional[ClientConnection], Optional[str]]:
         """
         Accepts a new WebSocket connection and assigns a client ID based on headers.
+        Connections sharing a client ID are pooled as replicas of the same client.
 
         Args:
             websocket (WebSocket): The WebSocket connection instance.
 
         Returns:
-            str: The resolved client ID.
+            tuple[Optional[ClientConnection], Optional[str]]: The registered connection
+                (None if no client ID could be resolved) and the agent JWT, if any.
         """
         client_id = None
         agent_jwt = None
+        user_id = None
+        role = ConnectionRole.AGENT
 
         if api_key := websocket.headers.get("api-key"):
             client_id = self.MASTER_SERVERS_API_KEY_MAPPING.get(api_key)
+            if client_id:
+                role = ConnectionRole(client_id)
 
         elif agent_jwt := websocket.headers.get("x-custom-authorization"):
             try:
@@ -192,26 +1303,101 @@ class WSConnectionManager:
                     agent_jwt, options={"verify_signature": False}, algorithms=["HS256"]
                 )
                 client_id = decoded.get("sub")
+                user_id = decoded.get("user_id")
             except jwt.DecodeError:
                 client_id = agent_jwt
         elif invoke_key := websocket.headers.get("x-custom-invoke-key"):
             client_id = invoke_key
+            role = ConnectionRole.INVOKER
+            # invocations count against the user owning the invoking agent
+            if invoking_pool := self.active_connections.get(
+                invoke_key.rsplit(":", 1)[0]
+            ):
+                user_id = next(
+                    (c.user_id for c in invoking_pool.connections if c.user_id), None
+                )
+
+        encoding, subprotocol = negotiate_frame_encoding(websocket)
+        await websocket.accept(subprotocol=subprotocol)
+        if not client_id:
+            return None, agent_jwt
+
+        connection = ClientConnection(
+            client_id=client_id,
+            websocket=websocket,
+            max_queue_size=app_settings.SEND_QUEUE_MAX_SIZE,
+            overflow_policy=app_settings.SEND_QUEUE_OVERFLOW_POLICY,
+            role=role,
+            shard_id=self.bus.shard_id if self.bus is not None else None,
+            encoding=encoding,
+            user_id=user_id,
+            heartbeat=wants_heartbeat(websocket),
+        )
+        connection.start()
 
-        await websocket.accept()
-        self.active_connections[client_id] = websocket
-        return client_id, agent_jwt
+        pool = self.active_connections.get(client_id)
+        if pool is None:
+            pool = self.active_connections[client_id] = ConnectionPool(
+                client_id=client_id, strategy=app_settings.AGENT_LOAD_BALANCING
+            )
+        pool.add(connection)
+        self.connections[connection.connection_id] = connection
+        self._publish_presence(PresenceEventType.CONNECTED, connection, len(pool))
+        if self.bus is not None and len(pool) == 1:
+            await self.bus.join(client_id)
+        return connection, agent_jwt
 
-    async def disconnect(self, client_id: str):
+    async def disconnect(self, connection: ClientConnection):
         """
-        Disconnects a client and notifies relevant parties about the unregistration.
+        Disconnects a socket and fails the invocations it was handling. Once the last
+        replica of a client is gone, notifies the backend about the unregistration.
 
         Args:
-            client_id (str): The ID of the client to disconnect.
+            connection (ClientConnection): The connection to disconnect.
         """
-        if client_id not in self.active_connections:
+        if self.connections.pop(connection.connection_id, None) is None:
             return
+        await connection.close()
+        self.metrics.bytes_out_total += connection.bytes_sent
+        self.metrics.send_queue_dropped_total += connection.dropped_messages
+        self.metrics.transcoded_frames_total += connection.transcoded_frames
 
-        del self.active_connections[client_id]
+        for invocation in self.pending_invocations.pop_for_connection(
+            connection.connection_id
+        ):
+            if invocation.connection_id != connection.connection_id:
+                # The invoker went away, the replica is no longer working for anyone
+                if target := self.connections.get(invocation.connection_id):
+                    target.complete_invocation()
+                continue
+
+            await self.send_message(
+                client_id=invocation.invoker,
+                message={
+                    "message_type": WSMessageType.AGENT_ERROR.value,
+                    "error": {
+                        "error_message": "Agent has been unregistered",
+                        "agent_uuid": invocation.agent_uuid,
+                    },
+                },
+            )
+
+        client_id = connection.client_id
+        pool = self.active_connections.get(client_id)
+        if pool is not None:
+            pool.remove(connection)
+            self._publish_presence(
+                PresenceEventType.DISCONNECTED, connection, len(pool)
+            )
+            if pool:
+                return  # other replicas of the client are still connected
+            del self.active_connections[client_id]
+            self.metrics.forget_client(client_id)
+
+        if self.bus is not None:
+            await self.bus.leave(client_id)
+            if self.bus.shards_of(client_id):
+                return  # the client is still connected to another router shard
 
         if not client_id.startswith(
             app_settings.MASTER_BE_API_KEY
@@ -225,18 +1411,3 @@ class WSConnectionManager:
                     }
                 },
             )
-
-        for connection_id in (
-            self.active_connections
-        ):  # Clean up all connections created via session.send
-            if client_id in connection_id:
-                await self.send_message(
-                    client_id=connection_id,
-                    message={
-                        "message_type": WSMessageType.AGENT_ERROR.value,
-                        "error": {
-                            "error_message": "Agent has been unregistered",
-                            "agent_uuid": client_id,
-                        },
-                    },
-                )
@@ -1,8 +1,111 @@
+import asyncio
+import logging
+import secrets
+import signal
+import threading
+from contextlib import asynccontextmanager
+from typing import Optional
+
 import uvicorn
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import (
+    Depends,
+    FastAPI,
+    Header,
+    HTTPException,
+    WebSocket,
+    WebSocketDisconnect,
+)
+from fastapi.responses import PlainTextResponse, StreamingResponse
+
+from connectors.admission_control import RateLimit
+from connectors.presence import format_sse
+from connectors.routing_bus import create_routing_bus
+from connectors.ws_connector_manager import (
+    SERVICE_RESTART_CLOSE_CODE,
+    WSConnectionManager,
+)
+from settings import get_settings
+from utils.enums import RateLimitScope
+from utils.pydantic_models import (
+    DrainResponse,
+    Message,
+    MessageResponse,
+    PresenceResponse,
+    RateLimitConfig,
+    RateLimitsResponse,
+    RateLimitUpdate,
+    SendQueuesResponse,
+)
+
+# Manages WebSocket connections and routes messages
+ws_connection_manager = WSConnectionManager(bus=create_routing_bus(get_settings()))
+
+# keeps the drain started by SIGTERM alive until it is done
+_signal_drain_tasks: set[asyncio.Task] = set()
+
+
+def _drain_before_shutdown() -> None:
+    """
+    Wraps the SIGTERM handler of uvicorn so the router drains before shutting down.
+    Uvicorn closes every socket as soon as it handles the signal, which would fail
+    the invocations in flight and make all clients reconnect at once. A second
+    SIGTERM shuts down right away.
+    """
+    # signal handlers can only be set from the main thread, e.g. not in the load tests
+    if threading.current_thread() is not threading.main_thread():
+        return
+    uvicorn_handler = signal.getsignal(signal.SIGTERM)
+    if not callable(uvicorn_handler):
+        return
+    loop = asyncio.get_running_loop()
+
+    def start_drain(sig, frame) -> None:
+        logging.info("Received SIGTERM, draining before shutdown")
+        task = loop.create_task(ws_connection_manager.drain())
+        _signal_drain_tasks.add(task)
+        task.add_done_callback(_signal_drain_tasks.discard)
+        task.add_done_callback(lambda _: uvicorn_handler(sig, frame))
+
+    def handle_sigterm(sig, frame) -> None:
+        if _signal_drain_tasks:
+            uvicorn_handler(sig, frame)
+        else:
+            loop.call_soon_threadsafe(start_drain, sig, frame)
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Connects the connection manager to the other router shards on startup and stops
+    its background tasks on shutdown.
+
+    Args:
+        app (FastAPI): The FastAPI application instance.
+    """
+    await ws_connection_manager.start()
+    if get_settings().DRAIN_ON_SIGTERM:
+        _drain_before_shutdown()
+    yield
+    await ws_connection_manager.close()
+
+
+def require_master_api_key(
+    api_key: Optional[str] = Header(default=None, alias="api-key"),
+) -> None:
+    """
+    Guards the endpoints that change how the router behaves with the API key of the
+    master backend, the same key it connects its socket with.
+
+    Args:
+        api_key (Optional[str]): Value of the `api-key` header.
+    """
+    if api_key is None or not secrets.compare_digest(
+        api_key.encode(), get_settings().MASTER_BE_API_KEY.encode()
+    ):
+        raise HTTPException(status_code=401, detail="Invalid API key")
 
-from connectors.ws_connector_manager import WSConnectionManager
-from utils.pydantic_models import Message, MessageResponse
 
 app = FastAPI(
     title="Agent WebSocket API",
@@ -10,11 +113,9 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
-# Manages WebSocket connections and routes messages
-ws_connection_manager = WSConnectionManager()
-
 
 @app.websocket(path="/ws")
 async def websocket_endpoint(websocket: WebSocket):
@@ -27,22 +128,32 @@ async def websocket_endpoint(websocket: WebSocket):
     Args:
         websocket (WebSocket): The incoming WebSocket connection.
     """
-    client_id, agent_jwt = await ws_connection_manager.connect(websocket)
+    if ws_connection_manager.draining:
+        # the client is expected to reconnect once the router is back
+        await websocket.accept()
+        await websocket.close(
+            code=SERVICE_RESTART_CLOSE_CODE, reason="Router restarting"
+        )
+        return
+
+    connection, agent_jwt = await ws_connection_manager.connect(websocket)
 
-    if not client_id:
+    if not connection:
         # Reject connection if no valid authorization header
         await websocket.close(code=4000, reason="Missing Authorization header")
     else:
         try:
             # Continuously listen for messages
             while True:
-                data = await websocket.receive_text()
+                data = await connection.receive()
                 await ws_connection_manager.process_message(
-                    client_id, data, agent_jwt=agent_jwt
+                    connection, data, agent_jwt=agent_jwt
                 )
         except WebSocketDisconnect:
-            # Handle client disconnection
-            await ws_connection_manager.disconnect(client_id)
+            # The client disconnected, or a socket that left its pings unanswered was closed
+            pass
+        finally:
+            await ws_connection_manager.disconnect(connection)
 
 
 @app.post(
@@ -55,6 +166,142 @@ async def invoke_agent(message: Message) -> MessageResponse:
     return MessageResponse(detail=f"Message sent to client {message.client_id}")
 
 
+@app.get(
+    path="/send-queues",
+    response_model=SendQueuesResponse,
+    summary="Outbound send queue depth per connected client",
+)
+async def get_send_queues() -> SendQueuesResponse:
+    return SendQueuesResponse(send_queues=ws_connection_manager.get_send_queue_depths())
+
+
+def _presence() -> PresenceResponse:
+    bus = ws_connection_manager.bus
+    return PresenceResponse(
+        shard_id=bus.shard_id if bus is not None else None,
+        clients=ws_connection_manager.get_presence(),
+    )
+
+
+@app.get(
+    path="/presence",
+    response_model=PresenceResponse,
+    summary="Connected clients with replica count, connect time and last activity",
+)
+async def get_presence() -> PresenceResponse:
+    return _presence()
+
+
+@app.get(
+    path="/presence/stream",
+    summary="Server-sent events: a snapshot, then every connect and disconnect",
+)
+async def stream_presence() -> StreamingResponse:
+    async def events():
+        # subscribing before taking the snapshot leaves no gap between the two
+        queue = ws_connection_manager.presence.subscribe()
+        try:
+            yield format_sse("snapshot", _presence().model_dump_json())
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    return
+                yield format_sse(event.event.value, event.model_dump_json())
+        finally:
+            ws_connection_manager.presence.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def _rate_limits() -> RateLimitsResponse:
+    admission = ws_connection_manager.admission
+    return RateLimitsResponse(
+        limits={
+            scope: RateLimitConfig(**limit._asdict()) if limit else None
+            for scope, limit in admission.limits.items()
+        },
+        overrides={
+            scope: {
+                key: RateLimitConfig(**limit._asdict()) for key, limit in keys.items()
+            }
+            for scope, keys in admission.overrides.items()
+        },
+    )
+
+
+@app.get(
+    path="/rate-limits",
+    response_model=RateLimitsResponse,
+    summary="Invocation rate limits of this router shard",
+)
+async def get_rate_limits() -> RateLimitsResponse:
+    return _rate_limits()
+
+
+@app.put(
+    path="/rate-limits/{scope}",
+    response_model=RateLimitsResponse,
+    summary="Change the default rate limit of a scope, or the limit of a single key",
+    dependencies=[Depends(require_master_api_key)],
+)
+async def set_rate_limit(
+    scope: RateLimitScope, update: RateLimitUpdate
+) -> RateLimitsResponse:
+    ws_connection_manager.admission.set_limit(
+        scope, RateLimit(update.rate, update.burst), key=update.key
+    )
+    return _rate_limits()
+
+
+@app.delete(
+    path="/rate-limits/{scope}/{key}",
+    response_model=RateLimitsResponse,
+    summary="Remove the rate limit override of a key",
+    dependencies=[Depends(require_master_api_key)],
+)
+async def delete_rate_limit(scope: RateLimitScope, key: str) -> RateLimitsResponse:
+    if key not in ws_connection_manager.admission.overrides[scope]:
+        raise HTTPException(
+            status_code=404, detail=f"No {scope.value} override for {key}"
+        )
+    ws_connection_manager.admission.set_limit(scope, None, key=key)
+    return _rate_limits()
+
+
+@app.post(
+    path="/drain",
+    response_model=DrainResponse,
+    summary="Stop accepting work, wait for pending invocations and close all sockets",
+    dependencies=[Depends(require_master_api_key)],
+)
+async def drain() -> DrainResponse:
+    return await ws_connection_manager.drain()
+
+
+@app.get(
+    path="/metrics",
+    response_class=PlainTextResponse,
+    summary="Router metrics in Prometheus text format",
+)
+async def get_metrics() -> PlainTextResponse:
+    return PlainTextResponse(
+        ws_connection_manager.get_metrics(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
 if __name__ == "__main__":
-    # Run the FastAPI app using Uvicorn on port 8080 with auto-reload
-    uvicorn.run("main:app", port=8080, reload=True)
+    settings = get_settings()
+    # Run the FastAPI app using Uvicorn, on port 8080 with auto-reload by default
+    uvicorn.run(
+        "main:app",
+        host=settings.ROUTER_HOST,
+        port=settings.ROUTER_PORT,
+        reload=settings.ROUTER_RELOAD,
+        ws_ping_interval=settings.WS_PING_INTERVAL_SECONDS,
+        ws_ping_timeout=settings.WS_PING_TIMEOUT_SECONDS,
+    )
@@ -1,8 +1,17 @@
 from functools import lru_cache
+from typing import Dict, List, Optional
 
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+from utils.enums import (
+    LoadBalancingStrategy,
+    RateLimitScope,
+    RoutingBusType,
+    SendQueueOverflowPolicy,
+)
+from utils.pydantic_models import RateLimitConfig
+
 
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(
@@ -20,6 +29,115 @@ class Settings(BaseSettings):
         alias="MASTER_BE_API_KEY",
     )
 
+    # Forward invoke/response frames after decoding only the routing envelope
+    RAW_FRAME_FORWARDING: bool = Field(default=True, alias="RAW_FRAME_FORWARDING")
+
+    # Per-connection outbound queues
+    SEND_QUEUE_MAX_SIZE: int = Field(default=1000, alias="SEND_QUEUE_MAX_SIZE")
+    SEND_QUEUE_OVERFLOW_POLICY: SendQueueOverflowPolicy = Field(
+        default=SendQueueOverflowPolicy.BLOCK,
+        alias="SEND_QUEUE_OVERFLOW_POLICY",
+    )
+
+    # How invocations are spread across replicas of the same agent
+    AGENT_LOAD_BALANCING: LoadBalancingStrategy = Field(
+        default=LoadBalancingStrategy.LEAST_IN_FLIGHT,
+        alias="AGENT_LOAD_BALANCING",
+    )
+
+    # Pending invocations fail with an AGENT_ERROR once they pass the deadline, 0 disables it
+    INVOCATION_TIMEOUT_SECONDS: float = Field(
+        default=600, alias="INVOCATION_TIMEOUT_SECONDS"
+    )
+    INVOCATION_TIMER_TICK_SECONDS: float = Field(
+        default=1, alias="INVOCATION_TIMER_TICK_SECONDS"
+    )
+
+    # Admission control: agent_invoke token buckets per invoker, target agent and user, a rate of 0 disables the limit
+    INVOKE_RATE_LIMIT_PER_INVOKER: float = Field(
+        default=0, alias="INVOKE_RATE_LIMIT_PER_INVOKER"
+    )
+    INVOKE_BURST_PER_INVOKER: int = Field(default=20, alias="INVOKE_BURST_PER_INVOKER")
+    INVOKE_RATE_LIMIT_PER_AGENT: float = Field(
+        default=0, alias="INVOKE_RATE_LIMIT_PER_AGENT"
+    )
+    INVOKE_BURST_PER_AGENT: int = Field(default=50, alias="INVOKE_BURST_PER_AGENT")
+    INVOKE_RATE_LIMIT_PER_USER: float = Field(
+        default=0, alias="INVOKE_RATE_LIMIT_PER_USER"
+    )
+    INVOKE_BURST_PER_USER: int = Field(default=20, alias="INVOKE_BURST_PER_USER")
+    INVOKE_RATE_LIMIT_OVERRIDES: Dict[RateLimitScope, Dict[str, RateLimitConfig]] = (
+        Field(default_factory=dict, alias="INVOKE_RATE_LIMIT_OVERRIDES")
+    )
+
+    # Agent logs are sent to the backend in batches on a low-priority lane
+    LOG_BATCHING_ENABLED: bool = Field(default=True, alias="LOG_BATCHING_ENABLED")
+    LOG_BATCH_INTERVAL_MS: int = Field(default=50, alias="LOG_BATCH_INTERVAL_MS")
+    LOG_BATCH_MAX_SIZE: int = Field(default=500, alias="LOG_BATCH_MAX_SIZE")
+    LOG_BUFFER_MAX_SIZE: int = Field(default=10000, alias="LOG_BUFFER_MAX_SIZE")
+    LOG_BACKEND_MAX_QUEUE_DEPTH: int = Field(
+        default=100, alias="LOG_BACKEND_MAX_QUEUE_DEPTH"
+    )
+
+    # Frame logging: payloads are truncated and sampled per message type, see utils/frame_logger.py
+    LOG_PAYLOAD_MAX_BYTES: int = Field(default=512, alias="LOG_PAYLOAD_MAX_BYTES")
+    LOG_SAMPLE_RATE: float = Field(default=1.0, alias="LOG_SAMPLE_RATE")
+    LOG_SAMPLE_RATES: Dict[str, float] = Field(
+        default_factory=dict, alias="LOG_SAMPLE_RATES"
+    )
+    LOG_FULL_PAYLOAD_AGENT_IDS: List[str] = Field(
+        default_factory=list, alias="LOG_FULL_PAYLOAD_AGENT_IDS"
+    )
+
+    # WebSocket keepalive pings of uvicorn, sent to every socket: a socket that leaves a ping unanswered for
+    # WS_PING_TIMEOUT_SECONDS is closed and goes through the regular disconnect
+    WS_PING_INTERVAL_SECONDS: float = Field(
+        default=15, alias="WS_PING_INTERVAL_SECONDS"
+    )
+    WS_PING_TIMEOUT_SECONDS: float = Field(default=45, alias="WS_PING_TIMEOUT_SECONDS")
+
+    # router_ping frames to the clients that opted in with the x-router-heartbeat header, their round-trip time
+    # is measured; those leaving HEARTBEAT_MAX_MISSED pings in a row unanswered are disconnected, 0 disables pings
+    HEARTBEAT_INTERVAL_SECONDS: float = Field(
+        default=15, alias="HEARTBEAT_INTERVAL_SECONDS"
+    )
+    HEARTBEAT_MAX_MISSED: int = Field(default=3, alias="HEARTBEAT_MAX_MISSED")
+
+    # Address `python main.py` serves on
+    ROUTER_HOST: str = Field(default="127.0.0.1", alias="ROUTER_HOST")
+    ROUTER_PORT: int = Field(default=8080, alias="ROUTER_PORT")
+    ROUTER_RELOAD: bool = Field(default=True, alias="ROUTER_RELOAD")
+
+    # Drain on SIGTERM or POST /drain: in-flight invocations get DRAIN_TIMEOUT_SECONDS to finish, then sockets
+    # are closed one by one over DRAIN_CLOSE_SPREAD_SECONDS so clients don't all reconnect at the same moment
+    DRAIN_ON_SIGTERM: bool = Field(default=True, alias="DRAIN_ON_SIGTERM")
+    DRAIN_TIMEOUT_SECONDS: float = Field(default=30, alias="DRAIN_TIMEOUT_SECONDS")
+    DRAIN_CLOSE_SPREAD_SECONDS: float = Field(
+        default=10, alias="DRAIN_CLOSE_SPREAD_SECONDS"
+    )
+    DRAIN_RECONNECT_JITTER_SECONDS: float = Field(
+        default=10, alias="DRAIN_RECONNECT_JITTER_SECONDS"
+    )
+    # Seconds the frames queued for a socket get to go out before it is closed
+    DRAIN_FLUSH_TIMEOUT_SECONDS: float = Field(
+        default=2, alias="DRAIN_FLUSH_TIMEOUT_SECONDS"
+    )
+
+    # Sharding: router workers reach sockets owned by other workers through this bus
+    ROUTING_BUS: RoutingBusType = Field(
+        default=RoutingBusType.NONE, alias="ROUTING_BUS"
+    )
+    ROUTER_SHARD_ID: Optional[str] = Field(default=None, alias="ROUTER_SHARD_ID")
+    ROUTING_BUS_SOCKET_DIR: str = Field(
+        default="/tmp/genai-router", alias="ROUTING_BUS_SOCKET_DIR"
+    )
+    ROUTING_BUS_REDIS_URL: str = Field(
+        default="redis://redis:6379/0", alias="ROUTING_BUS_REDIS_URL"
+    )
+    ROUTING_BUS_CHANNEL_PREFIX: str = Field(
+        default="genai-router", alias="ROUTING_BUS_CHANNEL_PREFIX"
+    )
+
 
 @lru_cache
 def get_settings() -> Settings:
@@ -0,0 +1,15 @@
+import pytest_asyncio
+
+from connectors.ws_connector_manager import WSConnectionManager
+from helpers import close_manager
+
+
+@pytest_asyncio.fixture
+async def manager():
+    """
+    A single router shard without a routing bus.
+    """
+    manager = WSConnectionManager()
+    await manager.start()
+    yield manager
+    await close_manager(manager)
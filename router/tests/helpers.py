@@ -0,0 +1,140 @@
+import asyncio
+import json
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import jwt
+
+from connectors.ws_client_connection import ClientConnection
+from connectors.ws_connector_manager import WSConnectionManager
+from settings import get_settings
+from utils.codec import decode_message
+from utils.enums import WSMessageType
+
+# the router reads agent JWTs without verifying them
+JWT_SECRET = "router-tests-secret-never-verified"
+
+
+class FakeWebSocket:
+    """
+    Stands in for an accepted Starlette WebSocket. Frames written by the router are
+    recorded, and clearing `writable` holds writes back like a slow consumer would.
+    """
+
+    def __init__(
+        self, headers: Optional[Dict[str, str]] = None, subprotocols: Iterable[str] = ()
+    ):
+        self.headers = headers or {}
+        self.scope = {"subprotocols": list(subprotocols)}
+        self.sent: List[str | bytes] = []
+        self.close_code: Optional[int] = None
+        self.writable = asyncio.Event()
+        self.writable.set()
+
+    async def accept(self, subprotocol: Optional[str] = None) -> None:
+        pass
+
+    async def send_text(self, message: str) -> None:
+        await self.writable.wait()
+        self.sent.append(message)
+
+    async def send_bytes(self, message: bytes) -> None:
+        await self.writable.wait()
+        self.sent.append(message)
+
+    async def close(self, code: int = 1000, reason: Optional[str] = None) -> None:
+        self.close_code = code
+
+    @property
+    def frames(self) -> List[Any]:
+        """
+        Returns:
+            List[Any]: The frames sent to the client, decoded.
+        """
+        return [decode_message(message) for message in self.sent]
+
+
+async def wait_until(predicate: Callable[[], bool], timeout: float = 1) -> None:
+    """
+    Lets the writer tasks run until the predicate holds.
+
+    Raises:
+        AssertionError: If the predicate still fails after the timeout.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not predicate():
+        if loop.time() > deadline:
+            raise AssertionError("Condition not met in time")
+        await asyncio.sleep(0.001)
+
+
+def agent_headers(agent_id: str, user_id: Optional[str] = None) -> Dict[str, str]:
+    """
+    Headers of an agent connecting with its JWT, the router does not verify the signature.
+    """
+    token = jwt.encode({"sub": agent_id, "user_id": user_id}, JWT_SECRET, "HS256")
+    return {"x-custom-authorization": token}
+
+
+def invoker_headers(invoking_agent_id: str, agent_id: str) -> Dict[str, str]:
+    """
+    Headers of the socket genai_session opens for every `send` to another agent.
+    """
+    return {"x-custom-invoke-key": f"{invoking_agent_id}:{agent_id}"}
+
+
+def backend_headers() -> Dict[str, str]:
+    return {"api-key": get_settings().MASTER_BE_API_KEY}
+
+
+async def connect(
+    manager: WSConnectionManager, headers: Dict[str, str]
+) -> ClientConnection:
+    """
+    Connects a fake socket to the manager.
+    """
+    connection, _ = await manager.connect(FakeWebSocket(headers))
+    assert connection is not None
+    return connection
+
+
+async def close_manager(manager: WSConnectionManager) -> None:
+    """
+    Stops the writer tasks of the connections and the background tasks of the manager.
+    """
+    for connection in list(manager.connections.values()):
+        await connection.close()
+    await manager.close()
+
+
+def invoke_frame(
+    agent_id: str, request_id: Optional[str] = None, **payload: Any
+) -> str:
+    """
+    An agent_invoke frame as genai_session sends it.
+    """
+    return json.dumps(
+        {
+            "message_type": WSMessageType.AGENT_INVOKE.value,
+            "agent_uuid": agent_id,
+            "request_payload": payload,
+            "request_metadata": {"request_id": request_id, "session_id": None},
+        }
+    )
+
+
+def response_frame(
+    invoked_by: str, request_id: Optional[str] = None, response: Any = "ok"
+) -> str:
+    """
+    An agent_response frame answering an invocation.
+    """
+    frame = {
+        "message_type": WSMessageType.AGENT_RESPONSE.value,
+        "invoked_by": invoked_by,
+        "execution_time": 0.1,
+        "response": response,
+    }
+    if request_id is not None:
+        frame["request_metadata"] = {"request_id": request_id}
+    return json.dumps(frame)
@@ -0,0 +1,137 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from connectors.admission_control import AdmissionController, RateLimit, Rejection
+from helpers import (
+    agent_headers,
+    backend_headers,
+    connect,
+    invoke_frame,
+    invoker_headers,
+    wait_until,
+)
+from main import app, ws_connection_manager
+from utils.enums import ErrorType, RateLimitScope
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_controller(**limits: RateLimit) -> tuple[AdmissionController, Clock]:
+    clock = Clock()
+    controller = AdmissionController(
+        {RateLimitScope(scope): limit for scope, limit in limits.items()}, clock=clock
+    )
+    return controller, clock
+
+
+def admit_agent(controller: AdmissionController, agent: str = "agent"):
+    return controller.admit([(RateLimitScope.AGENT, agent)])
+
+
+def test_burst_then_rate():
+    controller, clock = make_controller(agent=RateLimit(rate=2, burst=3))
+
+    assert [admit_agent(controller) for _ in range(3)] == [None] * 3
+    assert admit_agent(controller) == Rejection(RateLimitScope.AGENT, "agent", 0.5)
+
+    clock.now = 0.5
+    assert admit_agent(controller) is None
+    assert admit_agent(controller) is not None
+
+    clock.now = 10  # refills up to the burst only
+    assert [admit_agent(controller) for _ in range(3)] == [None] * 3
+    assert admit_agent(controller) is not None
+
+
+def test_every_bucket_needs_a_token():
+    controller, _ = make_controller(
+        invoker=RateLimit(rate=1, burst=1), agent=RateLimit(rate=1, burst=5)
+    )
+    keys = [(RateLimitScope.INVOKER, "caller"), (RateLimitScope.AGENT, "agent")]
+
+    assert controller.admit(keys) is None
+    assert controller.admit(keys).scope == RateLimitScope.INVOKER
+    # the rejected invocation took no token from the agent bucket
+    assert [admit_agent(controller) for _ in range(4)] == [None] * 4
+
+
+def test_unlimited_scopes_and_missing_keys_are_skipped():
+    controller, _ = make_controller(agent=RateLimit(rate=1, burst=1))
+
+    for _ in range(3):
+        assert controller.admit([(RateLimitScope.USER, "user")]) is None
+        assert controller.admit([(RateLimitScope.AGENT, None)]) is None
+    assert len(controller) == 0
+
+
+def test_overrides_and_exemptions():
+    controller, _ = make_controller(agent=RateLimit(rate=1, burst=1))
+    controller.set_limit(RateLimitScope.AGENT, RateLimit(rate=1, burst=3), key="busy")
+    controller.set_limit(RateLimitScope.AGENT, RateLimit(rate=0, burst=0), key="free")
+
+    assert [admit_agent(controller, "busy") for _ in range(3)] == [None] * 3
+    assert admit_agent(controller, "busy") is not None
+    assert [admit_agent(controller, "free") for _ in range(10)] == [None] * 10
+
+    controller.set_limit(RateLimitScope.AGENT, None, key="free")
+    assert admit_agent(controller, "free") is None
+    assert admit_agent(controller, "free") is not None
+
+
+def test_rate_of_zero_disables_a_scope():
+    controller, _ = make_controller(agent=RateLimit(rate=0, burst=1))
+    assert not controller.enabled
+    assert controller.limit_for(RateLimitScope.AGENT, "agent") is None
+
+
+def test_lowering_a_limit_applies_to_existing_buckets():
+    controller, _ = make_controller(agent=RateLimit(rate=1, burst=10))
+    assert admit_agent(controller) is None
+
+    controller.set_limit(RateLimitScope.AGENT, RateLimit(rate=1, burst=2))
+    assert [admit_agent(controller) for _ in range(2)] == [None] * 2
+    assert admit_agent(controller) is not None
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_invocation_is_answered_with_retry_after(manager):
+    manager.admission.set_limit(RateLimitScope.INVOKER, RateLimit(rate=1, burst=1))
+    agent = await connect(manager, agent_headers("agent"))
+    invoker = await connect(manager, invoker_headers("caller", "agent"))
+
+    for _ in range(2):
+        await manager.process_message(invoker, invoke_frame("agent"), agent_jwt=None)
+
+    await wait_until(lambda: invoker.websocket.sent and agent.websocket.sent)
+    error = invoker.websocket.frames[0]["error"]
+    assert error["error_type"] == ErrorType.RATE_LIMITED.value
+    assert error["limit_scope"] == RateLimitScope.INVOKER.value
+    assert 0 < error["retry_after"] <= 1
+    assert len(agent.websocket.sent) == 1
+    assert manager.metrics.rate_limited_total[RateLimitScope.INVOKER.value] == 1
+
+
+def test_changing_rate_limits_requires_the_api_key():
+    client = TestClient(app)
+    limit = {"rate": 5, "burst": 10, "key": "agent"}
+
+    assert client.put("/rate-limits/agent", json=limit).status_code == 401
+    response = client.put(
+        "/rate-limits/agent", json=limit, headers={"api-key": "wrong"}
+    )
+    assert response.status_code == 401
+    assert client.delete("/rate-limits/agent/agent").status_code == 401
+    assert ws_connection_manager.admission.overrides[RateLimitScope.AGENT] == {}
+
+    response = client.put("/rate-limits/agent", json=limit, headers=backend_headers())
+    assert response.status_code == 200
+    assert response.json()["overrides"]["agent"] == {"agent": {"rate": 5, "burst": 10}}
+    response = client.delete("/rate-limits/agent/agent", headers=backend_headers())
+    assert response.status_code == 200
+    assert ws_connection_manager.admission.overrides[RateLimitScope.AGENT] == {}
@@ -0,0 +1,96 @@
+import pytest
+
+from connectors.connection_pool import ConnectionPool
+from connectors.ws_client_connection import ClientConnection
+from helpers import (
+    FakeWebSocket,
+    agent_headers,
+    backend_headers,
+    connect,
+    invoke_frame,
+    wait_until,
+)
+from utils.enums import LoadBalancingStrategy, SendQueueOverflowPolicy, WSMessageType
+
+
+def make_pool(strategy: LoadBalancingStrategy, replicas: int) -> ConnectionPool:
+    pool = ConnectionPool("agent", strategy)
+    for _ in range(replicas):
+        pool.add(
+            ClientConnection(
+                client_id="agent",
+                websocket=FakeWebSocket(),
+                max_queue_size=1,
+                overflow_policy=SendQueueOverflowPolicy.BLOCK,
+            )
+        )
+    return pool
+
+
+def test_empty_pool_picks_nothing():
+    assert make_pool(LoadBalancingStrategy.LEAST_IN_FLIGHT, 0).pick() is None
+
+
+def test_least_in_flight_picks_the_idlest_replica():
+    pool = make_pool(LoadBalancingStrategy.LEAST_IN_FLIGHT, 3)
+    busy, idle, busier = pool.connections
+    busy.in_flight, idle.in_flight, busier.in_flight = 1, 0, 2
+
+    assert pool.pick() is idle
+    assert pool.pick(session_id="session") is idle
+
+
+@pytest.mark.asyncio
+async def test_closed_replicas_are_skipped():
+    pool = make_pool(LoadBalancingStrategy.LEAST_IN_FLIGHT, 2)
+    closed, open_ = pool.connections
+    closed.in_flight, open_.in_flight = 0, 5
+    await closed.close()
+
+    assert pool.pick() is open_
+
+
+def test_session_affinity_keeps_a_session_on_its_replica():
+    pool = make_pool(LoadBalancingStrategy.SESSION_AFFINITY, 3)
+    sessions = [f"session-{index}" for index in range(20)]
+    picked = {session: pool.pick(session_id=session) for session in sessions}
+
+    assert len(set(picked.values())) > 1  # sessions are spread across replicas
+    for session in sessions:
+        assert pool.pick(session_id=session) is picked[session]
+
+    gone = pool.connections[0]
+    pool.remove(gone)
+    for session in sessions:
+        if picked[session] is not gone:
+            assert pool.pick(session_id=session) is picked[session]
+
+
+@pytest.mark.asyncio
+async def test_invocations_are_spread_across_replicas(manager):
+    backend = await connect(manager, backend_headers())
+    replicas = [await connect(manager, agent_headers("agent")) for _ in range(2)]
+
+    for _ in range(4):
+        await manager.process_message(backend, invoke_frame("agent"), agent_jwt=None)
+
+    await wait_until(lambda: all(len(r.websocket.sent) == 2 for r in replicas))
+    assert [replica.in_flight for replica in replicas] == [2, 2]
+
+
+@pytest.mark.asyncio
+async def test_agent_is_unregistered_once_its_last_replica_is_gone(manager):
+    backend = await connect(manager, backend_headers())
+    first, second = [await connect(manager, agent_headers("agent")) for _ in range(2)]
+
+    await manager.disconnect(first)
+    assert manager.is_active("agent")
+    assert len(manager.active_connections["agent"]) == 1
+
+    await manager.disconnect(second)
+    assert not manager.is_active("agent")
+    await wait_until(lambda: len(backend.websocket.sent) == 1)
+    assert backend.websocket.frames[0]["request_payload"] == {
+        "agent_uuid": "agent",
+        "message_type": WSMessageType.AGENT_UNREGISTER.value,
+    }
@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from connectors.ws_connector_manager import SERVICE_RESTART_CLOSE_CODE
+from helpers import (
+    agent_headers,
+    backend_headers,
+    connect,
+    invoke_frame,
+    invoker_headers,
+    response_frame,
+    wait_until,
+)
+from main import app, ws_connection_manager
+from utils.enums import ErrorType, WSMessageType
+
+
+@pytest.mark.asyncio
+async def test_drain_waits_for_pending_invocations(manager):
+    backend = await connect(manager, backend_headers())
+    agent = await connect(manager, agent_headers("agent"))
+    invoker = await connect(manager, invoker_headers("caller", "agent"))
+    await manager.process_message(invoker, invoke_frame("agent"), agent_jwt=None)
+
+    drain = asyncio.create_task(manager.drain(timeout=1, close_spread=0))
+    await wait_until(lambda: manager.draining)
+
+    # new invocations are turned away while the pending one completes
+    await manager.process_message(invoker, invoke_frame("agent"), agent_jwt=None)
+    await wait_until(lambda: invoker.websocket.sent)
+    assert invoker.websocket.frames[0]["error"]["error_type"] == (
+        ErrorType.ROUTER_DRAINING.value
+    )
+    assert not drain.done()
+
+    await manager.process_message(
+        agent, response_frame(invoker.connection_id), agent_jwt=None
+    )
+    result = await drain
+    assert result.unfinished_invocations == 0
+    assert result.closed_connections == 3
+    assert invoker.websocket.frames[1]["response"] == "ok"
+
+    for connection in (backend, agent, invoker):
+        assert connection.websocket.close_code == SERVICE_RESTART_CLOSE_CODE
+    assert not manager.connections
+    # the backend is closed last, after it was told about the agent
+    assert [
+        frame["request_payload"]["agent_uuid"] for frame in backend.websocket.frames
+    ] == ["caller:agent", "agent"]
+    assert all(
+        frame["request_payload"]["message_type"] == WSMessageType.AGENT_UNREGISTER.value
+        for frame in backend.websocket.frames
+    )
+
+
+@pytest.mark.asyncio
+async def test_drain_gives_up_on_invocations_after_the_timeout(manager):
+    await connect(manager, agent_headers("agent"))
+    invoker = await connect(manager, invoker_headers("caller", "agent"))
+    await manager.process_message(invoker, invoke_frame("agent"), agent_jwt=None)
+
+    result = await manager.drain(timeout=0.05, close_spread=0)
+    assert result.unfinished_invocations == 1
+    assert result.closed_connections == 2
+    assert len(manager.pending_invocations) == 0
+
+
+@pytest.mark.asyncio
+async def test_drain_flushes_send_queues_before_closing(manager):
+    backend = await connect(manager, backend_headers())
+    agent = await connect(manager, agent_headers("agent"))
+    backend.websocket.writable.clear()
+    # the writer holds one frame, the other two wait in the queue
+    for _ in range(3):
+        await manager.process_message(backend, invoke_frame("agent"), agent_jwt=None)
+        await manager.process_message(
+            agent, response_frame(backend.connection_id), agent_jwt=None
+        )
+    await wait_until(lambda: backend.queue_depth == 2)
+
+    drain = asyncio.create_task(manager.drain(timeout=0, close_spread=0))
+    await asyncio.sleep(0.05)
+    backend.websocket.writable.set()
+    result = await drain
+
+    assert result.unflushed_connections == 0
+    frames = backend.websocket.frames
+    assert [frame.get("response") for frame in frames[:3]] == ["ok"] * 3
+    assert frames[3]["request_payload"]["agent_uuid"] == "agent"
+    assert backend.websocket.close_code == SERVICE_RESTART_CLOSE_CODE
+
+
+@pytest.mark.asyncio
+async def test_drain_closes_a_stuck_socket_after_the_flush_timeout(manager):
+    agent = await connect(manager, agent_headers("agent"))
+    agent.websocket.writable.clear()
+    await agent.enqueue(invoke_frame("agent"))
+
+    result = await manager.drain(timeout=0, close_spread=0, flush_timeout=0.05)
+    assert result.unflushed_connections == 1
+    assert agent.websocket.close_code == SERVICE_RESTART_CLOSE_CODE
+    assert not agent.websocket.sent
+
+
+def test_drain_requires_the_api_key():
+    client = TestClient(app)
+
+    assert client.post("/drain").status_code == 401
+    assert client.post("/drain", headers={"api-key": "wrong"}).status_code == 401
+    assert not ws_connection_manager.draining
@@ -0,0 +1,88 @@
+import json
+import runpy
+
+import pytest
+import uvicorn
+
+from connectors import ws_connector_manager
+from connectors.ws_connector_manager import HEARTBEAT_TIMEOUT_CLOSE_CODE
+from helpers import agent_headers, backend_headers, connect, wait_until
+from settings import get_settings
+from utils.enums import WSMessageType
+
+
+def heartbeat_headers(agent_id: str):
+    return {**agent_headers(agent_id), "x-router-heartbeat": "true"}
+
+
+def pong_frame(ping_id) -> str:
+    return json.dumps(
+        {"message_type": WSMessageType.ROUTER_PONG.value, "ping_id": ping_id}
+    )
+
+
+@pytest.mark.asyncio
+async def test_only_clients_that_opted_in_are_pinged(manager):
+    agent = await connect(manager, heartbeat_headers("agent"))
+    sdk_agent = await connect(manager, agent_headers("sdk-agent"))
+
+    await manager.send_heartbeats()
+    await wait_until(lambda: agent.websocket.sent)
+    assert agent.websocket.frames == [
+        {"message_type": WSMessageType.ROUTER_PING.value, "ping_id": 1}
+    ]
+    assert not sdk_agent.websocket.sent
+
+
+@pytest.mark.asyncio
+async def test_pong_records_the_round_trip_time(manager):
+    agent = await connect(manager, heartbeat_headers("agent"))
+    await manager.send_heartbeats()
+
+    await manager.process_message(agent, pong_frame(2), agent_jwt=None)
+    assert agent.heartbeat_rtt is None  # not the pending ping
+
+    await manager.process_message(agent, pong_frame(1), agent_jwt=None)
+    assert agent.heartbeat_rtt is not None and agent.missed_heartbeats == 0
+    assert manager.metrics.heartbeat_rtt["agent"].count == 1
+    (entry,) = manager.get_presence()
+    assert entry.heartbeat_rtt == agent.heartbeat_rtt
+    metrics = manager.get_metrics()
+    assert 'router_heartbeat_rtt_seconds_count{client_id="agent"} 1' in metrics
+    assert "router_heartbeat_rtt_last_seconds{" in metrics
+
+    # the next ping goes out once the previous one is answered
+    await manager.send_heartbeats()
+    await wait_until(lambda: len(agent.websocket.sent) == 2)
+    assert agent.websocket.frames[1]["ping_id"] == 2
+
+
+@pytest.mark.asyncio
+async def test_unresponsive_socket_is_reaped(manager, monkeypatch):
+    monkeypatch.setattr(ws_connector_manager.app_settings, "HEARTBEAT_MAX_MISSED", 2)
+    backend = await connect(manager, backend_headers())
+    agent = await connect(manager, heartbeat_headers("agent"))
+
+    await manager.send_heartbeats()  # ping
+    await manager.send_heartbeats()  # first miss
+    assert manager.is_active("agent")
+    await manager.send_heartbeats()  # second miss
+
+    assert not manager.is_active("agent")
+    assert manager.metrics.heartbeat_reaped_total == 1
+    await wait_until(lambda: agent.websocket.close_code is not None)
+    assert agent.websocket.close_code == HEARTBEAT_TIMEOUT_CLOSE_CODE
+    await wait_until(lambda: backend.websocket.sent)
+    assert backend.websocket.frames[0]["request_payload"]["message_type"] == (
+        WSMessageType.AGENT_UNREGISTER.value
+    )
+
+
+def test_main_passes_the_ping_settings_to_uvicorn(monkeypatch):
+    calls = []
+    monkeypatch.setattr(uvicorn, "run", lambda *args, **kwargs: calls.append(kwargs))
+    runpy.run_path("main.py", run_name="__main__")
+
+    settings = get_settings()
+    assert calls[0]["ws_ping_interval"] == settings.WS_PING_INTERVAL_SECONDS
+    assert calls[0]["ws_ping_timeout"] == settings.WS_PING_TIMEOUT_SECONDS
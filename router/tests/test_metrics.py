@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from helpers import agent_headers, connect, invoke_frame, response_frame, wait_until
+from utils.enums import ErrorType, WSMessageType
+from utils.metrics import Histogram, RouterMetrics, message_type_label
+
+
+def test_message_type_label_bounds_the_label_values():
+    assert message_type_label("agent_invoke") == "agent_invoke"
+    assert message_type_label("made_up") == "unknown"
+    assert message_type_label({}) == "unknown"
+    assert message_type_label(None) == "unknown"
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram(buckets=(1, 2))
+    for value in (0.5, 1.5, 1.5, 3):
+        histogram.observe(value)
+
+    samples = dict(
+        (labels.get("le", suffix), value)
+        for suffix, (labels, value) in histogram.samples({})
+    )
+    assert samples == {"1.0": 1, "2.0": 3, "+Inf": 4, "_sum": 6.5, "_count": 4}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("message_type", [{}, [], "made_up"])
+async def test_unknown_message_type_gets_an_error_reply(manager, message_type):
+    agent = await connect(manager, agent_headers("agent"))
+    await manager.process_message(
+        agent, json.dumps({"message_type": message_type}), agent_jwt=None
+    )
+
+    await wait_until(lambda: len(agent.websocket.sent) == 1)
+    assert agent.websocket.frames[0]["error"]["error_type"] == (
+        ErrorType.AGENT_GENERAL_ERROR.value
+    )
+    assert dict(manager.metrics.messages_total) == {"unknown": 1}
+
+
+@pytest.mark.asyncio
+async def test_series_of_a_client_are_dropped_on_disconnect(manager):
+    agent = await connect(manager, agent_headers("agent"))
+    replica = await connect(manager, agent_headers("agent"))
+    invoker = await connect(manager, agent_headers("caller"))
+
+    await manager.process_message(invoker, invoke_frame("agent"), agent_jwt=None)
+    target = next(c for c in (agent, replica) if c.in_flight)
+    await manager.process_message(
+        target, response_frame(invoker.connection_id), agent_jwt=None
+    )
+    assert manager.metrics.messages_total[WSMessageType.AGENT_RESPONSE.value] == 1
+    assert 'router_invocation_duration_seconds_count{agent_uuid="agent"} 1' in (
+        manager.get_metrics()
+    )
+
+    await manager.disconnect(agent)
+    assert "agent" in manager.metrics.invocation_latency  # a replica is left
+
+    await manager.disconnect(replica)
+    assert "agent" not in manager.metrics.invocation_latency
+    assert 'agent_uuid="agent"' not in manager.get_metrics()
+
+
+def test_forget_client_of_an_unknown_client():
+    RouterMetrics().forget_client("unknown")
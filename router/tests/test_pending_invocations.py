@@ -0,0 +1,165 @@
+import json
+
+import pytest
+
+from connectors import ws_connector_manager
+from connectors.pending_invocations import PendingInvocationRegistry
+from helpers import (
+    agent_headers,
+    backend_headers,
+    connect,
+    invoke_frame,
+    response_frame,
+    wait_until,
+)
+from utils.enums import ErrorType, WSMessageType
+
+
+async def ignore(invocation) -> None:
+    pass
+
+
+@pytest.mark.asyncio
+async def test_responses_are_matched_on_the_request_id():
+    registry = PendingInvocationRegistry(timeout=0, tick=1, on_expire=ignore)
+    first = registry.add("backend#1", "agent", "agent#1", client_request_id="first")
+    second = registry.add("backend#1", "agent", "agent#1", client_request_id="second")
+
+    assert registry.complete("backend#1", "agent#1", "second") is second
+    assert registry.complete("backend#1", "agent#1", "second") is None
+    assert registry.complete("backend#1", "agent#1", "first") is first
+    assert len(registry) == 0
+
+
+@pytest.mark.asyncio
+async def test_responses_without_request_id_complete_the_oldest_invocation():
+    registry = PendingInvocationRegistry(timeout=0, tick=1, on_expire=ignore)
+    first = registry.add("backend#1", "agent", "agent#1", client_request_id="first")
+    second = registry.add("backend#1", "agent", "agent#1")
+
+    assert registry.complete("backend#1", "agent#1") is first
+    assert registry.complete("backend#1", "agent#1") is second
+    assert registry.complete("backend#1", "agent#1") is None
+
+
+@pytest.mark.asyncio
+async def test_unknown_request_id_only_completes_invocations_sent_without_one():
+    registry = PendingInvocationRegistry(timeout=0, tick=1, on_expire=ignore)
+    registry.add("backend#1", "agent", "agent#1", client_request_id="first")
+    assert registry.complete("backend#1", "agent#1", "other") is None
+
+    untracked = registry.add("backend#1", "agent", "agent#1")
+    assert registry.complete("backend#1", "agent#1", "other") is untracked
+
+
+@pytest.mark.asyncio
+async def test_find_for_request():
+    registry = PendingInvocationRegistry(timeout=0, tick=1, on_expire=ignore)
+    invocation = registry.add("backend#1", "agent", "agent#1", client_request_id="r")
+
+    assert registry.find_for_request("agent#1", "r") is invocation
+    assert registry.find_for_request("agent#2", "r") is None
+    assert len(registry) == 1
+
+    registry.complete("backend#1", "agent#1", "r")
+    assert registry.find_for_request("agent#1", "r") is None
+
+
+@pytest.mark.asyncio
+async def test_pop_for_connection_removes_both_sides():
+    registry = PendingInvocationRegistry(timeout=0, tick=1, on_expire=ignore)
+    registry.add("backend#1", "agent", "agent#1", client_request_id="a")
+    registry.add("backend#1", "other", "other#1")
+    registry.add("caller#1", "agent", "agent#1")
+
+    assert len(registry.pop_for_connection("agent#1")) == 2
+    assert len(registry) == 1
+    assert len(registry.pop_for_connection("backend#1")) == 1
+    assert len(registry) == 0
+    assert registry.find_for_request("agent#1", "a") is None
+
+
+@pytest.mark.asyncio
+async def test_timer_wheel_expires_invocations_past_their_deadline():
+    expired = []
+
+    async def on_expire(invocation) -> None:
+        expired.append(invocation)
+
+    registry = PendingInvocationRegistry(
+        timeout=0.05, tick=0.01, on_expire=on_expire, wheel_size=4
+    )
+    registry.add("backend#1", "agent", "agent#1", client_request_id="answered")
+    late = registry.add("backend#1", "agent", "agent#1", client_request_id="late")
+    registry.complete("backend#1", "agent#1", "answered")
+
+    await wait_until(lambda: expired)
+    assert expired == [late]
+    assert len(registry) == 0
+    await registry.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_invocations_complete_the_right_entry(manager):
+    backend = await connect(manager, backend_headers())
+    agent = await connect(manager, agent_headers("agent"))
+
+    for request_id in ("first", "second"):
+        await manager.process_message(
+            backend, invoke_frame("agent", request_id=request_id), agent_jwt=None
+        )
+    assert agent.in_flight == 2
+
+    await manager.process_message(
+        agent, response_frame(backend.connection_id, request_id="second"), None
+    )
+    assert agent.in_flight == 1
+    remaining = manager.pending_invocations.find_for_request(
+        agent.connection_id, "first"
+    )
+    assert remaining is not None and remaining.invoker == backend.connection_id
+    assert (
+        manager.pending_invocations.find_for_request(agent.connection_id, "second")
+        is None
+    )
+
+
+@pytest.mark.asyncio
+async def test_disconnect_fails_the_invocations_of_the_replica(manager):
+    backend = await connect(manager, backend_headers())
+    agent = await connect(manager, agent_headers("agent"))
+    await manager.process_message(backend, invoke_frame("agent"), agent_jwt=None)
+
+    await manager.disconnect(agent)
+    await wait_until(lambda: len(backend.websocket.sent) == 2)
+    error, unregister = backend.websocket.frames
+    assert error["message_type"] == WSMessageType.AGENT_ERROR.value
+    assert error["error"]["agent_uuid"] == "agent"
+    assert unregister["request_payload"]["message_type"] == (
+        WSMessageType.AGENT_UNREGISTER.value
+    )
+    assert len(manager.pending_invocations) == 0
+
+
+@pytest.mark.asyncio
+async def test_unanswered_invocation_times_out(monkeypatch):
+    monkeypatch.setattr(
+        ws_connector_manager.app_settings, "INVOCATION_TIMEOUT_SECONDS", 0.05
+    )
+    monkeypatch.setattr(
+        ws_connector_manager.app_settings, "INVOCATION_TIMER_TICK_SECONDS", 0.01
+    )
+    manager = ws_connector_manager.WSConnectionManager()
+    backend = await connect(manager, backend_headers())
+    agent = await connect(manager, agent_headers("agent"))
+    await manager.process_message(backend, invoke_frame("agent"), agent_jwt=None)
+
+    await wait_until(lambda: backend.websocket.sent)
+    error = json.loads(backend.websocket.sent[0])
+    assert error["error"]["error_type"] == ErrorType.INVOCATION_TIMEOUT.value
+    assert agent.in_flight == 0
+    assert manager.metrics.invocation_timeouts_total["agent"] == 1
+
+    for connection in (backend, agent):
+        await connection.close()
+    await manager.close()
@@ -0,0 +1,73 @@
+import json
+from typing import Any, List
+
+import msgspec
+import pytest
+
+from connectors import ws_connector_manager
+from helpers import (
+    agent_headers,
+    backend_headers,
+    connect,
+    invoke_frame,
+    response_frame,
+    wait_until,
+)
+from utils.enums import WSMessageType
+
+
+async def forwarded_frames(manager, binary: bool) -> List[Any]:
+    """
+    Sends an invocation, a stream chunk and a response through the manager and returns
+    what the agent and the invoker received, with connection IDs replaced by their role.
+    """
+    backend = await connect(manager, backend_headers())
+    agent = await connect(manager, agent_headers("agent"))
+
+    def encode(frame: str) -> str | bytes:
+        return msgspec.msgpack.encode(json.loads(frame)) if binary else frame
+
+    await manager.process_message(
+        backend, encode(invoke_frame("agent", request_id="r", text="hi")), None
+    )
+    chunk = json.dumps(
+        {
+            "message_type": WSMessageType.AGENT_STREAM_CHUNK.value,
+            "invoked_by": backend.connection_id,
+            "request_metadata": {"request_id": "r"},
+            "chunk": "h",
+        }
+    )
+    await manager.process_message(agent, encode(chunk), None)
+    await manager.process_message(
+        agent, encode(response_frame(backend.connection_id, request_id="r")), None
+    )
+    await wait_until(lambda: agent.websocket.sent and len(backend.websocket.sent) == 2)
+
+    frames = agent.websocket.frames + backend.websocket.frames
+    for connection in (agent, backend):
+        await manager.disconnect(connection)
+
+    for frame in frames:
+        assert frame["invoked_by"] == backend.connection_id
+        frame["invoked_by"] = "backend"
+    return frames
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("binary", [False, True])
+async def test_raw_and_regular_paths_forward_the_same_frames(
+    manager, monkeypatch, binary
+):
+    raw = await forwarded_frames(manager, binary)
+    monkeypatch.setattr(
+        ws_connector_manager.app_settings, "RAW_FRAME_FORWARDING", False
+    )
+    regular = await forwarded_frames(manager, binary)
+
+    assert raw == regular
+    invoke, chunk, response = raw
+    assert invoke["message_type"] == WSMessageType.AGENT_INVOKE.value
+    assert invoke["agent_uuid"] == "agent"
+    assert chunk["chunk"] == "h"
+    assert response["message_type"] == WSMessageType.AGENT_RESPONSE.value
@@ -0,0 +1,156 @@
+import pytest
+import pytest_asyncio
+
+from connectors.routing_bus import (
+    BusMessage,
+    InMemoryBusHub,
+    InMemoryRoutingBus,
+    shard_of_connection,
+)
+from connectors.ws_connector_manager import WSConnectionManager
+from helpers import (
+    agent_headers,
+    backend_headers,
+    close_manager,
+    connect,
+    invoke_frame,
+    response_frame,
+    wait_until,
+)
+from utils.enums import BusMessageKind, WSMessageType
+
+
+@pytest_asyncio.fixture
+async def shards():
+    """
+    Two router shards, "a" and "b", talking over an in-memory routing bus.
+    """
+    hub = InMemoryBusHub()
+    managers = [
+        WSConnectionManager(bus=InMemoryRoutingBus(shard_id, hub))
+        for shard_id in ("a", "b")
+    ]
+    for manager in managers:
+        await manager.start()
+    yield managers
+    for manager in managers:
+        await close_manager(manager)
+
+
+def unregistered(connection) -> list[str]:
+    return [
+        frame["request_payload"]["agent_uuid"]
+        for frame in connection.websocket.frames
+        if frame.get("request_payload", {}).get("message_type")
+        == WSMessageType.AGENT_UNREGISTER.value
+    ]
+
+
+def test_bus_message_round_trip():
+    message = BusMessage(
+        kind=BusMessageKind.INVOKE,
+        sender="a",
+        target="agent",
+        session_id="session",
+        reply_to="backend#a.1",
+        binary=True,
+        frame=b"\x81\xa1k\xa1v",
+    )
+    assert BusMessage.unpack(message.pack()) == message
+
+
+def test_connection_ids_carry_their_shard():
+    assert shard_of_connection("agent#a.0123456789ab") == "a"
+    assert shard_of_connection("agent#0123456789ab") is None
+
+
+@pytest.mark.asyncio
+async def test_shards_share_their_presence(shards):
+    a, b = shards
+    await connect(b, agent_headers("agent"))
+
+    assert a.is_active("agent")
+    assert a.bus.shards_of("agent") == {"b"}
+
+    # a shard started later asks the others for the clients they hold
+    late = WSConnectionManager(bus=InMemoryRoutingBus("c", a.bus.hub))
+    await late.start()
+    assert late.is_active("agent")
+    await close_manager(late)
+
+
+@pytest.mark.asyncio
+async def test_cross_shard_invoke_and_response(shards):
+    a, b = shards
+    backend = await connect(a, backend_headers())
+    agent = await connect(b, agent_headers("agent"))
+
+    await a.process_message(
+        backend, invoke_frame("agent", request_id="r", text="hi"), agent_jwt=None
+    )
+    await wait_until(lambda: agent.websocket.sent)
+    invoke = agent.websocket.frames[0]
+    assert invoke["invoked_by"] == backend.connection_id
+    assert invoke["request_payload"] == {"text": "hi"}
+    assert agent.in_flight == 1
+    assert b.pending_invocations.find_for_request(agent.connection_id, "r")
+
+    await b.process_message(
+        agent,
+        response_frame(backend.connection_id, request_id="r", response="hello"),
+        agent_jwt=None,
+    )
+    await wait_until(lambda: backend.websocket.sent)
+    assert backend.websocket.frames[0]["response"] == "hello"
+    assert agent.in_flight == 0
+    assert len(b.pending_invocations) == 0
+
+
+@pytest.mark.asyncio
+async def test_agent_is_unregistered_once_gone_from_every_shard(shards):
+    a, b = shards
+    backend = await connect(a, backend_headers())
+    on_a = await connect(a, agent_headers("agent"))
+    on_b = await connect(b, agent_headers("agent"))
+
+    await b.disconnect(on_b)
+    assert a.bus.shards_of("agent") == set()
+    assert b.is_active("agent")  # still connected to shard a
+    assert unregistered(backend) == []
+
+    await a.disconnect(on_a)
+    assert not b.is_active("agent")
+    await wait_until(lambda: unregistered(backend) == ["agent"])
+
+
+@pytest.mark.asyncio
+async def test_agent_dropping_fails_invocations_from_another_shard(shards):
+    a, b = shards
+    backend = await connect(a, backend_headers())
+    agent = await connect(b, agent_headers("agent"))
+    await a.process_message(backend, invoke_frame("agent"), agent_jwt=None)
+    await wait_until(lambda: agent.websocket.sent)
+
+    await b.disconnect(agent)
+    await wait_until(lambda: len(backend.websocket.sent) == 2)
+    error = backend.websocket.frames[0]
+    assert error["message_type"] == WSMessageType.AGENT_ERROR.value
+    assert error["error"]["agent_uuid"] == "agent"
+    assert unregistered(backend) == ["agent"]
+    assert not a.is_active("agent")
+
+
+@pytest.mark.asyncio
+async def test_invoking_an_agent_that_left_the_other_shard(shards):
+    a, b = shards
+    backend = await connect(a, backend_headers())
+    agent = await connect(b, agent_headers("agent"))
+    await b.close()  # the shard goes away without closing its sockets
+
+    assert not a.is_active("agent")
+    await a.process_message(backend, invoke_frame("agent"), agent_jwt=None)
+    await wait_until(lambda: backend.websocket.sent)
+    assert backend.websocket.frames[0]["message_type"] == (
+        WSMessageType.AGENT_ERROR.value
+    )
+    assert not agent.websocket.sent
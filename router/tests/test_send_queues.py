@@ -0,0 +1,173 @@
+import asyncio
+
+import pytest
+
+from connectors import ws_connector_manager
+from connectors.ws_client_connection import ClientConnection
+from helpers import (
+    FakeWebSocket,
+    agent_headers,
+    connect,
+    invoke_frame,
+    invoker_headers,
+    wait_until,
+)
+from utils.enums import ErrorType, SendQueueOverflowPolicy
+from utils.exceptions import SendQueueFullError
+
+
+def make_connection(
+    policy: SendQueueOverflowPolicy, max_queue_size: int = 1
+) -> ClientConnection:
+    connection = ClientConnection(
+        client_id="agent",
+        websocket=FakeWebSocket(),
+        max_queue_size=max_queue_size,
+        overflow_policy=policy,
+    )
+    connection.start()
+    return connection
+
+
+async def stall(connection: ClientConnection) -> None:
+    """
+    Holds back the writer of the connection with one frame in hand.
+    """
+    connection.websocket.writable.clear()
+    await connection.enqueue("in the writer")
+    await wait_until(lambda: connection.queue_depth == 0)
+
+
+@pytest.mark.asyncio
+async def test_frames_are_written_in_order():
+    connection = make_connection(SendQueueOverflowPolicy.BLOCK, max_queue_size=10)
+    for index in range(5):
+        await connection.enqueue(f"frame {index}")
+
+    await wait_until(lambda: len(connection.websocket.sent) == 5)
+    assert connection.websocket.sent == [f"frame {index}" for index in range(5)]
+    assert connection.bytes_sent == sum(len(m) for m in connection.websocket.sent)
+    await connection.close()
+
+
+@pytest.mark.asyncio
+async def test_block_policy_waits_for_room():
+    connection = make_connection(SendQueueOverflowPolicy.BLOCK)
+    await stall(connection)
+    await connection.enqueue("queued")
+
+    blocked = asyncio.create_task(connection.enqueue("blocked"))
+    await asyncio.sleep(0.01)
+    assert not blocked.done()
+    assert connection.queue_depth == 1
+
+    connection.websocket.writable.set()
+    await blocked
+    await wait_until(lambda: len(connection.websocket.sent) == 3)
+    assert connection.websocket.sent == ["in the writer", "queued", "blocked"]
+    assert connection.dropped_messages == 0
+    await connection.close()
+
+
+@pytest.mark.asyncio
+async def test_close_releases_blocked_senders():
+    connection = make_connection(SendQueueOverflowPolicy.BLOCK)
+    await stall(connection)
+    await connection.enqueue("queued")
+    blocked = asyncio.create_task(connection.enqueue("blocked"))
+    await asyncio.sleep(0.01)
+
+    await connection.close()
+    await asyncio.wait_for(blocked, timeout=1)
+    assert connection.queue_depth == 0
+    assert connection.dropped_messages == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_write_releases_blocked_senders():
+    connection = make_connection(SendQueueOverflowPolicy.BLOCK)
+    await stall(connection)
+    await connection.enqueue("queued")
+    blocked = asyncio.create_task(connection.enqueue("blocked"))
+    await asyncio.sleep(0.01)
+
+    async def broken_send(message: str) -> None:
+        raise RuntimeError("socket is gone")
+
+    connection.websocket.send_text = broken_send
+    connection.websocket.writable.set()
+    await asyncio.wait_for(blocked, timeout=1)
+    assert connection.is_closed
+    await connection.enqueue("after the failure")
+    await connection.close()
+
+
+@pytest.mark.asyncio
+async def test_bytes_sent_counts_utf8_bytes():
+    connection = make_connection(SendQueueOverflowPolicy.BLOCK, max_queue_size=10)
+    await connection.enqueue("héllo")
+    await connection.enqueue("hello")
+
+    await wait_until(lambda: len(connection.websocket.sent) == 2)
+    assert connection.bytes_sent == 6 + 5
+    await connection.close()
+
+
+@pytest.mark.asyncio
+async def test_drop_oldest_policy_replaces_the_oldest_frame():
+    connection = make_connection(SendQueueOverflowPolicy.DROP_OLDEST)
+    await stall(connection)
+    await connection.enqueue("dropped")
+    await connection.enqueue("kept")
+
+    assert connection.dropped_messages == 1
+    connection.websocket.writable.set()
+    await wait_until(lambda: len(connection.websocket.sent) == 2)
+    assert connection.websocket.sent == ["in the writer", "kept"]
+    await connection.close()
+
+
+@pytest.mark.asyncio
+async def test_error_policy_rejects_the_frame():
+    connection = make_connection(SendQueueOverflowPolicy.ERROR)
+    await stall(connection)
+    await connection.enqueue("queued")
+
+    with pytest.raises(SendQueueFullError):
+        await connection.enqueue("rejected")
+    assert connection.dropped_messages == 1
+    await connection.close()
+
+
+@pytest.mark.asyncio
+async def test_closed_connection_discards_frames():
+    connection = make_connection(SendQueueOverflowPolicy.BLOCK)
+    await connection.close()
+    await connection.enqueue("late")
+    assert connection.queue_depth == 0
+
+
+@pytest.mark.asyncio
+async def test_full_agent_queue_answers_the_invoker(manager, monkeypatch):
+    monkeypatch.setattr(ws_connector_manager.app_settings, "SEND_QUEUE_MAX_SIZE", 1)
+    monkeypatch.setattr(
+        ws_connector_manager.app_settings,
+        "SEND_QUEUE_OVERFLOW_POLICY",
+        SendQueueOverflowPolicy.ERROR,
+    )
+    agent = await connect(manager, agent_headers("agent"))
+    other_agent = await connect(manager, agent_headers("other-agent"))
+    invoker = await connect(manager, invoker_headers("caller", "agent"))
+    await stall(agent)
+
+    await manager.process_message(invoker, invoke_frame("agent"), agent_jwt=None)
+    await manager.process_message(invoker, invoke_frame("agent"), agent_jwt=None)
+    await wait_until(lambda: len(invoker.websocket.sent) == 1)
+    assert invoker.websocket.frames[0]["error"]["error_type"] == (
+        ErrorType.SEND_QUEUE_FULL.value
+    )
+    assert manager.get_send_queue_depths()[agent.connection_id] == 1
+
+    # the stalled agent holds up no one else
+    await manager.process_message(invoker, invoke_frame("other-agent"), agent_jwt=None)
+    await wait_until(lambda: len(other_agent.websocket.sent) == 1)
@@ -0,0 +1,21 @@
+from fastapi.testclient import TestClient
+
+from helpers import agent_headers, backend_headers
+from main import app, ws_connection_manager
+from utils.enums import WSMessageType
+
+
+def test_closed_socket_goes_through_disconnect():
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws", headers=backend_headers()) as backend:
+            with client.websocket_connect("/ws", headers=agent_headers("agent")):
+                assert ws_connection_manager.is_active("agent")
+
+            # uvicorn ends sockets that stop answering pings the same way
+            assert backend.receive_json() == {
+                "request_payload": {
+                    "agent_uuid": "agent",
+                    "message_type": WSMessageType.AGENT_UNREGISTER.value,
+                }
+            }
+            assert not ws_connection_manager.is_active("agent")
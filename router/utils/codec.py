@@ -0,0 +1,202 @@
+from typing import Any, Optional
+
+import msgspec
+
+from utils.enums import FrameEncoding
+
+# Within the router a frame is JSON text when it is a str and MessagePack when it is bytes,
+# the same as the WebSocket frame type it arrived in.
+MSGPACK_SUBPROTOCOL = "genai.msgpack"
+
+_json_encoder = msgspec.json.Encoder()
+_json_decoder = msgspec.json.Decoder()
+_msgpack_encoder = msgspec.msgpack.Encoder()
+_msgpack_decoder = msgspec.msgpack.Decoder()
+
+
+class RequestMetadata(msgspec.Struct):
+    request_id: Optional[str] = None
+    session_id: Optional[str] = None
+
+
+class Envelope(msgspec.Struct):
+    """
+    Routing envelope of a WebSocket frame. Decoding a frame into it skips every other
+    field, so the (potentially multi-MB) payload is never materialized as Python objects.
+    """
+
+    message_type: Optional[str] = None
+    agent_uuid: Optional[str] = None
+    invoked_by: Optional[str] = None
+    request_payload: msgspec.Raw = msgspec.field(default_factory=msgspec.Raw)
+    request_metadata: RequestMetadata = msgspec.field(default_factory=RequestMetadata)
+
+
+class PayloadEnvelope(msgspec.Struct):
+    error_message: Any = msgspec.UNSET
+
+
+_envelope_decoder = msgspec.json.Decoder(Envelope)
+_payload_envelope_decoder = msgspec.json.Decoder(PayloadEnvelope)
+_msgpack_envelope_decoder = msgspec.msgpack.Decoder(Envelope)
+_msgpack_payload_envelope_decoder = msgspec.msgpack.Decoder(PayloadEnvelope)
+
+
+def decode_message(message: str | bytes) -> Any:
+    """
+    Fully decodes a JSON text frame or a MessagePack binary frame.
+
+    Raises:
+        msgspec.DecodeError: If the frame is not valid JSON or MessagePack.
+    """
+    if isinstance(message, bytes):
+        return _msgpack_decoder.decode(message)
+    return _json_decoder.decode(message)
+
+
+def encode_message(message: Any, binary: bool = False) -> str | bytes:
+    """
+    Encodes a message into a JSON text frame, or a MessagePack binary frame if `binary`.
+    """
+    if binary:
+        return _msgpack_encoder.encode(message)
+    return _json_encoder.encode(message).decode()
+
+
+def decode_envelope(message: str | bytes) -> Optional[Envelope]:
+    """
+    Decodes only the routing envelope of a JSON text frame or a MessagePack binary frame.
+    The raw request payload keeps the encoding of the frame.
+
+    Returns:
+        Optional[Envelope]: The envelope, or None if the frame is not a valid object.
+    """
+    decoder = (
+        _msgpack_envelope_decoder if isinstance(message, bytes) else _envelope_decoder
+    )
+    try:
+        return decoder.decode(message)
+    except (msgspec.DecodeError, msgspec.ValidationError):
+        return None
+
+
+def payload_has_error_message(
+    payload: msgspec.Raw, binary: bool = False
+) -> Optional[bool]:
+    """
+    Checks whether a raw request payload carries an "error_message" field.
+
+    Args:
+        payload (msgspec.Raw): The request payload of an envelope.
+        binary (bool): True if the envelope was decoded from a MessagePack frame.
+
+    Returns:
+        Optional[bool]: None if the payload is not an object.
+    """
+    decoder = _msgpack_payload_envelope_decoder if binary else _payload_envelope_decoder
+    try:
+        decoded = decoder.decode(payload)
+    except (msgspec.DecodeError, msgspec.ValidationError):
+        return None
+    return decoded.error_message is not msgspec.UNSET
+
+
+def append_json_field(message: str, key: str, value: Any) -> str:
+    """
+    Adds a top-level field to an encoded JSON object without re-encoding the rest of it.
+    The field is appended last, so it wins over an existing field with the same key.
+
+    Args:
+        message (str): JSON text of an object, e.g. a frame accepted by decode_envelope.
+        key (str): Name of the field to add.
+        value (Any): JSON-serializable value of the field.
+
+    Returns:
+        str: The JSON text with the field added.
+    """
+    body = message.rstrip()[:-1].rstrip()
+    separator = "" if body.endswith("{") else ","
+    return f"{body}{separator}{encode_message(key)}:{encode_message(value)}}}"
+
+
+def append_msgpack_field(message: bytes, key: str, value: Any) -> bytes:
+    """
+    Adds a top-level field to an encoded MessagePack map without re-encoding the rest of
+    it. Only the map header is rewritten, and the field is appended last, so it wins over
+    an existing field with the same key.
+
+    Args:
+        message (bytes): MessagePack map, e.g. a frame accepted by decode_envelope.
+        key (str): Name of the field to add.
+        value (Any): Serializable value of the field.
+
+    Returns:
+        bytes: The MessagePack map with the field added.
+
+    Raises:
+        ValueError: If the message is not a MessagePack map.
+    """
+    head = message[0]
+    if 0x80 <= head <= 0x8F:  # fixmap
+        size, offset = head & 0x0F, 1
+    elif head == 0xDE:  # map 16
+        size, offset = int.from_bytes(message[1:3], "big"), 3
+    elif head == 0xDF:  # map 32
+        size, offset = int.from_bytes(message[1:5], "big"), 5
+    else:
+        raise ValueError("Frame is not a MessagePack map")
+
+    size += 1
+    if size <= 0x0F:
+        header = bytes((0x80 | size,))
+    elif size <= 0xFFFF:
+        header = b"\xde" + size.to_bytes(2, "big")
+    else:
+        header = b"\xdf" + size.to_bytes(4, "big")
+
+    return b"".join(
+        (
+            header,
+            message[offset:],
+            _msgpack_encoder.encode(key),
+            _msgpack_encoder.encode(value),
+        )
+    )
+
+
+def append_field(message: str | bytes, key: str, value: Any) -> str | bytes:
+    """
+    Adds a top-level field to a JSON text frame or a MessagePack binary frame,
+    see append_json_field and append_msgpack_field.
+    """
+    if isinstance(message, bytes):
+        return append_msgpack_field(message, key, value)
+    return append_json_field(message, key, value)
+
+
+def transcode(message: str | bytes, encoding: FrameEncoding) -> str | bytes:
+    """
+    Converts a frame into the encoding a client negotiated. Frames already in that
+    encoding are returned as-is. Binary values of MessagePack frames turn into base64
+    strings in JSON.
+
+    Args:
+        message (str | bytes): A JSON text frame or a MessagePack binary frame.
+        encoding (FrameEncoding): The encoding of the receiving client.
+
+    Returns:
+        str | bytes: The frame in the requested encoding.
+
+    Raises:
+        msgspec.DecodeError: If the frame is not valid JSON or MessagePack.
+        msgspec.EncodeError, TypeError: If the frame can't be represented in the other
+            encoding, e.g. a MessagePack map with non-string keys.
+    """
+    if isinstance(message, bytes):
+        if encoding == FrameEncoding.MSGPACK:
+            return message
+        return _json_encoder.encode(_msgpack_decoder.decode(message)).decode()
+
+    if encoding == FrameEncoding.JSON:
+        return message
+    return _msgpack_encoder.encode(_json_decoder.decode(message))
@@ -8,7 +8,14 @@ class WSMessageType(Enum):
     AGENT_RESPONSE = "agent_response"
     AGENT_ERROR = "agent_error"
     AGENT_LOG = "agent_log"
+    AGENT_LOG_BATCH = "agent_log_batch"
+    AGENT_STREAM_START = "agent_stream_start"
+    AGENT_STREAM_CHUNK = "agent_stream_chunk"
+    AGENT_STREAM_END = "agent_stream_end"
     ML_INVOKE = "ml_invoke"
+    # heartbeats of the clients that opted in with the `x-router-heartbeat` header
+    ROUTER_PING = "router_ping"
+    ROUTER_PONG = "router_pong"
 
 
 class MasterServerName(Enum):
@@ -22,3 +29,57 @@ class ErrorType(Enum):
     AGENT_NOT_ACTIVE = "AgentNotActive"
     INVALID_JSON_REQUEST_FORMAT = "InvalidJSONRequestFormat"
     NO_REQUEST_PAYLOAD = "NoRequestPayload"
+    SEND_QUEUE_FULL = "SendQueueFull"
+    INVOCATION_TIMEOUT = "InvocationTimeout"
+    RATE_LIMITED = "RateLimited"
+    ROUTER_DRAINING = "RouterDraining"
+
+
+class SendQueueOverflowPolicy(Enum):
+    BLOCK = "block"
+    DROP_OLDEST = "drop_oldest"
+    ERROR = "error"
+
+
+class LoadBalancingStrategy(Enum):
+    LEAST_IN_FLIGHT = "least_in_flight"
+    SESSION_AFFINITY = "session_affinity"
+
+
+class ConnectionRole(Enum):
+    MASTER_SERVER_BE = "master_server_be"
+    MASTER_SERVER_ML = "master_server_ml"
+    AGENT = "agent"
+    INVOKER = "invoker"
+
+
+class FrameEncoding(Enum):
+    JSON = "json"
+    MSGPACK = "msgpack"
+
+
+class RateLimitScope(Enum):
+    INVOKER = "invoker"
+    AGENT = "agent"
+    USER = "user"
+
+
+class PresenceEventType(Enum):
+    CONNECTED = "connected"
+    DISCONNECTED = "disconnected"
+
+
+class RoutingBusType(Enum):
+    NONE = "none"
+    LOCAL = "local"
+    REDIS = "redis"
+
+
+class BusMessageKind(Enum):
+    JOIN = "join"
+    LEAVE = "leave"
+    SYNC = "sync"
+    SHARD_LEAVE = "shard_leave"
+    DELIVER = "deliver"
+    INVOKE = "invoke"
+    BROADCAST = "broadcast"
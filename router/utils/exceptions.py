@@ -0,0 +1,6 @@
+class RouterException(Exception):
+    pass
+
+
+class SendQueueFullError(RouterException):
+    pass
@@ -0,0 +1,111 @@
+import logging
+import random
+from typing import Dict, Iterable, Optional
+
+import msgspec
+
+from utils.codec import transcode
+from utils.enums import FrameEncoding
+
+
+class _PayloadPreview:
+    """
+    Defers rendering a frame until a log handler actually formats the record, and cuts
+    it down to the byte budget.
+    """
+
+    __slots__ = ("message", "max_bytes")
+
+    def __init__(self, message: str | bytes, max_bytes: Optional[int]):
+        self.message = message
+        self.max_bytes = max_bytes
+
+    def __str__(self) -> str:
+        message = self.message
+        if isinstance(message, bytes):
+            # MessagePack frames are shown as JSON
+            try:
+                message = transcode(message, FrameEncoding.JSON)
+            except (msgspec.DecodeError, msgspec.EncodeError, TypeError):
+                message = message.decode(errors="replace")
+        if self.max_bytes is None or len(message) <= self.max_bytes:
+            return message
+
+        # slicing characters first keeps the encode below cheap for multi-MB frames
+        head = message[: self.max_bytes].encode()[: self.max_bytes]
+        return f"{head.decode(errors='ignore')}...<{len(message)} chars total>"
+
+
+class FrameLogger:
+    """
+    Logs routed frames without paying for it on the hot path: nothing is rendered unless
+    the level is enabled and the frame is sampled, and payloads are truncated to a byte
+    budget. Frames of the agents listed in `full_payload_client_ids` are always logged
+    in full, which is meant for debugging a single agent in production.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        max_payload_bytes: int,
+        sample_rate: float = 1.0,
+        sample_rates: Optional[Dict[str, float]] = None,
+        full_payload_client_ids: Iterable[str] = (),
+    ):
+        """
+        Args:
+            logger (logging.Logger): The logger records are emitted to.
+            max_payload_bytes (int): Payloads are cut down to this many bytes.
+            sample_rate (float): Share of the frames that are logged, between 0 and 1.
+            sample_rates (Optional[Dict[str, float]]): Sample rate overrides per message type.
+            full_payload_client_ids (Iterable[str]): Client IDs whose frames are always
+                logged with the full payload.
+        """
+        self.logger = logger
+        self.max_payload_bytes = max_payload_bytes
+        self.sample_rate = sample_rate
+        self.sample_rates = sample_rates or {}
+        self.full_payload_client_ids = frozenset(full_payload_client_ids)
+
+    def log_frame(
+        self,
+        level: int,
+        event: str,
+        message_type: Optional[str],
+        client_id: Optional[str],
+        message: str | bytes,
+        peer: Optional[str] = None,
+    ) -> None:
+        """
+        Logs a frame if the level is enabled and the frame is sampled.
+
+        Args:
+            level (int): Logging level of the record.
+            event (str): What happened to the frame, e.g. "received" or "sending".
+            message_type (Optional[str]): Message type of the frame, used for sampling.
+            client_id (Optional[str]): The client the frame was received from or sent to.
+            message (str | bytes): The frame, only rendered if the record is emitted.
+            peer (Optional[str]): The other side of the frame, e.g. the invoker of a response.
+        """
+        if not self.logger.isEnabledFor(level):
+            return
+
+        full_payload = (
+            client_id in self.full_payload_client_ids
+            or peer in self.full_payload_client_ids
+        )
+        if not full_payload:
+            rate = self.sample_rates.get(message_type, self.sample_rate)
+            if rate < 1 and random.random() >= rate:
+                return
+
+        self.logger.log(
+            level,
+            "%s %s frame, client: %s, peer: %s, size: %d, payload: %s",
+            event,
+            message_type or "unknown",
+            client_id,
+            peer,
+            len(message),
+            _PayloadPreview(message, None if full_payload else self.max_payload_bytes),
+        )
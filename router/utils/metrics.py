@@ -0,0 +1,173 @@
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Mapping, Tuple
+
+from utils.enums import WSMessageType
+
+# Invocations range from a few milliseconds (echo agents) to minutes (LLM pipelines)
+DEFAULT_LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    120,
+    300,
+)
+
+# Pings between the router and its clients, usually within a data center
+HEARTBEAT_RTT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+)
+
+Sample = Tuple[Mapping[str, str], float]
+
+# message types come from the clients, anything else is counted as "unknown" so the
+# label values stay bounded
+MESSAGE_TYPES = frozenset(message_type.value for message_type in WSMessageType)
+
+
+def message_type_label(message_type: Any) -> str:
+    """
+    Returns the message type if the router knows it, "unknown" otherwise.
+    """
+    if isinstance(message_type, str) and message_type in MESSAGE_TYPES:
+        return message_type
+    return "unknown"
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram, observing a value is a bisect and two additions.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, labels: Mapping[str, str]) -> Iterable[Tuple[str, Sample]]:
+        """
+        Yields the cumulative bucket, sum and count samples of the histogram.
+        """
+        cumulative = 0
+        for bound, count in zip((*self.buckets, float("inf")), self.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(float(bound))
+            yield "_bucket", ({**labels, "le": le}, cumulative)
+        yield "_sum", (labels, self.sum)
+        yield "_count", (labels, self.count)
+
+
+class RouterMetrics:
+    """
+    Counters updated on the hot path. They are plain integers and dictionaries, all
+    formatting happens when /metrics is scraped. Series labelled by client are dropped
+    with `forget_client` once the client is gone.
+    """
+
+    def __init__(self):
+        self.messages_total: Dict[str, int] = defaultdict(int)
+        self.bytes_in_total = 0
+        # totals of sockets that are already closed, live ones are added at scrape time
+        self.bytes_out_total = 0
+        self.send_queue_dropped_total = 0
+        self.transcoded_frames_total = 0
+        self.invocation_latency: Dict[str, Histogram] = defaultdict(Histogram)
+        self.invocation_timeouts_total: Dict[str, int] = defaultdict(int)
+        self.rate_limited_total: Dict[str, int] = defaultdict(int)
+        self.heartbeat_rtt: Dict[str, Histogram] = defaultdict(
+            lambda: Histogram(HEARTBEAT_RTT_BUCKETS)
+        )
+        self.heartbeat_reaped_total = 0
+
+    def count_message(self, message_type: Any, size: int) -> None:
+        self.messages_total[message_type_label(message_type)] += 1
+        self.bytes_in_total += size
+
+    def observe_invocation(self, agent_uuid: str, seconds: float) -> None:
+        self.invocation_latency[agent_uuid].observe(seconds)
+
+    def observe_heartbeat(self, client_id: str, seconds: float) -> None:
+        self.heartbeat_rtt[client_id].observe(seconds)
+
+    def forget_client(self, client_id: str) -> None:
+        """
+        Drops the series of a client whose last socket disconnected from this shard.
+
+        Args:
+            client_id (str): The client ID.
+        """
+        self.invocation_latency.pop(client_id, None)
+        self.invocation_timeouts_total.pop(client_id, None)
+        self.heartbeat_rtt.pop(client_id, None)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_sample(name: str, labels: Mapping[str, str], value: float) -> str:
+    if labels:
+        rendered = ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items())
+        return f"{name}{{{rendered}}} {value}"
+    return f"{name} {value}"
+
+
+def format_metric(
+    name: str, metric_type: str, help_text: str, samples: Iterable[Sample]
+) -> List[str]:
+    """
+    Formats a metric family in the Prometheus text exposition format.
+
+    Args:
+        name (str): Metric name.
+        metric_type (str): counter, gauge or histogram.
+        help_text (str): Description of the metric.
+        samples (Iterable[Sample]): Pairs of labels and value.
+
+    Returns:
+        List[str]: Lines of the metric family.
+    """
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    lines.extend(_format_sample(name, labels, value) for labels, value in samples)
+    return lines
+
+
+def format_histograms(
+    name: str, help_text: str, histograms: Mapping[str, Histogram], label: str
+) -> List[str]:
+    """
+    Formats a family of histograms keyed by a single label value.
+    """
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for label_value, histogram in histograms.items():
+        for suffix, (labels, value) in histogram.samples({label: label_value}):
+            lines.append(_format_sample(f"{name}{suffix}", labels, value))
+    return lines
@@ -1,4 +1,9 @@
-from pydantic import BaseModel
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+from utils.enums import ConnectionRole, PresenceEventType, RateLimitScope
 
 
 class Message(BaseModel):
@@ -8,3 +13,73 @@ class Message(BaseModel):
 
 class MessageResponse(BaseModel):
     detail: str
+
+
+class SendQueuesResponse(BaseModel):
+    send_queues: Dict[str, int]
+
+
+class PresenceEntry(BaseModel):
+    client_id: str
+    role: Optional[ConnectionRole] = Field(
+        default=None, description="None if the client is only connected to other shards"
+    )
+    replicas: int = Field(description="Sockets of the client on this shard")
+    connected_at: Optional[datetime] = Field(
+        default=None, description="When the oldest socket on this shard connected"
+    )
+    last_activity: Optional[datetime] = Field(
+        default=None, description="When a frame was last received from the client"
+    )
+    heartbeat_rtt: Optional[float] = Field(
+        default=None,
+        description="Highest round-trip time of the last router_ping of each socket, "
+        "in seconds, None if the client does not answer heartbeats",
+    )
+    shards: List[str] = Field(
+        default_factory=list,
+        description="Other router shards the client is connected to",
+    )
+
+
+class PresenceResponse(BaseModel):
+    shard_id: Optional[str]
+    clients: List[PresenceEntry]
+
+
+class PresenceEvent(BaseModel):
+    event: PresenceEventType
+    client_id: str
+    connection_id: str
+    role: ConnectionRole
+    replicas: int = Field(
+        description="Sockets of the client on this shard after the change"
+    )
+    timestamp: datetime
+
+
+class DrainResponse(BaseModel):
+    unfinished_invocations: int = Field(
+        description="Invocations still pending when the drain deadline passed"
+    )
+    closed_connections: int
+    unflushed_connections: int = Field(
+        description="Sockets closed before their send queue was flushed"
+    )
+
+
+class RateLimitConfig(BaseModel):
+    rate: float = Field(ge=0, description="Invocations per second, 0 means unlimited")
+    burst: int = Field(ge=1, description="Invocations allowed at once after being idle")
+
+
+class RateLimitUpdate(RateLimitConfig):
+    key: Optional[str] = Field(
+        default=None,
+        description="Invoker, agent or user ID to override, the scope default if omitted",
+    )
+
+
+class RateLimitsResponse(BaseModel):
+    limits: Dict[RateLimitScope, Optional[RateLimitConfig]]
+    overrides: Dict[RateLimitScope, Dict[str, RateLimitConfig]]
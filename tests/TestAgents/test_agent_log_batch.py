@@ -0,0 +1,64 @@
+import asyncio
+import json
+import uuid
+from typing import Awaitable, Callable
+
+import pytest
+import websockets
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from tests.constants import URI
+from tests.schemas import AgentDTOWithJWT
+
+
+def log_frame(agent_id: str, session_id: str, request_id: str, message: str) -> str:
+    return json.dumps(
+        {
+            "message_type": "agent_log",
+            "log_message": message,
+            "log_level": "info",
+            "agent_uuid": agent_id,
+            "request_id": request_id,
+            "session_id": session_id,
+        }
+    )
+
+
+@pytest.mark.asyncio
+async def test_invalid_log_does_not_drop_its_batch(
+    user_jwt_token: str,
+    agent_factory: Callable[[str], Awaitable[AgentDTOWithJWT]],
+    async_db_engine: AsyncEngine,
+):
+    """
+    The router forwards logs sent close together in one agent_log_batch frame.
+    A row the database rejects must not take the rest of the batch with it.
+    """
+    dummy_agent = await agent_factory(user_jwt_token)
+    agent_id = str(dummy_agent.id)
+    session_id = str(uuid.uuid4())
+    request_id = str(uuid.uuid4())
+
+    async with websockets.connect(
+        URI, additional_headers={"x-custom-authorization": dummy_agent.jwt}
+    ) as websocket:
+        await websocket.send(log_frame(agent_id, session_id, request_id, "first"))
+        await websocket.send(log_frame(agent_id, session_id, "not-a-uuid", "invalid"))
+        await websocket.send(log_frame(agent_id, session_id, request_id, "second"))
+
+        messages = []
+        for _ in range(50):
+            await asyncio.sleep(0.1)
+            async with async_db_engine.connect() as conn:
+                result = await conn.execute(
+                    text("SELECT message FROM logs WHERE session_id = :session_id"),
+                    {"session_id": session_id},
+                )
+                messages = sorted(row.message for row in result)
+            if len(messages) == 2:
+                break
+
+    logger.info(f"Stored logs: {messages}")
+    assert messages == ["first", "second"]